@@ -2,8 +2,6 @@
 
 import logging
 
-from pymatgen.io.vasp.outputs import Vasprun
-
 from custodian.custodian import Custodian
 from custodian.vasp.handlers import (
     MeshSymmetryErrorHandler,
@@ -12,6 +10,7 @@ from custodian.vasp.handlers import (
     UnconvergedErrorHandler,
     VaspErrorHandler,
 )
+from custodian.vasp.io import load_vasp_summary
 from custodian.vasp.jobs import VaspJob
 
 FORMAT = "%(asctime)s %(message)s"
@@ -20,6 +19,8 @@ logging.basicConfig(format=FORMAT, level=logging.INFO, filename="run.log")
 
 def get_runs(args):
     """Get the runs."""
+    from pymatgen.io.vasp.outputs import Vasprun
+
     vasp_command = args.command.split()
     converged = False
     job_number = 0
@@ -35,9 +36,10 @@ def get_runs(args):
 
         else:
             backup = False
-            v = Vasprun("vasprun.xml")
+            summary = load_vasp_summary()
+            n_ionic_steps = summary["n_ionic_steps"] if summary else len(Vasprun("vasprun.xml").ionic_steps)
 
-            if len(v.ionic_steps) == 1:
+            if n_ionic_steps == 1:
                 converged = True
 
             if job_number < 2 and not converged:
@@ -61,6 +63,7 @@ def get_runs(args):
             backup=backup,
             suffix=suffix,
             settings_override=settings,
+            write_summary=True,
         )
 
 
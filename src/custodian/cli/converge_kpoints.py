@@ -2,11 +2,9 @@
 
 import logging
 
-from pymatgen.io.vasp.inputs import VaspInput
-from pymatgen.io.vasp.outputs import Vasprun
-
 from custodian.custodian import Custodian
 from custodian.vasp.handlers import UnconvergedErrorHandler, VaspErrorHandler
+from custodian.vasp.io import load_vasp_summary
 from custodian.vasp.jobs import VaspJob
 
 FORMAT = "%(asctime)s %(message)s"
@@ -15,6 +13,9 @@ logging.basicConfig(format=FORMAT, level=logging.INFO, filename="run.log")
 
 def get_runs(vasp_command, target=1e-3, max_steps=10, mode="linear"):
     """Generate the runs using a generator until convergence is achieved."""
+    from pymatgen.io.vasp.inputs import VaspInput
+    from pymatgen.io.vasp.outputs import Vasprun
+
     energy = 0
     vasp_input = VaspInput.from_directory(".")
     kpoints = vasp_input["KPOINTS"].kpts[0]
@@ -25,8 +26,11 @@ def get_runs(vasp_command, target=1e-3, max_steps=10, mode="linear"):
             backup = True
         else:
             backup = False
-            v = Vasprun("vasprun.xml")
-            e_per_atom = v.final_energy / len(v.final_structure)
+            if summary := load_vasp_summary():
+                e_per_atom = summary["final_energy"] / len(summary["final_structure"])
+            else:
+                v = Vasprun("vasprun.xml")
+                e_per_atom = v.final_energy / len(v.final_structure)
             ediff = abs(e_per_atom - energy)
             if ediff < target:
                 logging.info(f"Converged to {ediff} eV/atom!")
@@ -46,6 +50,7 @@ def get_runs(vasp_command, target=1e-3, max_steps=10, mode="linear"):
             backup=backup,
             suffix=f".kpoints.{'x'.join(map(str, m))}",
             settings_override=settings,
+            write_summary=True,
         )
 
 
@@ -6,7 +6,6 @@ runs.
 import logging
 import sys
 
-from pymatgen.io.vasp.inputs import Incar, Kpoints, VaspInput
 from ruamel.yaml import YAML
 
 from custodian.custodian import Custodian
@@ -30,6 +29,8 @@ def load_class(mod, name):
 
 def get_jobs(args):
     """Returns a generator of jobs. Allows of "infinite" jobs."""
+    from pymatgen.io.vasp.inputs import Incar, Kpoints, VaspInput
+
     vasp_command = args.command.split()
     # save initial INCAR for rampU runs
     n_ramp_u = args.jobs.count("rampU")
@@ -30,6 +30,7 @@ from pymatgen.io.cp2k.outputs import Cp2kOutput
 from custodian.cp2k.interpreter import Cp2kModder
 from custodian.cp2k.utils import get_conv, restart, tail
 from custodian.custodian import ErrorHandler
+from custodian.utils import MultiPatternMatcher, ProcessTreeMonitor
 
 __author__ = "Nicholas Winner"
 __version__ = "1.0"
@@ -62,6 +63,7 @@ class StdErrHandler(ErrorHandler):
         "out_of_memory": ["insufficient virtual memory"],
         "abort": ["SIGABRT"],
     }
+    error_matcher: ClassVar = MultiPatternMatcher(error_msgs)
 
     def __init__(self, std_err="std_err.txt") -> None:
         """Initialize the handler with the output file to check.
@@ -77,14 +79,7 @@ class StdErrHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check for error in std_err file."""
-        self.errors = set()
-        with open(self.std_err) as file:
-            for line in file:
-                line = line.strip()
-                for err, msgs in StdErrHandler.error_msgs.items():
-                    for msg in msgs:
-                        if line.find(msg) != -1:
-                            self.errors.add(err)
+        self.errors = set(StdErrHandler.error_matcher.search_file(self.std_err))
         return len(self.errors) > 0
 
     def correct(self, directory="./"):
@@ -462,11 +457,17 @@ class FrozenJobErrorHandler(ErrorHandler):
             as some sub-routines, like the HFX module, can take a long time to
             update the output file.
 
+    The processes of the job are also sampled (see
+    :class:`custodian.utils.ProcessTreeMonitor`), so that a job whose ranks all
+    went idle, or spin without any I/O, is detected within minutes rather than
+    after timeout, as long as its output is not updated either.
     """
 
     is_monitor = True
 
-    def __init__(self, input_file="cp2k.inp", output_file="cp2k.out", timeout=3600) -> None:
+    def __init__(
+        self, input_file="cp2k.inp", output_file="cp2k.out", timeout=3600, idle_timeout=600, stall_timeout=1800
+    ) -> None:
         """Initialize the handler with the output file to check.
 
         Args:
@@ -477,10 +478,19 @@ class FrozenJobErrorHandler(ErrorHandler):
                 frozen. Defaults to 3600 seconds, i.e., 1 hour. Most stages of
                 cp2k take much less than 1 hour, but 1 hour is the default to account
                 for large HF force calculations or sizable preconditioner calculations.
+            idle_timeout (int): The time in seconds after which the run is
+                considered frozen if all its processes are idle and the output
+                file is not updated. None disables the sampling of processes.
+            stall_timeout (int): The time in seconds after which the run is
+                considered frozen if its processes do no I/O nor block
+                voluntarily and the output file is not updated.
         """
         self.input_file = input_file
         self.output_file = output_file
         self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.stall_timeout = stall_timeout
+        self._process_monitor: ProcessTreeMonitor | None = None
         self.frozen_preconditioner = False
         self.restart = None
 
@@ -496,7 +506,14 @@ class FrozenJobErrorHandler(ErrorHandler):
             pass
 
         t = tail(self.output_file, 2)
-        if time.time() - st.st_mtime > self.timeout:
+        output_age = time.time() - st.st_mtime
+        frozen = output_age > self.timeout
+        if not frozen and self.idle_timeout is not None:
+            if self._process_monitor is None or self._process_monitor.directory != directory:
+                self._process_monitor = ProcessTreeMonitor(directory)
+            monitor = self._process_monitor
+            frozen = monitor.update() and monitor.is_frozen(output_age, self.idle_timeout, self.stall_timeout)
+        if frozen:
             if t[0].split() == ["Step", "Update", "method", "Time", "Convergence", "Total", "energy", "Change"]:
                 self.frozen_preconditioner = True
             return True
@@ -505,6 +522,8 @@ class FrozenJobErrorHandler(ErrorHandler):
 
     def correct(self, directory="./"):
         """Correct issue if possible."""
+        if self._process_monitor is not None:
+            self._process_monitor.reset()
         ci = Cp2kInput.from_file(os.path.join(directory, self.input_file))
         actions = []
         errors = []
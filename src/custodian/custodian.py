@@ -7,6 +7,7 @@ ErrorHandlers and Jobs.
 from __future__ import annotations
 
 import datetime
+import functools
 import logging
 import os
 import subprocess
@@ -18,13 +19,17 @@ from abc import abstractmethod
 from ast import literal_eval
 from glob import glob
 from itertools import islice
+from typing import TYPE_CHECKING
 
 from monty.json import MontyDecoder, MontyEncoder, MSONable
 from monty.serialization import dumpfn, loadfn
 from monty.shutil import gzip_dir
 from monty.tempfile import ScratchDir
 
-from .utils import get_execution_host_info, tracked_lru_cache
+from .utils import InputTransaction, get_execution_host_info, register_job_process, tracked_lru_cache
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
 
 __author__ = "Shyue Ping Ong, William Davidson Richards"
 __copyright__ = "Copyright 2012, The Materials Project"
@@ -47,7 +52,20 @@ if literal_eval(os.getenv("CUSTODIAN_REPORTING_OPT_IN", "False").title()):
     # will set for True, true, TRUE, etc.
     SENTRY_DSN = "https://0f7291738eb042a3af671df9fc68ae2a@sentry.io/1470881"
 
-if SENTRY_DSN:
+
+@functools.cache
+def init_sentry() -> bool:
+    """
+    Initialize Sentry reporting the first time it is needed rather than at
+    import time, so that importing custodian stays cheap for short-lived
+    processes.
+
+    Returns:
+        bool: Whether Sentry reporting is enabled.
+    """
+    if not SENTRY_DSN:
+        return False
+
     import sentry_sdk
 
     sentry_sdk.init(dsn=SENTRY_DSN)  # pylint: disable=E0110
@@ -63,6 +81,7 @@ if SENTRY_DSN:
         import socket
 
         scope.set_tag("hostname", socket.gethostname())
+    return True
 
 
 class Custodian:
@@ -183,6 +202,7 @@ class Custodian:
             **kwargs: Any other kwargs are ignored. This is to allow for easy
                  subclassing and instantiation from a dict.
         """
+        init_sentry()
         self.max_errors = max_errors
         self.max_errors_per_job = max_errors_per_job or max_errors
         self.jobs = jobs
@@ -453,17 +473,20 @@ class Custodian:
         for handler in self.handlers:
             handler.n_applied_corrections = 0
 
-        job.setup(self.directory)
+        self._setup_job(job)
 
         attempt = 0
         while self.total_errors < self.max_errors and self.errors_current_job < self.max_errors_per_job:
             attempt += 1
+            n_corrections = len(self.run_log[-1]["corrections"])
             logger.info(
                 f"Starting job no. {job_n} ({job.name}) attempt no. {attempt}. Total errors and "
                 f"errors in job thus far = {self.total_errors}, {self.errors_current_job}."
             )
 
             p = job.run(directory=self.directory)
+            # the monitors follow the processes started by this one
+            register_job_process(self.directory, p.pid if isinstance(p, subprocess.Popen) else None)
             # Check for errors using the error handlers and perform
             # corrections.
             has_error = False
@@ -529,14 +552,19 @@ class Custodian:
                 job.postprocess(directory=self.directory)
                 return
 
+            # Rerun on fewer MPI ranks if requested
+            for corr in self.run_log[-1]["corrections"][n_corrections:]:
+                if corr.get("nranks"):
+                    corr["freed_ranks"] = job.reduce_ranks(corr["nranks"], directory=self.directory)
+
             # Check that all errors could be handled
             for corr in self.run_log[-1]["corrections"]:
-                if not corr["actions"] and corr["handler"].raises_runtime_error:
+                if not (corr["actions"] or corr.get("freed_ranks")) and corr["handler"].raises_runtime_error:
                     self.run_log[-1]["handler"] = corr["handler"]
                     msg = f"Unrecoverable error for handler: {corr['handler']}"
                     raise NonRecoverableError(msg, raises=True, handler=corr["handler"])
             for corr in self.run_log[-1]["corrections"]:
-                if not corr["actions"]:
+                if not (corr["actions"] or corr.get("freed_ranks")):
                     self.run_log[-1]["handler"] = corr["handler"]
                     msg = f"Unrecoverable error for handler: {corr['handler']}"
                     raise NonRecoverableError(msg, raises=False, handler=corr["handler"])
@@ -583,8 +611,8 @@ class Custodian:
                 job_n = 0
                 job = self.jobs[job_n]
                 logger.info(f"Setting up job no. 1 ({job.name}) ")
-                job.setup(directory=self.directory)
                 self.run_log.append({"job": job.as_dict(), "corrections": [], "job_n": job_n})
+                self._setup_job(job)
                 return len(self.jobs)
 
             # Continuing after running calculation
@@ -633,7 +661,7 @@ class Custodian:
             job_n += 1
             job = self.jobs[job_n]
             self.run_log.append({"job": job.as_dict(), "corrections": [], "job_n": job_n})
-            job.setup(directory=self.directory)
+            self._setup_job(job)
             return len(self.jobs) - job_n
 
         except CustodianError as ex:
@@ -653,43 +681,55 @@ class Custodian:
                 gzip_dir(self.directory)
         return None
 
+    def _setup_job(self, job) -> None:
+        """Sets up a job and records its pre-emptive corrections in the run log."""
+        job.setup(directory=self.directory)
+        if job.preemptive_corrections:
+            self.run_log[-1]["preemptive_corrections"] = list(job.preemptive_corrections)
+
     def _do_check(self, handlers, terminate_func=None):
         """Checks the specified handlers. Returns True iff errors caught."""
         corrections = []
-        for handler in handlers:
-            try:
-                if handler.check(directory=self.directory):
-                    if (
-                        handler.max_num_corrections is not None
-                        and handler.n_applied_corrections >= handler.max_num_corrections
-                    ):
-                        msg = f"Maximum number of corrections {handler.max_num_corrections} reached for {handler=}"
-                        if handler.raise_on_max:
-                            self.run_log[-1]["handler"] = handler
-                            self.run_log[-1]["max_errors_per_handler"] = True
-                            raise MaxCorrectionsPerHandlerError(
-                                msg, raises=True, max_errors_per_handler=handler.max_num_corrections, handler=handler
-                            )
-                        logger.warning(f"{msg} Correction not applied.")
-                        continue
-                    if terminate_func is not None and handler.is_terminating:
-                        logger.info("Terminating job")
-                        terminate_func(directory=self.directory)
-                        # make sure we don't terminate twice
-                        terminate_func = None
-                    dct = handler.correct(directory=self.directory)
-                    logger.error(type(handler).__name__, extra=dct)
-                    dct["handler"] = handler
-                    corrections.append(dct)
-                    handler.n_applied_corrections += 1
-            except Exception:
-                if not self.skip_over_errors:
-                    raise
-                import traceback
-
-                logger.error(f"Bad {handler=}")
-                logger.error(traceback.format_exc())
-                corrections.append({"errors": [f"Bad {handler=}"], "actions": []})
+        # Handlers share the parsed inputs of the directory and their modified
+        # input files are written once, atomically, after all the corrections.
+        with InputTransaction.deferred_scope():
+            for handler in handlers:
+                try:
+                    if handler.check(directory=self.directory):
+                        if (
+                            handler.max_num_corrections is not None
+                            and handler.n_applied_corrections >= handler.max_num_corrections
+                        ):
+                            msg = f"Maximum number of corrections {handler.max_num_corrections} reached for {handler=}"
+                            if handler.raise_on_max:
+                                self.run_log[-1]["handler"] = handler
+                                self.run_log[-1]["max_errors_per_handler"] = True
+                                raise MaxCorrectionsPerHandlerError(
+                                    msg,
+                                    raises=True,
+                                    max_errors_per_handler=handler.max_num_corrections,
+                                    handler=handler,
+                                )
+                            logger.warning(f"{msg} Correction not applied.")
+                            continue
+                        if terminate_func is not None and handler.is_terminating:
+                            logger.info("Terminating job")
+                            terminate_func(directory=self.directory)
+                            # make sure we don't terminate twice
+                            terminate_func = None
+                        dct = handler.correct(directory=self.directory)
+                        logger.error(type(handler).__name__, extra=dct)
+                        dct["handler"] = handler
+                        corrections.append(dct)
+                        handler.n_applied_corrections += 1
+                except Exception:
+                    if not self.skip_over_errors:
+                        raise
+                    import traceback
+
+                    logger.error(f"Bad {handler=}")
+                    logger.error(traceback.format_exc())
+                    corrections.append({"errors": [f"Bad {handler=}"], "actions": []})
         self.total_errors += len(corrections)
         self.errors_current_job += len(corrections)
         self.run_log[-1]["corrections"] += corrections
@@ -703,6 +743,13 @@ class Custodian:
 class Job(MSONable):
     """Abstract base class defining the interface for a Job."""
 
+    preemptive_corrections: Sequence[dict] = ()
+    """
+    Corrections that setup applied (or only warned about) because the inputs
+    are known to fail, in the format returned by ErrorHandler.correct.
+    Custodian records them in the run log of the job.
+    """
+
     @abstractmethod
     def setup(self, directory="./"):
         """
@@ -729,6 +776,21 @@ class Job(MSONable):
         """Implement termination function."""
         return
 
+    def reduce_ranks(self, nranks: int, directory="./") -> int:
+        """
+        Run the next attempts of the job on nranks MPI ranks, as requested by
+        a correction (see ErrorHandler.correct). Jobs that can change their
+        number of ranks should override this method.
+
+        Args:
+            nranks (int): number of MPI ranks to run with.
+            directory (str): directory of the job.
+
+        Returns:
+            int: number of ranks freed, 0 if the request cannot be honored.
+        """
+        return 0
+
     @property
     def name(self):
         """A nice string name for the job."""
@@ -803,6 +865,8 @@ class ErrorHandler(MSONable):
             actions taken. E.g.
             {"errors": list_of_errors, "actions": list_of_actions_taken}.
             If this is an unfixable error, actions should be set to None.
+            The dict may also request that the job is rerun on fewer MPI
+            ranks with "nranks": number_of_ranks (see Job.reduce_ranks).
         """
 
     @property
@@ -16,7 +16,7 @@ from monty.io import zopen
 from pymatgen.io.gaussian import GaussianInput, GaussianOutput
 
 from custodian.custodian import ErrorHandler
-from custodian.utils import backup
+from custodian.utils import MultiPatternMatcher, backup
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
@@ -77,6 +77,15 @@ class GaussianErrorHandler(ErrorHandler):
         "max_disp": re.compile(r"\s+(Maximum Displacement)\s+(-?\d+.?\d*|.*)\s+(-?\d+.?\d*)"),
         "rms_disp": re.compile(r"\s+(RMS {5}Displacement)\s+(-?\d+.?\d*|.*)\s+(-?\d+.?\d*)"),
     }
+    # all the patterns above, applied at once to each line of the output file
+    output_matcher: ClassVar = MultiPatternMatcher(
+        {
+            "error": list(error_defs),
+            "recom_mem": [recom_mem_patt.pattern],
+            **{key: [patt.pattern] for key, patt in conv_criteria.items()},
+        },
+        regex=True,
+    )
 
     grid_patt = re.compile(r"(-?\d{5})")
     GRID_NAMES = (
@@ -485,31 +494,24 @@ class GaussianErrorHandler(ErrorHandler):
         error_patts = set()
         # TODO: move this to pymatgen?
         self.conv_data = {"values": {}, "thresh": {}}
-        with zopen(os.path.join(directory, self.output_file), "rt", encoding="utf-8") as f:
+        check_convergence = self.check_convergence and "opt" in self.gin.route_parameters
+        with zopen(os.path.join(directory, self.output_file), mode="rb") as f:
             for line in f:
-                error_match = GaussianErrorHandler.error_patt.search(line)  # type:ignore[arg-type]
-                mem_match = GaussianErrorHandler.recom_mem_patt.search(line)  # type:ignore[arg-type]
-                if error_match:
-                    patt = error_match.group(0)
-                    error_patts.add(patt)
-                    for pattern, error_key in GaussianErrorHandler.error_defs.items():
-                        if re.match(pattern, patt):
-                            self.errors.add(error_key)
-                            break
-                    # self.errors.add(GaussianErrorHandler.error_defs[patt])
-                if mem_match:
-                    mem = mem_match.group(1)
-                    self.recom_mem = GaussianErrorHandler.convert_mem(float(mem), "mw")
-
-                if self.check_convergence and "opt" in self.gin.route_parameters:
-                    for k, v in GaussianErrorHandler.conv_criteria.items():
-                        m = v.search(line)  # type:ignore[arg-type]
-                        if m:
-                            if k not in self.conv_data["values"]:
-                                self.conv_data["values"][k] = [m.group(2)]
-                                self.conv_data["thresh"][k] = float(m.group(3))
-                            else:
-                                self.conv_data["values"][k].append(m.group(2))
+                for match in GaussianErrorHandler.output_matcher.finditer(line):
+                    if match.key == "error":
+                        error_patts.add(match.text.decode())
+                        self.errors.add(GaussianErrorHandler.error_defs[match.signature])
+                    elif match.key == "recom_mem":
+                        mem = match.groups[0]
+                        self.recom_mem = GaussianErrorHandler.convert_mem(float(mem), "mw")
+                    elif check_convergence:
+                        k = match.key
+                        value, thresh = (group.decode() for group in match.groups[1:])
+                        if k not in self.conv_data["values"]:
+                            self.conv_data["values"][k] = [value]
+                            self.conv_data["thresh"][k] = float(thresh)
+                        else:
+                            self.conv_data["values"][k].append(value)
 
         # TODO: it only plots after the job finishes, modify?
         if self.conv_data["values"] and all(len(v) >= 2 for v in self.conv_data["values"].values()):
@@ -4,12 +4,13 @@ for B3LYP DFT jobs.
 """
 
 import os
+from typing import ClassVar
 
 from pymatgen.io.nwchem import NwInput, NwOutput
 
 from custodian.ansible.interpreter import Modder
 from custodian.custodian import ErrorHandler
-from custodian.utils import backup
+from custodian.utils import MultiPatternMatcher, backup
 
 
 class NwchemErrorHandler(ErrorHandler):
@@ -18,6 +19,16 @@ class NwchemErrorHandler(ErrorHandler):
     generated by pymatgen.
     """
 
+    # The error signatures recognized by pymatgen's NwOutput. Output files
+    # containing none of them are not parsed at all.
+    error_matcher: ClassVar = MultiPatternMatcher(
+        {
+            "Bad convergence": ["calculations not reaching convergence", "Calculation failed to converge"],
+            "autoz error": ["geom_binvr: #indep variables incorrect"],
+            "Geometry optimization failed": ["dft optimize failed"],
+        }
+    )
+
     def __init__(self, output_filename="mol.nwout") -> None:
         """Initialize with an output file name.
 
@@ -32,8 +43,11 @@ class NwchemErrorHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check for errors."""
-        out = NwOutput(os.path.join(directory, self.output_filename))
         self.errors = []
+        output_filename = os.path.join(directory, self.output_filename)
+        if not NwchemErrorHandler.error_matcher.search_file(output_filename):
+            return False
+        out = NwOutput(output_filename)
         self.input_file = out.job_info["input"]
         if out.data[-1]["has_error"]:
             self.errors += out.data[-1]["errors"]
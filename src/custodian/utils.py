@@ -2,21 +2,38 @@
 
 from __future__ import annotations
 
+import contextlib
+import copy
 import functools
+import importlib
 import logging
+import mmap
 import os
+import re
 import tarfile
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from contextlib import contextmanager
 from glob import glob
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, NamedTuple
+
+import psutil
+from monty.io import zopen
 
 if TYPE_CHECKING:
+    from collections.abc import Iterator
     from typing import ClassVar
 
 
 def backup(filenames, prefix="error", directory="./") -> None:
     """
     Backup files to a tar.gz file. Used, for example, in backing up the
-    files of an errored run before performing corrections.
+    files of an errored run before performing corrections. Within a
+    Custodian check, the inputs staged by earlier corrections (see
+    InputTransaction) are backed up as staged.
 
     Args:
         filenames ([str]): List of files to backup. Supports wildcards, e.g.,
@@ -39,10 +56,36 @@ def backup(filenames, prefix="error", directory="./") -> None:
     prefix = f"{prefix}.{num + 1}"
     filename = os.path.join(directory, f"{prefix}.tar.gz")
     logging.info(f"Backing up run to {filename}")
-    with tarfile.open(filename, "w:gz") as tar:
+    with tarfile.open(filename, "w:gz") as tar, tempfile.TemporaryDirectory() as tmp_dir:
         for fname in filenames:
             for file in glob(os.path.join(directory, fname)):
-                tar.add(file, arcname=os.path.join(prefix, os.path.basename(file)))
+                arcname = os.path.join(prefix, os.path.basename(file))
+                # inputs corrected earlier in the current check are backed up as corrected
+                if (staged := InputTransaction.staged_object(file)) is not None:
+                    file = os.path.join(tmp_dir, os.path.basename(file))
+                    staged.write_file(file)
+                tar.add(file, arcname=arcname)
+
+
+def lazy_imports(module_name: str, imports: dict[str, str]):
+    """
+    Module __getattr__ (PEP 562) importing names on first access, so that
+    importing the module does not import the (heavy) modules they come from.
+
+    Args:
+        module_name (str): __name__ of the module.
+        imports (dict): name -> module to import it from.
+
+    Returns:
+        The function to assign to the __getattr__ of the module.
+    """
+
+    def __getattr__(name):
+        if name in imports:
+            return getattr(importlib.import_module(imports[name]), name)
+        raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+
+    return __getattr__
 
 
 def get_execution_host_info():
@@ -65,6 +108,213 @@ def get_execution_host_info():
     return host or "unknown", cluster or "unknown"
 
 
+# options giving the number of MPI ranks and the hosts to MPI launchers
+# (mpirun, mpiexec, srun, aprun...)
+MPI_RANK_OPTIONS = ("-n", "-np", "--np", "--ntasks")
+MPI_HOST_OPTIONS = ("-H", "-host", "--host")
+
+
+def _find_option(cmd: list[str], options: tuple[str, ...]) -> tuple[int, str | None]:
+    """Index and value of the first of options in cmd, given as "-o value" or "-o=value"."""
+    for idx, arg in enumerate(cmd):
+        if arg in options:
+            return idx, cmd[idx + 1] if idx + 1 < len(cmd) else None
+        if "=" in arg and arg.split("=", 1)[0] in options:
+            return idx, arg.split("=", 1)[1]
+    return -1, None
+
+
+def _set_option(cmd: list[str], idx: int, value: str) -> None:
+    if "=" in cmd[idx]:
+        cmd[idx] = f"{cmd[idx].split('=', 1)[0]}={value}"
+    else:
+        cmd[idx + 1] = value
+
+
+def get_mpi_ranks(cmd) -> int | None:
+    """
+    Number of MPI ranks set in a launch command.
+
+    Args:
+        cmd (list[str]): command, e.g. ["mpirun", "-np", "16", "vasp_std"].
+
+    Returns:
+        int: the number of ranks, or None if the command does not set it.
+    """
+    _, value = _find_option(list(cmd), MPI_RANK_OPTIONS)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def set_mpi_ranks(cmd, nranks: int) -> list[str]:
+    """
+    Launch command with another number of MPI ranks. Hosts given with their
+    number of slots (e.g. "--host node1:8,node2:8") that are no longer needed
+    are dropped from the host list.
+
+    Args:
+        cmd (list[str]): command setting the number of ranks.
+        nranks (int): new number of ranks.
+
+    Returns:
+        list[str]: the new command.
+
+    Raises:
+        ValueError: if the command does not set the number of ranks.
+    """
+    cmd = list(cmd)
+    idx, _ = _find_option(cmd, MPI_RANK_OPTIONS)
+    if get_mpi_ranks(cmd) is None:
+        raise ValueError(f"No number of MPI ranks found in {cmd}")
+    _set_option(cmd, idx, str(nranks))
+
+    idx, hosts = _find_option(cmd, MPI_HOST_OPTIONS)
+    if hosts and all(re.fullmatch(r"[^:]+:\d+", host) for host in hosts.split(",")):
+        kept, slots = [], 0
+        for host in hosts.split(","):
+            if slots >= nranks:
+                break
+            kept.append(host)
+            slots += int(host.split(":")[1])
+        _set_option(cmd, idx, ",".join(kept))
+    return cmd
+
+
+@contextmanager
+def atomic_path(filename: str) -> Iterator[str]:
+    """
+    Context manager yielding a temporary path next to filename. Once the
+    block exits without error, the temporary file is renamed to filename,
+    so that readers never see a half-written file.
+
+    Args:
+        filename (str): Final path of the file.
+    """
+    tmp = os.path.join(os.path.dirname(filename) or ".", f".{os.path.basename(filename)}.{os.getpid()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, filename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class _DeferredState(threading.local):
+    """Deferred scope of the current thread (see InputTransaction.deferred_scope)."""
+
+    deferred = False
+
+    def __init__(self) -> None:
+        self.open_transactions: dict[tuple, InputTransaction] = {}
+
+
+class InputTransaction:
+    """
+    Base class for input state shared by the handlers of a single Custodian
+    check. Subclasses parse the inputs of a directory once, handlers stage
+    modified input objects against it and the modified files are written
+    once, atomically, when the transaction is committed.
+
+    Within :meth:`deferred_scope` (used by Custodian._do_check) a single
+    transaction per directory and subclass is shared and commits are deferred
+    to the end of the scope. Outside of it, every transaction is private and
+    staged files are written immediately. The scope and its transactions are
+    specific to the thread that opened it.
+    """
+
+    state: ClassVar[_DeferredState] = _DeferredState()
+
+    def __init__(self, directory: str = "./") -> None:
+        """
+        Args:
+            directory (str): Directory containing the input files.
+        """
+        self.directory = directory
+        self.staged: dict[str, object] = {}
+
+    @classmethod
+    def for_directory(cls, directory: str = "./"):
+        """Return the transaction for directory, shared within a deferred scope."""
+        state = InputTransaction.state
+        if not state.deferred:
+            return cls(directory)
+        key = (cls, os.path.abspath(directory))
+        if key not in state.open_transactions:
+            state.open_transactions[key] = cls(directory)
+        return state.open_transactions[key]
+
+    def stage(self, filename: str, obj) -> None:
+        """
+        Stage an object to be written to filename. The object must have a
+        write_file method.
+        """
+        self.staged[filename] = obj
+        if not InputTransaction.state.deferred:
+            self.commit()
+
+    @classmethod
+    def staged_object(cls, filepath: str):
+        """
+        The object staged for filepath by a transaction of the current
+        deferred scope, which is only written when the scope exits, or None.
+        """
+        directory, filename = os.path.split(os.path.abspath(filepath))
+        for (_, path), transaction in list(InputTransaction.state.open_transactions.items()):
+            if path == directory and filename in transaction.staged:
+                return transaction.staged[filename]
+        return None
+
+    def discard(self, filename: str) -> None:
+        """Drop a staged write, e.g. because the file was replaced on disk."""
+        self.staged.pop(filename, None)
+
+    def commit(self) -> None:
+        """Atomically write all the staged files."""
+        while self.staged:
+            filename, obj = self.staged.popitem()
+            with atomic_path(os.path.join(self.directory, filename)) as tmp:
+                obj.write_file(tmp)
+
+    @classmethod
+    @contextmanager
+    def deferred_scope(cls) -> Iterator[None]:
+        """
+        Share transactions and defer their commits until the scope exits
+        normally. The staged writes are discarded if it exits with an
+        exception.
+        """
+        state = InputTransaction.state
+        state.deferred = True
+        try:
+            yield
+        except BaseException:
+            state.open_transactions.clear()
+            raise
+        finally:
+            state.deferred = False
+        while state.open_transactions:
+            _, transaction = state.open_transactions.popitem()
+            transaction.commit()
+
+    @classmethod
+    @contextmanager
+    def joined_scope(cls, open_transactions: dict) -> Iterator[None]:
+        """
+        Share, from another thread, the transactions of the deferred scope of
+        a thread, given by its state.open_transactions. The scope stays
+        committed or discarded by the thread that opened it.
+        """
+        state = InputTransaction.state
+        previous = state.deferred, state.open_transactions
+        state.deferred, state.open_transactions = True, open_transactions
+        try:
+            yield
+        finally:
+            state.deferred, state.open_transactions = previous
+
+
 class tracked_lru_cache:
     """
     Decorator wrapping the functools.lru_cache adding a tracking of the
@@ -99,7 +349,779 @@ class tracked_lru_cache:
 
     @classmethod
     def tracked_cache_clear(cls) -> None:
-        """Clear the cache of all the decorated functions."""
+        """
+        Clear the cache of all the decorated functions. Caches that define
+        cache_expire (see :class:`tracked_file_cache`) only drop the entries
+        that can no longer be trusted.
+        """
         while cls.cached_functions:
             f = cls.cached_functions.pop()
-            f.cache_clear()
+            getattr(f, "cache_expire", f.cache_clear)()
+
+
+class CacheInfo(NamedTuple):
+    """Statistics of a :class:`tracked_file_cache`."""
+
+    hits: int
+    misses: int
+    maxsize: int | None
+    currsize: int
+    nbytes: int
+    max_bytes: int | None
+
+
+class _FileCacheEntry:
+    __slots__ = ("kwargs", "nbytes", "priority", "racy", "result", "signature", "worth")
+
+    def __init__(self, kwargs, signature, racy, result, cost_ns) -> None:
+        self.kwargs = kwargs
+        self.signature = signature
+        self.racy = racy
+        self.result = result
+        # the size of the file is a cheap stand-in for the memory of its parse
+        self.nbytes = signature[0]
+        self.worth = max(cost_ns, 1) / max(self.nbytes, 1)
+        self.priority = 0.0
+
+
+def file_signature(filepath: str) -> tuple[int, int, int]:
+    """
+    Signature identifying the current content of a file, i.e. its
+    (size, mtime_ns, inode).
+    """
+    stat = os.stat(filepath)
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class tracked_file_cache:
+    """
+    Decorator caching the result of parsing a file, for functions whose first
+    argument is a file path. Entries are keyed by the file signature (size,
+    mtime_ns, inode) and survive :meth:`tracked_lru_cache.tracked_cache_clear`,
+    so an unchanged file is not parsed again at the next Custodian check.
+
+    A file modified less than mtime_resolution_ns before it was parsed may be
+    modified again without its signature changing (like "racy git"). Such
+    entries are only reused within the current check.
+
+    Keyword variants asking for less data than a cached parse can be served
+    from it by registering a comparison function with :meth:`covers`.
+
+    All the decorated functions share a budget of max_bytes, the entries being
+    weighed with the size of the file they were parsed from. Beyond it,
+    entries are evicted by GreedyDual-Size: each entry is worth the time it
+    took to parse per byte of its file, plus an inflation value raised on every eviction, so that entries
+    that are not used any more age out whatever their worth.
+
+    The caches may be used from several threads, e.g. by the image handlers
+    of NEBImageHandler. Their entries are guarded by a shared lock, but a
+    file may be parsed by two threads at the same time.
+    """
+
+    lock: ClassVar[threading.RLock] = threading.RLock()
+    mtime_resolution_ns: ClassVar[int] = 1_000_000_000
+    max_bytes: ClassVar[int | None] = 2 * 1024**3
+    caches: ClassVar[weakref.WeakSet[tracked_file_cache]] = weakref.WeakSet()
+    inflation: ClassVar[float] = 0.0
+
+    def __init__(self, func) -> None:
+        """
+        Args:
+            func: function to be decorated.
+        """
+        self.func = func
+        functools.update_wrapper(self, func)
+        self._entries: dict[str, list[_FileCacheEntry]] = {}
+        self._covers = None
+        self.hits = self.misses = 0
+        self.caches.add(self)
+
+    def covers(self, func):
+        """
+        Register func(cached_kwargs, kwargs) -> bool, telling whether a result
+        parsed with cached_kwargs can be returned for a call with kwargs.
+        """
+        self._covers = func
+        return func
+
+    def __call__(self, filepath, **kwargs):
+        """Call the decorated function."""
+        tracked_lru_cache.cached_functions.add(self)
+        path = os.path.abspath(filepath)
+        try:
+            signature = file_signature(path)
+        except OSError:
+            return self.func(filepath, **kwargs)
+
+        with self.lock:
+            for entry in self._entries.get(path, []):
+                if entry.signature == signature and (
+                    entry.kwargs == kwargs or (self._covers is not None and self._covers(entry.kwargs, kwargs))
+                ):
+                    self.hits += 1
+                    entry.priority = self.inflation + entry.worth
+                    return entry.result
+            self.misses += 1
+
+        parsed_at = time.time_ns()
+        result = self.func(filepath, **kwargs)
+        racy = signature[1] >= parsed_at - self.mtime_resolution_ns
+        new = _FileCacheEntry(kwargs, signature, racy, result, time.time_ns() - parsed_at)
+        with self.lock:
+            new.priority = self.inflation + new.worth
+            entries = [entry for entry in self._entries.get(path, []) if entry.signature == signature]
+            entries.append(new)
+            self._entries[path] = entries
+            self.evict()
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the files of the cached entries."""
+        return sum(entry.nbytes for entries in self._entries.values() for entry in entries)
+
+    @classmethod
+    def evict(cls) -> None:
+        """Evict entries of all the caches until they fit in max_bytes."""
+        if cls.max_bytes is None:
+            return
+        with cls.lock:
+            total = sum(cache.nbytes for cache in cls.caches)
+            while total > cls.max_bytes:
+                cache, path, entry = min(
+                    (
+                        (cache, path, entry)
+                        for cache in cls.caches
+                        for path, entries in cache._entries.items()
+                        for entry in entries
+                    ),
+                    key=lambda item: item[2].priority,
+                )
+                cls.inflation = entry.priority
+                cache._entries[path].remove(entry)
+                if not cache._entries[path]:
+                    del cache._entries[path]
+                total -= entry.nbytes
+
+    def cache_info(self) -> CacheInfo:
+        """Report hits, misses, number of entries and memory of the cache."""
+        return CacheInfo(
+            self.hits, self.misses, None, sum(map(len, self._entries.values())), self.nbytes, self.max_bytes
+        )
+
+    def cache_clear(self) -> None:
+        """Drop all the cached entries."""
+        with self.lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def cache_expire(self) -> None:
+        """Drop the entries of files that changed, and those that are racy."""
+        with self.lock:
+            for path in list(self._entries):
+                try:
+                    signature = file_signature(path)
+                except OSError:
+                    signature = None
+                entries = [entry for entry in self._entries[path] if entry.signature == signature and not entry.racy]
+                if entries:
+                    self._entries[path] = entries
+                else:
+                    del self._entries[path]
+
+
+class IncrementalFileReader:
+    """
+    Base class of the output file readers used by monitors. A reader keeps
+    its byte offset and accumulated results between checks, so that only the
+    bytes appended since the last check are parsed. A file that shrank, or
+    whose header or bytes before the offset changed (e.g. the code restarted
+    and truncated it), is read again from the start. Compressed files cannot
+    grow and are only re-read when they change. An incomplete last line is
+    parsed too, but its effect is rolled back before the next update, when
+    the rest of it is available.
+
+    Subclasses extend reset to initialize their results and implement
+    parse_line, which is given every line as bytes, or override parse_file.
+    Only the attributes and the containers they hold directly are saved for
+    the rollback, so parse_line must not modify the objects in these
+    containers, e.g. the arrays appended to a list, in place.
+    """
+
+    readers: ClassVar[dict[tuple, IncrementalFileReader]] = {}
+    header_size: ClassVar[int] = 512
+    anchor_size: ClassVar[int] = 64
+
+    def __init__(self, filepath: str) -> None:
+        """
+        Args:
+            filepath (str): path to the file.
+        """
+        self.filepath = filepath
+        self.reset()
+
+    @classmethod
+    def for_file(cls, filepath: str):
+        """Get the reader of a file, shared by all callers, updated with the new content."""
+        key = (cls, os.path.abspath(filepath))
+        if key not in cls.readers:
+            cls.readers[key] = cls(key[1])
+        return cls.readers[key].update()
+
+    def reset(self) -> None:
+        """Forget everything read so far."""
+        self.offset = 0
+        self.header = b""
+        self.anchor = b""
+        self.signature: tuple[int, int, int] | None = None
+        self._rollback: dict | None = None
+
+    def update(self):
+        """Parse the content appended to the file since the last update."""
+        try:
+            signature = file_signature(self.filepath)
+        except OSError:
+            self.reset()
+            return self
+        if signature == self.signature:
+            return self
+        if self._rollback is not None:
+            self.__dict__.update(self._rollback)
+
+        compressed = self.filepath.lower().endswith((".gz", ".bz2", ".xz", ".lzma"))
+        with zopen(self.filepath, mode="rb") as file:
+            header = file.read(self.header_size)
+            if compressed or signature[0] < self.offset or not header.startswith(self.header):
+                self.reset()
+            elif self.anchor:
+                file.seek(self.offset - len(self.anchor))
+                if file.read(len(self.anchor)) != self.anchor:
+                    self.reset()
+            self.header = header
+            file.seek(self.offset)
+            self.parse_file(file, compressed)
+            if not compressed:
+                file.seek(max(self.offset - self.anchor_size, 0))
+                self.anchor = file.read(min(self.offset, self.anchor_size))
+        self.signature = signature
+        return self
+
+    def parse_file(self, file, compressed: bool) -> None:
+        """
+        Parse the file from the current offset to its end, advancing the
+        offset over what should not be parsed again.
+        """
+        for line in file:
+            if not compressed and not line.endswith(b"\n"):
+                # incomplete line, possibly being written
+                self._rollback = {key: copy.copy(value) for key, value in self.__dict__.items()}
+                self.parse_line(line)
+                break
+            self.offset += len(line)
+            self.parse_line(line)
+
+    def parse_line(self, line: bytes) -> None:
+        """Update the results with a line of the file."""
+        raise NotImplementedError
+
+
+class SignatureScanner(IncrementalFileReader):
+    """
+    Tail-following scanner for error signatures in an output file, such as
+    vasp.out or std_err.txt. Each update only searches the bytes appended
+    since the last one, in chunks, carrying over a window of the previous
+    bytes as long as the longest signature so that none is missed across
+    chunk boundaries. The signatures found are kept until the file is
+    truncated, so the result is the same as searching the whole file.
+    """
+
+    chunk_size: ClassVar[int] = 1 << 20
+
+    def __init__(self, filepath: str, error_msgs: dict[str, list[str]]) -> None:
+        """
+        Args:
+            filepath (str): path to the output file.
+            error_msgs (dict): Mapping of error key to the list of messages
+                signalling that error, e.g. VaspErrorHandler.error_msgs.
+        """
+        self.error_msgs = error_msgs
+        self._matcher = MultiPatternMatcher(error_msgs)
+        self._overlap = max((len(msg.encode()) for msgs in error_msgs.values() for msg in msgs), default=1) - 1
+        super().__init__(filepath)
+
+    @classmethod
+    def for_file(cls, filepath: str, error_msgs: dict[str, list[str]]):
+        """Get the scanner of a file for these signatures, shared by all callers, updated with the new content."""
+        key = (cls, os.path.abspath(filepath), tuple((err, tuple(msgs)) for err, msgs in error_msgs.items()))
+        if key not in cls.readers:
+            cls.readers[key] = cls(key[1], error_msgs)
+        return cls.readers[key].update()
+
+    def reset(self) -> None:
+        """Forget everything read so far."""
+        super().reset()
+        self.matched: dict[str, set[str]] = {}
+        self._window = b""
+
+    def parse_file(self, file, compressed: bool) -> None:
+        """Search the new bytes for the signatures not found yet."""
+        while chunk := file.read(self.chunk_size):
+            self.offset += len(chunk)
+            data = self._window + chunk
+            self._matcher.search(data, self.matched)
+            self._window = data[-self._overlap :] if self._overlap else b""
+
+    def found(self) -> list[tuple[str, str]]:
+        """The (error, message) pairs found so far, in the order of error_msgs."""
+        return [(err, msg) for err, msgs in self.error_msgs.items() for msg in msgs if msg in self.matched.get(err, ())]
+
+
+class SignatureMatch(NamedTuple):
+    """A match of :class:`MultiPatternMatcher`."""
+
+    key: str
+    signature: str
+    text: bytes
+    groups: tuple[bytes | None, ...]
+
+
+class MultiPatternMatcher:
+    """
+    Error signatures of a handler compiled once, to be shared by all the
+    checks. Signatures are grouped by error key, and matches are mapped back
+    to their key.
+
+    Regex signatures are combined into a single alternation, so the whole
+    output (bytes, or an mmap of the file) is scanned in one pass of the
+    regex engine. Patterns are matched against the whole text rather than
+    line by line, and two different signatures overlapping in the text are
+    only both found if they also occur apart.
+
+    Literal signatures are searched for in one pass too, with an alternation
+    of lookaheads tried at every position of the text, the longest literals
+    first. Each match also stands for the literals that are a prefix of it,
+    so that all the literals present are found even where they overlap.
+    """
+
+    def __init__(self, signatures: dict[str, list[str]], regex: bool = False) -> None:
+        """
+        Args:
+            signatures (dict): Mapping of error key to the list of signatures
+                of that error.
+            regex (bool): Whether the signatures are regular expressions
+                rather than literal messages.
+        """
+        self.signatures = signatures
+        self.regex = regex
+        self._signatures = [(key, sig, sig.encode()) for key, sigs in signatures.items() for sig in sigs]
+        # each signature is wrapped in a named group, followed by its own groups
+        parts = []
+        self._group_slices: dict[str, tuple[int, slice]] = {}
+        n_groups = 0
+        for idx, (_, _, pattern) in enumerate(self._signatures):
+            pattern = pattern if regex else re.escape(pattern)
+            inner_groups = re.compile(pattern).groups
+            parts.append(b"(?P<s%d>%s)" % (idx, pattern))
+            self._group_slices[f"s{idx}"] = (idx, slice(n_groups + 1, n_groups + 1 + inner_groups))
+            n_groups += 1 + inner_groups
+        self.pattern = re.compile(b"|".join(parts))
+
+        # literal -> (key, signature) pairs, and the literals found with each match
+        self._literals: dict[bytes, list[tuple[str, str]]] = {}
+        for key, sig, literal in self._signatures:
+            self._literals.setdefault(literal, []).append((key, sig))
+        literals = sorted(self._literals, key=len, reverse=True)
+        self._literal_pattern = re.compile(b"(?=(%s))" % b"|".join(map(re.escape, literals)))
+        self._prefixes = {literal: [other for other in literals if literal.startswith(other)] for literal in literals}
+
+    def finditer(self, buffer) -> Iterator[SignatureMatch]:
+        """
+        Iterate over the non-overlapping signature matches, in text order.
+
+        Args:
+            buffer: bytes-like object or mmap.
+        """
+        for match in self.pattern.finditer(buffer):
+            idx, groups = self._group_slices[match.lastgroup]
+            key, sig, _ = self._signatures[idx]
+            yield SignatureMatch(key, sig, match[0], match.groups()[groups])
+
+    def search(self, buffer, matched: dict[str, set[str]] | None = None) -> dict[str, set[str]]:
+        """
+        Find the signatures present in a buffer.
+
+        Args:
+            buffer: bytes-like object or mmap.
+            matched (dict): Signatures already found, updated in place. They
+                are not searched for again.
+
+        Returns:
+            dict: error key -> set of the signatures found.
+        """
+        matched = {} if matched is None else matched
+        if self.regex:
+            for match in self.finditer(buffer):
+                matched.setdefault(match.key, set()).add(match.signature)
+        else:
+            for match in self._literal_pattern.finditer(buffer):
+                for literal in self._prefixes[match[1]]:
+                    for key, sig in self._literals[literal]:
+                        matched.setdefault(key, set()).add(sig)
+        return matched
+
+    def search_file(self, filepath: str) -> dict[str, set[str]]:
+        """Find the signatures present in a file, memory-mapping it when not compressed."""
+        if filepath.lower().endswith((".gz", ".bz2", ".xz", ".lzma")):
+            with zopen(filepath, mode="rb") as file:
+                return self.search(file.read())
+        with open(filepath, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return {}
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return self.search(buffer)
+
+
+class SignatureMatcher:
+    """
+    Streaming matcher for error signatures. Lines are fed one at a time and
+    every signature found is recorded against its error key.
+
+    Used together with :class:`StreamTee` so that handlers learn about error
+    messages as soon as the line is emitted, instead of re-reading the whole
+    output file on every check.
+    """
+
+    def __init__(self, error_msgs: dict[str, list[str]]) -> None:
+        """
+        Args:
+            error_msgs (dict): Mapping of error key to the list of messages
+                signalling that error, e.g. VaspErrorHandler.error_msgs.
+        """
+        self.error_msgs = error_msgs
+        self.matched: dict[str, set[str]] = {}
+        self._matcher = MultiPatternMatcher(error_msgs)
+
+    def feed(self, line: str) -> None:
+        """Record all the signatures present in a line of output."""
+        self._matcher.search(line.encode(), self.matched)
+
+
+class StreamTee:
+    """
+    Owns the stdout pipe of a running job. A reader thread copies the stream
+    to disk (optionally gzip compressed on the fly) and feeds every line to the
+    registered streaming matchers.
+
+    Running tees are tracked by the absolute path of their (uncompressed)
+    output file, so that handlers can look them up with :meth:`StreamTee.get`.
+    """
+
+    active: ClassVar[dict[str, StreamTee]] = {}
+
+    def __init__(self, stream, filename: str, compress: bool = False, process=None) -> None:
+        """
+        Args:
+            stream: Binary file-like object to read from, e.g. Popen.stdout.
+            filename (str): Output file the stream is written to. If compress
+                is True, ".gz" is appended to the name written on disk.
+            compress (bool): Whether to gzip the output on the fly. Defaults
+                to False.
+            process (subprocess.Popen): Process writing to the stream. Used by
+                :meth:`drain` to know when the stream has been fully written.
+        """
+        self.stream = stream
+        self.filename = filename
+        self.compress = compress
+        self.process = process
+        self.path = f"{filename}.gz" if compress else filename
+        self.matchers: list = []
+        self._lock = threading.Lock()
+        self._file = open(self.path, "wb")  # noqa: SIM115
+        self._compressor = zlib.compressobj(wbits=31) if compress else None
+        self._thread = threading.Thread(target=self._pump, name=f"StreamTee({filename})", daemon=True)
+
+    @classmethod
+    def get(cls, filename: str) -> StreamTee | None:
+        """Return the tee currently writing to filename, if any."""
+        return cls.active.get(os.path.abspath(filename))
+
+    def start(self) -> StreamTee:
+        """Start the reader thread and register the tee as active."""
+        StreamTee.active[os.path.abspath(self.filename)] = self
+        self._thread.start()
+        return self
+
+    def add_matcher(self, matcher) -> None:
+        """
+        Register a streaming matcher, i.e. any object with a feed(line) method.
+        The output written so far is replayed into the matcher, so that no
+        line is missed regardless of when the matcher is registered.
+        """
+        with self._lock:
+            if not self._file.closed:
+                if self._compressor is not None:
+                    self._file.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+                self._file.flush()
+            with open(self.path, "rb") as file:
+                data = file.read()
+            if self.compress:
+                data = zlib.decompressobj(wbits=31).decompress(data)
+            for line in data.decode("utf-8", errors="replace").splitlines():
+                matcher.feed(line)
+            self.matchers.append(matcher)
+
+    def drain(self, timeout: float | None = None) -> None:
+        """Wait for the reader thread to finish if the writing process has exited."""
+        if self.process is not None and self.process.poll() is not None:
+            self._thread.join(timeout)
+
+    def _pump(self) -> None:
+        try:
+            for raw in iter(self.stream.readline, b""):
+                with self._lock:
+                    if self._compressor is not None:
+                        self._file.write(self._compressor.compress(raw))
+                    else:
+                        self._file.write(raw)
+                        self._file.flush()
+                    line = raw.decode("utf-8", errors="replace")
+                    for matcher in self.matchers:
+                        matcher.feed(line)
+        finally:
+            with self._lock:
+                if self._compressor is not None:
+                    self._file.write(self._compressor.flush())
+                self._file.close()
+            self.stream.close()
+            if StreamTee.active.get(os.path.abspath(self.filename)) is self:
+                del StreamTee.active[os.path.abspath(self.filename)]
+
+
+# Process launched by the job running in a directory (see register_job_process).
+_job_launchers: dict[str, psutil.Process] = {}
+
+
+def register_job_process(directory: str, pid: int | None) -> None:
+    """
+    Record the process launched by the job running in a directory, e.g. the
+    Popen of mpirun, whose descendants are the processes of the job (see
+    :func:`job_processes`).
+
+    Args:
+        directory (str): directory the job runs in.
+        pid (int): pid of the process, or None to forget it.
+    """
+    directory = os.path.realpath(directory)
+    _job_launchers.pop(directory, None)
+    if pid is not None:
+        with contextlib.suppress(psutil.NoSuchProcess):
+            _job_launchers[directory] = psutil.Process(pid)
+
+
+def job_processes(directory: str = "./") -> list[psutil.Process]:
+    """
+    Processes of the job running in a directory, i.e. the process launched by
+    the job (see :func:`register_job_process`), e.g. mpirun, and its
+    descendants. If no launcher is registered or it has exited, e.g. because
+    it detached from the ranks it started, the processes of the same user
+    whose working directory is the job directory are used instead, excluding
+    the current process and its ancestors. Ranks running on other nodes are
+    not visible.
+
+    Args:
+        directory (str): directory the job runs in.
+
+    Returns:
+        list[psutil.Process]: processes of the job.
+    """
+    directory = os.path.realpath(directory)
+    launcher = _job_launchers.get(directory)
+    with contextlib.suppress(psutil.NoSuchProcess):
+        if launcher is not None and launcher.is_running() and launcher.status() != psutil.STATUS_ZOMBIE:
+            return [launcher, *launcher.children(recursive=True)]
+
+    current = psutil.Process()
+    excluded = {current.pid} | {proc.pid for proc in current.parents()}
+    username = current.username()
+    processes = []
+    for proc in psutil.process_iter(["cwd", "username"]):
+        if proc.pid in excluded or proc.info["username"] != username:
+            continue
+        if proc.info["cwd"] and os.path.realpath(proc.info["cwd"]) == directory:
+            processes.append(proc)
+    return processes
+
+
+def memory_limit(cgroup_root: str = "/sys/fs/cgroup") -> int:
+    """
+    Memory available to the current process and its children, i.e. the
+    smallest memory limit of its cgroup and their ancestors (cgroup v2
+    memory.max or v1 memory.limit_in_bytes), or the total memory of the node.
+
+    Args:
+        cgroup_root (str): mount point of the cgroup file systems.
+
+    Returns:
+        int: memory limit in bytes.
+    """
+    limit = psutil.virtual_memory().total
+    try:
+        with open("/proc/self/cgroup") as file:
+            lines = file.read().splitlines()
+    except OSError:
+        return limit
+    for line in lines:
+        _, controllers, path = line.split(":", 2)
+        if not controllers:
+            base, filename = cgroup_root, "memory.max"
+        elif "memory" in controllers.split(","):
+            base, filename = os.path.join(cgroup_root, "memory"), "memory.limit_in_bytes"
+        else:
+            continue
+        parts = [part for part in path.split("/") if part]
+        for depth in range(len(parts) + 1):
+            with contextlib.suppress(OSError, ValueError), open(os.path.join(base, *parts[:depth], filename)) as file:
+                limit = min(limit, int(file.read().strip()))
+    return limit
+
+
+class ProcessSample(NamedTuple):
+    """Resource usage of one process of a job."""
+
+    cpu_time: float
+    voluntary_ctx_switches: int
+    io_bytes: int | None
+    memory: int
+
+
+class ProcessTreeMonitor:
+    """
+    Monitor of the resource usage of the processes of a job (see
+    :func:`job_processes`), sampled at each update. It tracks since when all
+    the compute processes have been idle, since when none of them did any I/O
+    or blocked voluntarily, and the total memory over time. The memory of a
+    process is its proportional set size (PSS) where available, so that the
+    pages shared by the MPI ranks, e.g. libraries and shared memory windows,
+    are only counted once, and its resident set size (RSS) otherwise.
+
+    Launchers such as mpirun, srun or hydra use little CPU time but wake up
+    regularly, so that a deadlocked job would never look stalled. Only the
+    compute processes, which used at least compute_cpu_share of the CPU time
+    of the busiest process of the job, are considered.
+    """
+
+    def __init__(
+        self,
+        directory: str = "./",
+        idle_cpu_fraction: float = 0.05,
+        max_samples: int = 64,
+        compute_cpu_share: float = 0.1,
+    ) -> None:
+        """
+        Args:
+            directory (str): directory the job runs in.
+            idle_cpu_fraction (float): fraction of a core under which a process
+                is considered idle between two samples.
+            max_samples (int): number of (time, total memory) samples kept.
+            compute_cpu_share (float): share of the CPU time of the busiest
+                process of the job from which a process is a compute process.
+        """
+        self.directory = directory
+        self.idle_cpu_fraction = idle_cpu_fraction
+        self.compute_cpu_share = compute_cpu_share
+        self.max_samples = max_samples
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all the samples, e.g. when a new job starts."""
+        self.samples: dict[int, ProcessSample] = {}
+        self.sample_time: float | None = None
+        self.idle_since: float | None = None
+        self.stalled_since: float | None = None
+        self.memory_history: list[tuple[float, int]] = []
+        self.peak_memory = 0
+
+    @staticmethod
+    def sample(proc: psutil.Process) -> ProcessSample:
+        """Sample the resource usage of a process."""
+        with proc.oneshot():
+            cpu_times = proc.cpu_times()
+            try:
+                io_counters = proc.io_counters()
+                io_bytes = io_counters.read_bytes + io_counters.write_bytes
+            except (AttributeError, psutil.AccessDenied):
+                io_bytes = None
+            try:
+                memory = proc.memory_full_info().pss
+            except (AttributeError, psutil.AccessDenied):
+                memory = proc.memory_info().rss
+            return ProcessSample(
+                cpu_times.user + cpu_times.system,
+                proc.num_ctx_switches().voluntary,
+                io_bytes,
+                memory,
+            )
+
+    def update(self) -> bool:
+        """
+        Sample the processes of the job.
+
+        Returns:
+            bool: whether the job has any process to sample.
+        """
+        now = time.time()
+        samples = {}
+        for proc in job_processes(self.directory):
+            with contextlib.suppress(psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                samples[proc.pid] = self.sample(proc)
+        if not samples:
+            self.reset()
+            return False
+
+        common = samples.keys() & self.samples.keys()
+        if self.sample_time is None or not common or common != samples.keys():
+            # new processes are starting: not idle nor stalled
+            self.idle_since = self.stalled_since = None
+        else:
+            elapsed = now - self.sample_time
+            max_cpu_time = max(sample.cpu_time for sample in samples.values())
+            compute = [pid for pid in common if samples[pid].cpu_time >= self.compute_cpu_share * max_cpu_time]
+            idle = all(
+                samples[pid].cpu_time - self.samples[pid].cpu_time < self.idle_cpu_fraction * elapsed for pid in compute
+            )
+            stalled = all(
+                samples[pid].io_bytes is not None
+                and samples[pid].io_bytes == self.samples[pid].io_bytes
+                and samples[pid].voluntary_ctx_switches == self.samples[pid].voluntary_ctx_switches
+                for pid in compute
+            )
+            self.idle_since = (self.idle_since or self.sample_time) if idle else None
+            self.stalled_since = (self.stalled_since or self.sample_time) if stalled else None
+
+        memory = sum(sample.memory for sample in samples.values())
+        self.peak_memory = max(self.peak_memory, memory)
+        self.memory_history = [*self.memory_history, (now, memory)][-self.max_samples :]
+        self.samples, self.sample_time = samples, now
+        return True
+
+    def idle_time(self) -> float:
+        """Time in seconds all the compute processes have been idle, as of the last update."""
+        return 0.0 if self.idle_since is None else self.sample_time - self.idle_since
+
+    def stalled_time(self) -> float:
+        """Time in seconds no compute process did any I/O or blocked voluntarily, as of the last update."""
+        return 0.0 if self.stalled_since is None else self.sample_time - self.stalled_since
+
+    def is_frozen(self, output_age: float, idle_timeout: float, stall_timeout: float) -> bool:
+        """
+        Whether the job looks frozen: its output file has not been updated
+        and, for as long, all its compute processes have been idle (idle_timeout) or
+        busy without any I/O or voluntary context switch, e.g. spinning in a
+        deadlocked MPI call (stall_timeout).
+
+        Args:
+            output_age (float): time in seconds since the output file was modified.
+            idle_timeout (float): idle time in seconds after which the job is frozen.
+            stall_timeout (float): stalled time in seconds after which the job is frozen.
+        """
+        return min(self.idle_time(), output_age) > idle_timeout or min(self.stalled_time(), output_age) > stall_timeout
@@ -6,7 +6,10 @@ by modifying the input files.
 
 from __future__ import annotations
 
+import contextlib
+import copy
 import datetime
+import json
 import logging
 import multiprocessing
 import os
@@ -15,27 +18,53 @@ import shutil
 import time
 import warnings
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from math import ceil, prod
+from statistics import NormalDist
 from typing import ClassVar
 
 import numpy as np
+import psutil
 from monty.dev import deprecated
-from monty.io import zopen
 from monty.os.path import zpath
 from monty.serialization import loadfn
-from pymatgen.core.structure import Structure
-from pymatgen.io.vasp.inputs import Incar, Kpoints, Poscar, VaspInput
-from pymatgen.io.vasp.outputs import Oszicar
-from pymatgen.io.vasp.sets import MPScanRelaxSet
-from pymatgen.transformations.standard_transformations import SupercellTransformation
 
 from custodian.ansible.actions import FileActions
 from custodian.ansible.interpreter import Modder
 from custodian.custodian import ErrorHandler
-from custodian.utils import backup
+from custodian.utils import (
+    InputTransaction,
+    ProcessTreeMonitor,
+    SignatureMatcher,
+    SignatureScanner,
+    StreamTee,
+    backup,
+    lazy_imports,
+    memory_limit,
+)
 from custodian.vasp.interpreter import VaspModder
-from custodian.vasp.io import load_outcar, load_vasprun
-from custodian.vasp.utils import increase_k_point_density, is_valid_poscar
+from custodian.vasp.io import (
+    IncrementalOszicar,
+    IncrementalOutcar,
+    load_outcar,
+    load_poscar,
+    load_vasp_input,
+    load_vasprun_summary,
+    neb_image_inputs,
+    read_incar,
+    read_kpoints_header,
+    read_poscar_header,
+)
+from custodian.vasp.utils import (
+    CorrectionHistory,
+    fit_linear_trend,
+    increase_k_point_density,
+    is_valid_poscar,
+    neb_image_dirs,
+    predict_scf_convergence,
+    predict_step_time,
+    system_features,
+)
 
 __author__ = (
     "Shyue Ping Ong, William Davidson Richards, Anubhav Jain, Wei Chen, Stephen Dacek, Andrew Rosen, Janosh Riebesell"
@@ -58,6 +87,17 @@ VASP_BACKUP_FILES = {
     "std_err.txt",
 }
 
+# pymatgen objects formerly imported at module level, now resolved on first
+# access (PEP 562) so that importing the handlers stays cheap.
+_LAZY_IMPORTS = {
+    "Structure": "pymatgen.core.structure",
+    "Kpoints": "pymatgen.io.vasp.inputs",
+    "MPScanRelaxSet": "pymatgen.io.vasp.sets",
+    "SupercellTransformation": "pymatgen.transformations.standard_transformations",
+}
+
+__getattr__ = lazy_imports(__name__, _LAZY_IMPORTS)
+
 
 class VaspErrorHandler(ErrorHandler):
     """
@@ -142,11 +182,26 @@ class VaspErrorHandler(ErrorHandler):
         "spin_polarized_harris": ["Spin polarized Harris functional dynamics is a good joke"],
     }
 
+    # Number of rungs of the corrections of these errors that are selected by
+    # error_count, and can therefore be reordered with a correction history.
+    # brmix is left out: its rungs skip and fall through to one another
+    # depending on OUTCAR and INCAR, and the last one deletes the WAVECAR and
+    # CHGCAR that the first one restarts from.
+    correction_ladders: ClassVar = {
+        "algo_tet": 2,
+        "brions": 2,
+        "fexcf": 2,
+        "ibzkpt": 2,
+        "subspacematrix": 3,
+        "zbrent": 2,
+    }
+
     def __init__(
         self,
         output_filename="vasp.out",
         errors_subset_to_catch=None,
         vtst_fixes=False,
+        history=None,
         **kwargs,
     ) -> None:
         """Initialize the handler with the output file to check.
@@ -170,6 +225,14 @@ class VaspErrorHandler(ErrorHandler):
             vtst_fixes (bool): Whether to consider VTST optimizers. Defaults to
                 False for compatibility purposes, but if you have VTST, you
                 would likely benefit from setting this to True.
+            history (str | list[str]): Glob patterns of past custodian.json
+                run logs. If set, the rungs of the correction ladders in
+                correction_ladders are tried in the order of their success
+                rate for similar calculations in these logs (see
+                :class:`custodian.vasp.utils.CorrectionHistory`), falling back
+                to the usual order for errors without enough history. The
+                rungs applied and the system features are recorded in the
+                corrections for later runs to learn from. Defaults to None.
             **kwargs: Ignored. Added to increase signature flexibility.
         """
         self.output_filename = output_filename
@@ -177,50 +240,81 @@ class VaspErrorHandler(ErrorHandler):
         self.error_count: Counter[str] = Counter()
         self.errors_subset_to_catch = errors_subset_to_catch or list(VaspErrorHandler.error_msgs)
         self.vtst_fixes = vtst_fixes
+        self.history = history
+        self._correction_history: CorrectionHistory | None = None
+        self._tried_rungs: dict[str, set[int]] = {}
         self.logger = logging.getLogger(type(self).__name__)
+        self._stream_matcher: tuple[StreamTee, SignatureMatcher] | None = None
+
+    def _find_signatures(self, directory: str) -> list[tuple[str, str]]:
+        """
+        Find the (error, message) pairs present in the output file. If the job
+        stdout is captured by a StreamTee, the signatures are taken from a
+        streaming matcher, otherwise from a scanner following the file.
+        """
+        subset = {err: self.error_msgs[err] for err in self.errors_subset_to_catch}
+        if tee := StreamTee.get(os.path.join(directory, self.output_filename)):
+            if self._stream_matcher is None or self._stream_matcher[0] is not tee:
+                matcher = SignatureMatcher(subset)
+                tee.add_matcher(matcher)
+                self._stream_matcher = (tee, matcher)
+            tee.drain()
+            matched = self._stream_matcher[1].matched
+            return [(err, msg) for err, msgs in subset.items() for msg in msgs if msg in matched.get(err, ())]
+
+        # The output may have been compressed on the fly by a tee that is done.
+        return SignatureScanner.for_file(zpath(os.path.join(directory, self.output_filename)), subset).found()
 
     def check(self, directory="./"):
         """Check for error."""
-        incar = Incar.from_file(os.path.join(directory, "INCAR"))
+        incar = read_incar(os.path.join(directory, "INCAR"))
         self.errors = set()
         error_msgs = set()
-        with zopen(os.path.join(directory, self.output_filename), mode="rt", encoding="utf-8") as file:
-            text = file.read()
-
-            # Check for errors
-            for err in self.errors_subset_to_catch:
-                for msg in self.error_msgs[err]:
-                    if text.find(msg) != -1:
-                        # this checks if we want to run a charged
-                        # computation (e.g., defects) if yes we don't
-                        # want to kill it because there is a change in
-                        # e-density (brmix error)
-                        if err == "brmix" and "NELECT" in incar:
-                            continue
-
-                        # Treat auto_nbands only as a warning, do not fail a job
-                        if err == "auto_nbands":
-                            if nbands := self._get_nbands_from_outcar(directory):
-                                outcar = load_outcar(os.path.join(directory, "OUTCAR"))
-                                if (nelect := outcar.nelect) and (nbands > 2 * nelect):
-                                    warnings.warn(
-                                        "NBANDS seems to be too high. The electronic structure may be inaccurate. "
-                                        "You may want to rerun this job with a smaller number of cores.",
-                                        UserWarning,
-                                    )
-                            continue
-
-                        self.errors.add(err)
-                        error_msgs.add(msg)
+        for err, msg in self._find_signatures(directory):
+            # this checks if we want to run a charged
+            # computation (e.g., defects) if yes we don't
+            # want to kill it because there is a change in
+            # e-density (brmix error)
+            if err == "brmix" and "NELECT" in incar:
+                continue
+
+            # Treat auto_nbands only as a warning, do not fail a job
+            if err == "auto_nbands":
+                if nbands := self._get_nbands_from_outcar(directory):
+                    outcar = IncrementalOutcar.for_file(os.path.join(directory, "OUTCAR"))
+                    if (nelect := outcar.nelect) and (nbands > 2 * nelect):
+                        warnings.warn(
+                            "NBANDS seems to be too high. The electronic structure may be inaccurate. "
+                            "You may want to rerun this job with a smaller number of cores.",
+                            UserWarning,
+                        )
+                continue
+
+            self.errors.add(err)
+            error_msgs.add(msg)
         for msg in error_msgs:
-            self.logger.error(msg, extra={"incar": incar.as_dict()})
+            self.logger.error(msg, extra={"incar": incar.to_incar().as_dict()})
         return len(self.errors) > 0
 
     def correct(self, directory="./"):
         """Perform corrections."""
+        from pymatgen.io.vasp.inputs import Kpoints
+        from pymatgen.transformations.standard_transformations import SupercellTransformation
+
         backup(VASP_BACKUP_FILES | {self.output_filename}, directory=directory)
         actions = []
-        vi = VaspInput.from_directory(directory)
+        # Fewer MPI ranks are only requested for subspacematrix. auto_nbands is
+        # a warning that does not stop the job, and the symmetry errors (pricel,
+        # posmap, pricelv) depend on SYMPREC and the cell, not on the number of
+        # ranks, even if they are more frequent for small cells on many cores.
+        nranks = None
+        vi = load_vasp_input(directory)
+
+        if self.history:
+            features = system_features(vi)
+            rungs = {
+                err: self._select_rung(err, features) for err in sorted(self.errors & self.correction_ladders.keys())
+            }
 
         if "tet" in self.errors:
             actions.append({"dict": "INCAR", "action": {"_set": {"ISMEAR": 0, "SIGMA": 0.05}}})
@@ -407,8 +501,7 @@ class VaspErrorHandler(ErrorHandler):
             # is set to a large value for a small structure.
 
             try:
-                oszicar = Oszicar(os.path.join(directory, "OSZICAR"))
-                nsteps = len(oszicar.ionic_steps)
+                nsteps = IncrementalOszicar.for_file(os.path.join(directory, "OSZICAR")).n_ionic_steps
             except Exception:
                 nsteps = 0
 
@@ -436,6 +529,8 @@ class VaspErrorHandler(ErrorHandler):
                 actions.append({"dict": "INCAR", "action": {"_set": {"LREAL": False}}})
             elif self.error_count["subspacematrix"] == 1 and vi["INCAR"].get("PREC", "Normal") != "Accurate":
                 actions.append({"dict": "INCAR", "action": {"_set": {"PREC": "Accurate"}}})
+            elif self.error_count["subspacematrix"] == 2 and (ranks := _get_mpi_ranks(directory) or 0) > 1:
+                nranks = ranks // 2
             self.error_count["subspacematrix"] += 1
 
         if (
@@ -759,25 +854,129 @@ class VaspErrorHandler(ErrorHandler):
             self.error_count["algo_tet"] += 1
 
         VaspModder(vi=vi, directory=directory).apply_actions(actions)
-        return {"errors": list(self.errors), "actions": actions}
+        correction = {"errors": list(self.errors), "actions": actions}
+        if nranks:
+            correction["nranks"] = nranks
+        if self.history:
+            for err, rung in rungs.items():
+                # record the rung actually applied, as a correction may skip rungs that do not apply
+                rungs[err] = max(self.error_count[err] - 1, rung)
+                self._tried_rungs[err].update(range(rung, rungs[err] + 1))
+            correction.update(rungs=rungs, features=features)
+        return correction
+
+    def _select_rung(self, error: str, features: dict) -> int:
+        """
+        Set error_count to the rung of the correction ladder of error to
+        apply: the untried rung with the best history, or else the next
+        untried rung in the usual order.
+        """
+        if self._correction_history is None:
+            self._correction_history = CorrectionHistory(self.history)
+        tried = self._tried_rungs.setdefault(error, set())
+        untried = [rung for rung in range(self.correction_ladders[error]) if rung not in tried]
+        rung = self._correction_history.best(error, features, untried) if untried else None
+        if rung is None:
+            rung = self.error_count[error]
+            if untried and (rung in tried or rung >= self.correction_ladders[error]):
+                # the ladder was entered midway: go back to its first untried rung
+                rung = untried[0]
+        self.error_count[error] = rung
+        return rung
 
     @staticmethod
     def _get_nbands_from_outcar(directory: str) -> int | None:
-        nbands = None
         if os.path.isfile(outcar_path := os.path.join(directory, "OUTCAR")):
-            with open(outcar_path) as file:
-                for line in file:
-                    # Have to take the last NBANDS line since sometimes VASP
-                    # updates it automatically even if the user specifies it.
-                    # The last one is marked by NBANDS= (no space).
-                    if "NBANDS=" in line:
-                        try:
-                            d = line.split("=")
-                            nbands = int(d[-1].strip())
-                            break
-                        except (IndexError, ValueError):
-                            pass
-        return nbands
+            return IncrementalOutcar.for_file(outcar_path).nbands
+        return None
+
+
+def _get_mpi_ranks(directory: str) -> int | None:
+    """Number of MPI ranks of the last run, from its OUTCAR."""
+    if os.path.isfile(outcar_path := os.path.join(directory, "OUTCAR")):
+        return IncrementalOutcar.for_file(outcar_path).nranks
+    return None
+
+
+def preflight_corrections(directory: str = "./") -> list[dict]:
+    """
+    Check the VASP inputs of a directory for errors that VaspErrorHandler
+    would only detect after a failed launch.
+
+    The corrections are those the handler would apply. The checks are:
+
+    - tet/dentet: tetrahedron method with fewer than 4 k-points.
+    - algo_tet: ALGO = All/Damped (or IALGO = 5X) with ISMEAR < 0.
+    - amin: a lattice vector longer than 50 A and AMIN above 0.01.
+    - dfpt_ncore: NCORE or NPAR set for DFPT or PEAD calculations.
+    - zpotrf: NCORE or NPAR above 1 for fewer than 5 atoms.
+    - elf_kpar: KPAR above 1 with LELF.
+
+    Args:
+        directory (str): Directory containing the VASP input files.
+
+    Returns:
+        list[dict]: Corrections in the format returned by ErrorHandler.correct,
+            i.e. {"errors": [error], "actions": actions}.
+    """
+    if not os.path.isfile(incar_path := zpath(os.path.join(directory, "INCAR"))):
+        return []
+    incar = read_incar(incar_path)
+    poscar_path = zpath(os.path.join(directory, "POSCAR"))
+    poscar = read_poscar_header(poscar_path) if os.path.isfile(poscar_path) else None
+    corrections = []
+
+    ismear = incar.get("ISMEAR", 1)
+    n_kpts = _count_k_points(directory, incar, poscar)
+    if ismear <= -4 and n_kpts is not None and n_kpts < 4:
+        corrections.append(
+            {"errors": ["tet"], "actions": [{"dict": "INCAR", "action": {"_set": {"ISMEAR": 0, "SIGMA": 0.05}}}]}
+        )
+    elif ismear < 0 and (
+        str(incar.get("ALGO", "Normal")).lower() in {"all", "damped"} or 50 <= incar.get("IALGO", 38) <= 59
+    ):
+        corrections.append(
+            {"errors": ["algo_tet"], "actions": [{"dict": "INCAR", "action": {"_set": {"ALGO": "Fast"}}}]}
+        )
+
+    if poscar is not None and np.linalg.norm(poscar.lattice, axis=1).max() > 50 and incar.get("AMIN", 0.1) > 0.01:
+        corrections.append({"errors": ["amin"], "actions": [{"dict": "INCAR", "action": {"_set": {"AMIN": 0.01}}}]})
+
+    if incar.get("IBRION") in {7, 8} or incar.get("LEPSILON") or incar.get("LCALCEPS"):
+        if actions := [{"dict": "INCAR", "action": {"_unset": {tag: 0}}} for tag in ("NCORE", "NPAR") if tag in incar]:
+            corrections.append({"errors": ["dfpt_ncore"], "actions": actions})
+    elif poscar is not None and poscar.n_atoms < 5 and (incar.get("NCORE", 1) > 1 or incar.get("NPAR", 1) > 1):
+        actions = [{"dict": "INCAR", "action": {"_set": {"NCORE": 1}}}]
+        if incar.get("NPAR", 1) > 1:
+            actions.append({"dict": "INCAR", "action": {"_unset": {"NPAR": 1}}})
+        corrections.append({"errors": ["zpotrf"], "actions": actions})
+
+    if incar.get("LELF") and incar.get("KPAR", 1) != 1:
+        corrections.append({"errors": ["elf_kpar"], "actions": [{"dict": "INCAR", "action": {"_set": {"KPAR": 1}}}]})
+
+    return corrections
+
+
+def _count_k_points(directory: str, incar, poscar) -> int | None:
+    """Number of k-points of the mesh, or None if it cannot be told from the inputs."""
+    from pymatgen.io.vasp.inputs import Kpoints
+
+    kpoints_path = zpath(os.path.join(directory, "KPOINTS"))
+    if os.path.isfile(kpoints_path):
+        header = read_kpoints_header(kpoints_path)
+        modes = Kpoints.supported_modes
+        if header.style == modes.Line_mode:
+            return None
+        if header.num_kpts > 0:
+            return header.num_kpts
+        if header.style in {modes.Gamma, modes.Monkhorst}:
+            return prod(Kpoints.from_file(kpoints_path).kpts[0])
+        return None
+    if poscar is None:
+        return None
+    # VASP uses KSPACING = 0.5 when there is no KPOINTS file
+    reciprocal_lengths = np.linalg.norm(2 * np.pi * np.linalg.inv(poscar.lattice).T, axis=1)
+    return prod(max(1, ceil(length / incar.get("KSPACING", 0.5))) for length in reciprocal_lengths)
 
 
 class LrfCommutatorHandler(ErrorHandler):
@@ -806,21 +1005,15 @@ class LrfCommutatorHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check for error."""
-        self.errors = set()
-        with open(os.path.join(directory, self.output_filename)) as file:
-            for line in file:
-                line = line.strip()
-                for err, msgs in LrfCommutatorHandler.error_msgs.items():
-                    for msg in msgs:
-                        if line.find(msg) != -1:
-                            self.errors.add(err)
+        scanner = SignatureScanner.for_file(os.path.join(directory, self.output_filename), self.error_msgs)
+        self.errors = {err for err, _ in scanner.found()}
         return len(self.errors) > 0
 
     def correct(self, directory="./"):
         """Perform corrections."""
         backup(VASP_BACKUP_FILES | {self.output_filename}, directory=directory)
         actions = []
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
 
         if (
             "lrf_comm" in self.errors
@@ -862,21 +1055,15 @@ class StdErrHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check for error."""
-        self.errors = set()
-        with open(os.path.join(directory, self.output_filename)) as file:
-            for line in file:
-                line = line.strip()
-                for err, msgs in StdErrHandler.error_msgs.items():
-                    for msg in msgs:
-                        if line.find(msg) != -1:
-                            self.errors.add(err)
+        scanner = SignatureScanner.for_file(os.path.join(directory, self.output_filename), self.error_msgs)
+        self.errors = {err for err, _ in scanner.found()}
         return len(self.errors) > 0
 
     def correct(self, directory="./"):
         """Perform corrections."""
         backup(VASP_BACKUP_FILES | {self.output_filename}, directory=directory)
         actions = []
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
 
         if "kpoints_trans" in self.errors and self.error_count["kpoints_trans"] == 0:
             m = prod(vi["KPOINTS"].kpts[0])
@@ -921,28 +1108,24 @@ class AliasingErrorHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check for error."""
-        incar = Incar.from_file(os.path.join(directory, "INCAR"))
+        incar = read_incar(os.path.join(directory, "INCAR"))
         self.errors = set()
-        with open(os.path.join(directory, self.output_filename)) as file:
-            for line in file:
-                line = line.strip()
-                for err, msgs in AliasingErrorHandler.error_msgs.items():
-                    for msg in msgs:
-                        if line.find(msg) != -1:
-                            # this checks if we want to run a charged
-                            # computation (e.g., defects) if yes we don't
-                            # want to kill it because there is a change in e-
-                            # density (brmix error)
-                            if err == "brmix" and "NELECT" in incar:
-                                continue
-                            self.errors.add(err)
+        scanner = SignatureScanner.for_file(os.path.join(directory, self.output_filename), self.error_msgs)
+        for err, _ in scanner.found():
+            # this checks if we want to run a charged
+            # computation (e.g., defects) if yes we don't
+            # want to kill it because there is a change in e-
+            # density (brmix error)
+            if err == "brmix" and "NELECT" in incar:
+                continue
+            self.errors.add(err)
         return len(self.errors) > 0
 
     def correct(self, directory="./"):
         """Perform corrections."""
         backup(VASP_BACKUP_FILES | {self.output_filename}, directory=directory)
         actions = []
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
 
         if "aliasing" in self.errors:
             with open(os.path.join(directory, "OUTCAR")) as file:
@@ -1000,7 +1183,7 @@ class DriftErrorHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check for error."""
-        incar = Incar.from_file(os.path.join(directory, "INCAR"))
+        incar = read_incar(os.path.join(directory, "INCAR"))
         if incar.get("EDIFFG", 0.1) >= 0 or incar.get("NSW", 0) <= 1:
             # Only activate when force relaxing and ionic steps
             # NSW check prevents accidental effects when running DFPT
@@ -1010,16 +1193,16 @@ class DriftErrorHandler(ErrorHandler):
             self.max_drift = incar["EDIFFG"] * -1
 
         try:
-            outcar = load_outcar(os.path.join(directory, "OUTCAR"))
+            drift = IncrementalOutcar.for_file(os.path.join(directory, "OUTCAR")).drift
         except Exception:
             # Can't perform check if Outcar not valid
             return False
 
-        if len(outcar.data.get("drift", [])) < self.to_average:
+        if len(drift) < self.to_average:
             # Ensure enough steps to get average drift
             return False
 
-        curr_drift = outcar.data.get("drift", [])[::-1][: self.to_average]
+        curr_drift = drift[::-1][: self.to_average]
         curr_drift = np.average([np.linalg.norm(dct) for dct in curr_drift])
         return curr_drift > self.max_drift
 
@@ -1027,10 +1210,10 @@ class DriftErrorHandler(ErrorHandler):
         """Perform corrections."""
         backup(VASP_BACKUP_FILES, directory=directory)
         actions = []
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
 
         incar = vi["INCAR"]
-        outcar = load_outcar(os.path.join(directory, "OUTCAR"))
+        drift = IncrementalOutcar.for_file(os.path.join(directory, "OUTCAR")).drift
 
         # Move CONTCAR to POSCAR if valid
         if is_valid_poscar("CONTCAR", directory):
@@ -1051,7 +1234,7 @@ class DriftErrorHandler(ErrorHandler):
                 }
             )
 
-        curr_drift = outcar.data.get("drift", [])[::-1][: self.to_average]
+        curr_drift = drift[::-1][: self.to_average]
         curr_drift = np.average([np.linalg.norm(dct) for dct in curr_drift])
         VaspModder(vi=vi, directory=directory).apply_actions(actions)
         return {
@@ -1068,6 +1251,8 @@ class MeshSymmetryErrorHandler(ErrorHandler):
     """
 
     is_monitor = False
+    # VasprunSummary fields needed, only these are parsed from vasprun.xml
+    vasprun_fields: ClassVar = ("converged_electronic", "converged_ionic")
 
     def __init__(self, output_filename: str = "vasp.out", output_vasprun="vasprun.xml") -> None:
         """Initialize the handler with the output files to check.
@@ -1085,23 +1270,27 @@ class MeshSymmetryErrorHandler(ErrorHandler):
 
     def check(self, directory="./") -> bool:
         """Check for error."""
+        from pymatgen.io.vasp.inputs import Kpoints
+
         msg = "Reciprocal lattice and k-lattice belong to different class of lattices."
 
-        vi = VaspInput.from_directory(directory)
+        incar = read_incar(os.path.join(directory, "INCAR"))
         # disregard this error if KSPACING is set and no KPOINTS file is generated
-        if vi["INCAR"].get("KSPACING", False):
+        if incar.get("KSPACING", False):
             return False
 
         # According to VASP admins, you can disregard this error
         # if symmetry is off (i.e. ISYM = -1 or 0)
         # Also disregard if automatic KPOINT generation is used
-        if vi["INCAR"].get("ISYM", 2) <= 0 or (
-            vi["KPOINTS"] and vi["KPOINTS"].style == Kpoints.supported_modes.Automatic
+        kpoints_file = zpath(os.path.join(directory, "KPOINTS"))
+        if incar.get("ISYM", 2) <= 0 or (
+            os.path.isfile(kpoints_file)
+            and read_kpoints_header(kpoints_file).style == Kpoints.supported_modes.Automatic
         ):
             return False
 
         try:
-            v = load_vasprun(os.path.join(directory, self.output_vasprun))
+            v = load_vasprun_summary(os.path.join(directory, self.output_vasprun), fields=self.vasprun_fields)
             if v.converged:
                 return False
         except Exception:
@@ -1116,7 +1305,7 @@ class MeshSymmetryErrorHandler(ErrorHandler):
     def correct(self, directory="./"):
         """Perform corrections."""
         backup(VASP_BACKUP_FILES | {self.output_filename}, directory=directory)
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
         m = prod(vi["KPOINTS"].kpts[0])
         m = max(round(m ** (1 / 3)), 1)
         if vi["KPOINTS"] and vi["KPOINTS"].style.name.lower().startswith("m"):
@@ -1130,20 +1319,41 @@ class UnconvergedErrorHandler(ErrorHandler):
     """Check if a run is converged."""
 
     is_monitor = False
+    vasprun_fields: ClassVar = ("converged_electronic", "converged_ionic", "incar", "final_lattice_abc")
+
+    # Ladder of electronic settings, from the fastest to the most robust,
+    # applied to unconverged runs that are neither meta-GGA nor hybrid.
+    algo_ladder: ClassVar = {
+        "fast": {"ALGO": "Fast"},
+        "normal": {"ALGO": "Normal"},
+        "all": {"ALGO": "All", "ISEARCH": 1},
+        "mixing": {"ISTART": 1, "ALGO": "Normal", "NELMDL": -6, "BMIX": 0.001, "AMIX_MAG": 0.8, "BMIX_MAG": 0.001},
+    }
 
-    def __init__(self, output_filename: str = "vasprun.xml") -> None:
+    def __init__(self, output_filename: str = "vasprun.xml", history=None) -> None:
         """Initialize the handler with the output file to check.
 
         Args:
             output_filename (str): Filename for the vasprun.xml file. Change
                 this only if it is different from the default (unlikely).
+            history (str | list[str]): Glob patterns of past custodian.json
+                run logs. If set, the more robust rungs of algo_ladder are
+                tried in the order of their success rate for similar
+                calculations in these logs (see
+                :class:`custodian.vasp.utils.CorrectionHistory`) instead of
+                one after the other, as long as there is enough history. The
+                rung applied and the system features are recorded in the
+                corrections. Defaults to None.
         """
         self.output_filename = output_filename
+        self.history = history
+        self._correction_history: CorrectionHistory | None = None
+        self._tried_rungs: set[str] = set()
 
     def check(self, directory="./") -> bool:
         """Check for error."""
         try:
-            v = load_vasprun(os.path.join(directory, self.output_filename))
+            v = load_vasprun_summary(os.path.join(directory, self.output_filename), fields=self.vasprun_fields)
             if not v.converged:
                 return True
         except Exception:
@@ -1152,14 +1362,15 @@ class UnconvergedErrorHandler(ErrorHandler):
 
     def correct(self, directory="./"):
         """Perform corrections."""
-        v = load_vasprun(os.path.join(directory, self.output_filename))
+        v = load_vasprun_summary(os.path.join(directory, self.output_filename), fields=self.vasprun_fields)
         algo = v.incar.get("ALGO", "Normal").lower()
         actions = []
         errors = ["Unconverged"]
+        history_record = {}
         if not v.converged_electronic:
             # NOTE: This is the amin error handler
             # Sometimes an AMIN warning can appear with large unit cell dimensions, so we'll address it now
-            if max(v.final_structure.lattice.abc) > 50.0 and v.incar.get("AMIN", 0.1) > 0.01:
+            if max(v.final_lattice_abc) > 50.0 and v.incar.get("AMIN", 0.1) > 0.01:
                 actions.append({"dict": "INCAR", "action": {"_set": {"AMIN": 0.01}}})
 
             if (
@@ -1188,29 +1399,26 @@ class UnconvergedErrorHandler(ErrorHandler):
             # Ladder from VeryFast to Fast to Normal to All
             # (except for meta-GGAs and hybrids).
             # These progressively switch to more stable but more
-            # expensive algorithms.
+            # expensive algorithms, with mixing as last resort.
             if len(actions) == 0:
-                if algo == "veryfast":
-                    actions.append({"dict": "INCAR", "action": {"_set": {"ALGO": "Fast"}}})
-                elif algo == "fast":
-                    actions.append({"dict": "INCAR", "action": {"_set": {"ALGO": "Normal"}}})
-                elif algo == "normal" and v.incar.get("ISMEAR", 1) >= 0:
+                ladder = list(self.algo_ladder)[{"veryfast": 0, "fast": 1, "normal": 2}.get(algo, 3) :]
+                if v.incar.get("ISMEAR", 1) < 0 and "all" in ladder:
                     # NB: default for ISMEAR is 1. To avoid algo_tet errors, only set
                     # ALGO = ALL if ISMEAR >= 0
-                    actions.append({"dict": "INCAR", "action": {"_set": {"ALGO": "All", "ISEARCH": 1}}})
-                else:
-                    # Try mixing as last resort
-                    new_settings = {
-                        "ISTART": 1,
-                        "ALGO": "Normal",
-                        "NELMDL": -6,
-                        "BMIX": 0.001,
-                        "AMIX_MAG": 0.8,
-                        "BMIX_MAG": 0.001,
-                    }
-
-                    if not all(v.incar.get(k, "") == val for k, val in new_settings.items()):
-                        actions.append({"dict": "INCAR", "action": {"_set": new_settings}})
+                    ladder.remove("all")
+                rung = ladder[0]
+                if self.history:
+                    if self._correction_history is None:
+                        self._correction_history = CorrectionHistory(self.history)
+                    features = system_features(load_vasp_input(directory))
+                    untried = [name for name in ladder if name not in self._tried_rungs]
+                    rung = self._correction_history.best("Unconverged", features, untried) or rung
+                    self._tried_rungs.add(rung)
+                    history_record = {"rungs": {"Unconverged": rung}, "features": features}
+
+                new_settings = self.algo_ladder[rung]
+                if not all(v.incar.get(k, "") == val for k, val in new_settings.items()):
+                    actions.append({"dict": "INCAR", "action": {"_set": new_settings}})
 
         elif not v.converged_ionic:
             # Just continue optimizing and let other handlers fix ionic
@@ -1220,7 +1428,7 @@ class UnconvergedErrorHandler(ErrorHandler):
                 actions.append({"file": "CONTCAR", "action": {"_file_copy": {"dest": "POSCAR"}}})
 
         if actions:
-            vi = VaspInput.from_directory(directory)
+            vi = load_vasp_input(directory)
 
             # Check for PSMAXN errors - see extensive discussion here
             # https://github.com/materialsproject/custodian/issues/133
@@ -1237,10 +1445,10 @@ class UnconvergedErrorHandler(ErrorHandler):
 
             backup(VASP_BACKUP_FILES, directory=directory)
             VaspModder(vi=vi, directory=directory).apply_actions(actions)
-            return {"errors": errors, "actions": actions}
+            return {"errors": errors, "actions": actions, **history_record}
 
         # Unfixable error. Just return None for actions.
-        return {"errors": errors, "actions": None}
+        return {"errors": errors, "actions": None, **history_record}
 
 
 class IncorrectSmearingHandler(ErrorHandler):
@@ -1252,6 +1460,7 @@ class IncorrectSmearingHandler(ErrorHandler):
     """
 
     is_monitor = False
+    vasprun_fields: ClassVar = ("incar", "eigenvalue_band_properties")
 
     def __init__(self, output_filename: str = "vasprun.xml") -> None:
         """Initialize the handler with the output file to check.
@@ -1265,7 +1474,7 @@ class IncorrectSmearingHandler(ErrorHandler):
     def check(self, directory="./") -> bool:
         """Check for error."""
         try:
-            v = load_vasprun(os.path.join(directory, self.output_filename))
+            v = load_vasprun_summary(os.path.join(directory, self.output_filename), fields=self.vasprun_fields)
             # check whether bandgap is zero, tetrahedron smearing was used
             # and relaxation is performed.
             if v.eigenvalue_band_properties[0] == 0 and v.incar.get("ISMEAR", 1) < -3 and v.incar.get("NSW", 0) > 1:
@@ -1277,7 +1486,7 @@ class IncorrectSmearingHandler(ErrorHandler):
     def correct(self, directory="./"):
         """Perform corrections."""
         backup(VASP_BACKUP_FILES | {self.output_filename}, directory=directory)
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
 
         actions = [
             {"dict": "INCAR", "action": {"_set": {"ISMEAR": 2}}},
@@ -1298,6 +1507,7 @@ class KspacingMetalHandler(ErrorHandler):
     """
 
     is_monitor = False
+    vasprun_fields: ClassVar = ("incar", "eigenvalue_band_properties")
 
     def __init__(self, output_filename: str = "vasprun.xml") -> None:
         """Initialize the handler with the output file to check.
@@ -1311,7 +1521,7 @@ class KspacingMetalHandler(ErrorHandler):
     def check(self, directory="./") -> bool:
         """Check for error."""
         try:
-            v = load_vasprun(os.path.join(directory, self.output_filename))
+            v = load_vasprun_summary(os.path.join(directory, self.output_filename), fields=self.vasprun_fields)
             # check whether bandgap is zero and KSPACING is too large
             # using 0 as fallback value for KSPACING so that this handler does not trigger if KSPACING is not set
             if v.eigenvalue_band_properties[0] == 0 and v.incar.get("KSPACING", 0) > 0.22:
@@ -1322,8 +1532,11 @@ class KspacingMetalHandler(ErrorHandler):
 
     def correct(self, directory="./"):
         """Perform corrections."""
+        from pymatgen.core.structure import Structure
+        from pymatgen.io.vasp.sets import MPScanRelaxSet
+
         backup(VASP_BACKUP_FILES | {self.output_filename}, directory=directory)
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
 
         _dummy_structure = Structure(
             [1, 0, 0, 0, 1, 0, 0, 0, 1],
@@ -1381,35 +1594,21 @@ class LargeSigmaHandler(ErrorHandler):
 
     def check(self, directory="./") -> bool:
         """Check for error."""
-        incar = Incar.from_file(os.path.join(directory, "INCAR"))
+        incar = read_incar(os.path.join(directory, "INCAR"))
         if incar.get("ISMEAR", 1) < 0:
             # skip check
             return False
 
         try:
-            outcar = load_outcar(os.path.join(directory, self.output_filename))
-
             # get entropy terms, ionic step counts, and number of completed ionic steps
-            outcar.read_pattern(
-                {"smearing_entropy": r"entropy T\*S.*= *(\D\d*\.\d*)"},
-                postprocess=float,
-                reverse=False,
-                terminate_on_match=False,
-            )
-            outcar.read_pattern(
-                {"electronic_step_indices": r"Iteration\s*\d+\s*\(\s*(\d+)\s*\)"},
-                postprocess=int,
-                reverse=False,
-                terminate_on_match=False,
-            )
-            outcar.read_pattern({"completed_ionic_steps": r"(aborting loop)"}, reverse=False, terminate_on_match=False)
+            outcar = IncrementalOutcar.for_file(os.path.join(directory, self.output_filename))
 
-            completed_ionic_steps = len(outcar.data.get("completed_ionic_steps"))
+            completed_ionic_steps = outcar.completed_ionic_steps
             entropies_per_atom = [0.0 for _ in range(completed_ionic_steps)]
-            n_atoms = len(Structure.from_file(os.path.join(directory, "POSCAR")))
+            n_atoms = read_poscar_header(os.path.join(directory, "POSCAR")).n_atoms
 
-            electronic_step_indices = [step[0] for step in outcar.data.get("electronic_step_indices", [])]
-            smearing_entropy = outcar.data.get("smearing_entropy", [0.0 for _ in electronic_step_indices])
+            electronic_step_indices = outcar.electronic_step_indices
+            smearing_entropy = outcar.smearing_entropy
 
             ionic_step_idx = 0
             for electronic_step_idx, entropy in zip(electronic_step_indices, smearing_entropy, strict=False):
@@ -1419,7 +1618,6 @@ class LargeSigmaHandler(ErrorHandler):
                     entropies_per_atom[ionic_step_idx - 1] = entropy
 
             if len(entropies_per_atom) > 0:
-                n_atoms = len(Structure.from_file(os.path.join(directory, "POSCAR")))
                 self.entropy_per_atom = np.max(np.abs(entropies_per_atom)) / n_atoms
                 if self.entropy_per_atom > self.e_entropy_tol:
                     return True
@@ -1434,7 +1632,7 @@ class LargeSigmaHandler(ErrorHandler):
         """Perform corrections."""
         backup(VASP_BACKUP_FILES, directory=directory)
         actions = []
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
         ismear = vi["INCAR"].get("ISMEAR", 1)
         sigma = vi["INCAR"].get("SIGMA", 0.2)
 
@@ -1498,9 +1696,9 @@ class PotimErrorHandler(ErrorHandler):
     def check(self, directory="./") -> bool | None:
         """Check for error."""
         try:
-            oszicar = Oszicar(os.path.join(directory, self.output_filename))
-            n = len(Poscar.from_file(self.input_filename).structure)
-            max_dE = max(s["dE"] for s in oszicar.ionic_steps[1:]) / n
+            oszicar = IncrementalOszicar.for_file(os.path.join(directory, self.output_filename))
+            n = read_poscar_header(self.input_filename).n_atoms
+            max_dE = np.max(oszicar.dE[1:]) / n
             if max_dE > self.dE_threshold:
                 return True
         except Exception:
@@ -1510,7 +1708,7 @@ class PotimErrorHandler(ErrorHandler):
     def correct(self, directory="./"):
         """Perform corrections."""
         backup(VASP_BACKUP_FILES, directory=directory)
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
         potim = vi["INCAR"].get("POTIM", 0.5)
         ibrion = vi["INCAR"].get("IBRION", 0)
         if potim < 0.2 and ibrion != 3:
@@ -1528,11 +1726,16 @@ class FrozenJobErrorHandler(ErrorHandler):
     """
     Detects an error when the output file has not been updated
     in timeout seconds. Changes ALGO to Normal from Fast.
+
+    The processes of the job are also sampled (see
+    :class:`custodian.utils.ProcessTreeMonitor`), so that a job whose ranks
+    all went idle, or spin without any I/O, is detected within minutes
+    rather than after timeout, as long as its output is not updated either.
     """
 
     is_monitor = True
 
-    def __init__(self, output_filename: str = "vasp.out", timeout=21_600) -> None:
+    def __init__(self, output_filename: str = "vasp.out", timeout=21_600, idle_timeout=600, stall_timeout=1800) -> None:
         """Initialize the handler with the output file to check.
 
         Args:
@@ -1543,22 +1746,41 @@ class FrozenJobErrorHandler(ErrorHandler):
             timeout (int): The time in seconds between checks where if there
                 is no activity on the output file, the run is considered
                 frozen. Defaults to 3600 seconds, i.e., 1 hour.
+            idle_timeout (int): The time in seconds after which the run is
+                considered frozen if all its processes are idle and the output
+                file is not updated. None disables the sampling of processes.
+            stall_timeout (int): The time in seconds after which the run is
+                considered frozen if its processes do no I/O nor block
+                voluntarily and the output file is not updated. Increase it
+                for runs with very long electronic steps, e.g. hybrids.
         """
         self.output_filename = output_filename
         self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.stall_timeout = stall_timeout
+        self._process_monitor: ProcessTreeMonitor | None = None
 
     def check(self, directory="./") -> bool | None:
         """Check for error."""
         st = os.stat(os.path.join(directory, self.output_filename))
-        if time.time() - st.st_mtime > self.timeout:
+        output_age = time.time() - st.st_mtime
+        if output_age > self.timeout:
             return True
+        if self.idle_timeout is not None:
+            if self._process_monitor is None or self._process_monitor.directory != directory:
+                self._process_monitor = ProcessTreeMonitor(directory)
+            monitor = self._process_monitor
+            if monitor.update() and monitor.is_frozen(output_age, self.idle_timeout, self.stall_timeout):
+                return True
         return None
 
     def correct(self, directory="./"):
         """Perform corrections."""
+        if self._process_monitor is not None:
+            self._process_monitor.reset()
         backup(VASP_BACKUP_FILES | {self.output_filename}, directory=directory)
 
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
         actions = []
         if vi["INCAR"].get("ALGO", "Normal").lower() == "fast":
             actions.append({"dict": "INCAR", "action": {"_set": {"ALGO": "Normal"}}})
@@ -1570,6 +1792,148 @@ class FrozenJobErrorHandler(ErrorHandler):
         return {"errors": ["Frozen job"], "actions": actions}
 
 
+class MemoryPressureHandler(ErrorHandler):
+    """
+    Monitor of the memory of the processes of the job, with the pages shared
+    by its ranks counted once (see :class:`custodian.utils.ProcessTreeMonitor`),
+    against the memory limit of its cgroup or node (see
+    :func:`custodian.utils.memory_limit`). The job is terminated before it gets
+    killed when its memory exceeds a fraction of the limit, or when the trend
+    of its memory is confidently bound to reach the
+    limit within a horizon. The memory footprint is then reduced by, in order,
+    lowering KPAR, lowering NPAR or raising NCORE, setting LREAL = Auto, and
+    running on half the MPI ranks (see Job.reduce_ranks).
+
+    The peak memory of each attempt is written to log_filename as a JSON list
+    of records, rewritten whenever the peak rises.
+    """
+
+    is_monitor = True
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        horizon: float = 900,
+        confidence: float = 0.95,
+        window: int = 10,
+        max_memory: int | None = None,
+        log_filename: str = "memory_usage.json",
+    ) -> None:
+        """Initialize the handler.
+
+        Args:
+            threshold (float): Fraction of the memory limit above which the
+                job is terminated.
+            horizon (float): Time in seconds within which the trend of the
+                memory must reach the limit for the job to be terminated. It
+                should exceed the interval between two checks of the monitors.
+            confidence (float): Confidence level of the lower bound of the
+                growth rate of the memory used for the trend.
+            window (int): Number of most recent samples the trend is fitted on.
+                At least 3 samples are needed before trends are used.
+            max_memory (int): Memory limit in bytes. Defaults to the limit of
+                the cgroup of custodian, or the total memory of the node.
+            log_filename (str): File the peak memory of each attempt is
+                written to. Set to None to disable.
+        """
+        self.threshold = threshold
+        self.horizon = horizon
+        self.confidence = confidence
+        self.window = window
+        self.max_memory = max_memory
+        self.log_filename = log_filename
+        self._process_monitor: ProcessTreeMonitor | None = None
+        self._attempts: list[dict] | None = None
+        self._attempt: dict | None = None
+        self.logger = logging.getLogger(type(self).__name__)
+
+    def check(self, directory="./") -> bool:
+        """Check for error."""
+        if self._process_monitor is None or self._process_monitor.directory != directory:
+            self._process_monitor = ProcessTreeMonitor(directory, max_samples=self.window)
+            self._attempt = None
+        monitor = self._process_monitor
+        previous_pids = set(monitor.samples)
+        if not monitor.update():
+            self._attempt = None
+            return False
+        if previous_pids and not previous_pids & monitor.samples.keys():
+            # the previous job ended and another one started between two checks
+            monitor.reset()
+            monitor.update()
+            self._attempt = None
+        if self._attempt is None:
+            self._start_attempt(directory)
+
+        limit = self._attempt["memory_limit"]
+        if monitor.peak_memory > self._attempt["peak_memory"]:
+            self._attempt["peak_memory"] = monitor.peak_memory
+            self._write_log(directory)
+
+        times, memory = np.array(monitor.memory_history, dtype=float).T
+        if memory[-1] > self.threshold * limit:
+            return True
+        if len(memory) < 3 or times[-1] == times[0]:
+            return False
+        trend = fit_linear_trend(times - times[0], limit - memory)
+        z_score = NormalDist().inv_cdf(self.confidence)
+        time_to_limit = trend.reach(times[-1] - times[0], 0, z_score=-z_score) - (times[-1] - times[0])
+        return bool(time_to_limit < self.horizon)
+
+    def correct(self, directory="./"):
+        """Perform corrections."""
+        peak_memory = self._process_monitor.peak_memory if self._process_monitor is not None else None
+        if self._attempt is not None:
+            self._attempt["terminated"] = True
+            self._write_log(directory)
+            self._attempt = None
+        if self._process_monitor is not None:
+            self._process_monitor.reset()
+        backup(VASP_BACKUP_FILES, directory=directory)
+
+        vi = load_vasp_input(directory)
+        incar = vi["INCAR"]
+        n_cores = psutil.cpu_count(logical=False) or multiprocessing.cpu_count()
+        lreal = incar.get("LREAL", False)
+        actions: list[dict] | None = []
+        if incar.get("KPAR", 1) > 1:
+            actions.append({"dict": "INCAR", "action": {"_set": {"KPAR": incar["KPAR"] // 2}}})
+        elif incar.get("NPAR", 1) > 1:
+            actions.append({"dict": "INCAR", "action": {"_set": {"NPAR": incar["NPAR"] // 2}}})
+        elif "NPAR" not in incar and 2 * incar.get("NCORE", 1) <= n_cores:
+            actions.append({"dict": "INCAR", "action": {"_set": {"NCORE": 2 * incar.get("NCORE", 1)}}})
+        elif not lreal or str(lreal).lower().strip(".") in ("false", "f"):
+            actions.append({"dict": "INCAR", "action": {"_set": {"LREAL": "Auto"}}})
+        elif (ranks := _get_mpi_ranks(directory) or 0) > 1:
+            return {"errors": ["Memory pressure"], "actions": [], "peak_memory": peak_memory, "nranks": ranks // 2}
+        else:
+            actions = None
+
+        if actions:
+            VaspModder(vi=vi, directory=directory).apply_actions(actions)
+        return {"errors": ["Memory pressure"], "actions": actions, "peak_memory": peak_memory}
+
+    def _start_attempt(self, directory: str) -> None:
+        if self._attempts is None:
+            self._attempts = []
+            if self.log_filename and os.path.isfile(path := os.path.join(directory, self.log_filename)):
+                with open(path) as file, contextlib.suppress(ValueError):
+                    self._attempts = json.load(file)
+        self._attempt = {
+            "start_time": time.time(),
+            "memory_limit": self.max_memory or memory_limit(),
+            "peak_memory": 0,
+            "terminated": False,
+        }
+        self._attempts.append(self._attempt)
+
+    def _write_log(self, directory: str) -> None:
+        self.logger.info(f"Memory usage: {self._attempt}")
+        if self.log_filename:
+            with open(os.path.join(directory, self.log_filename), mode="w") as file:
+                json.dump(self._attempts, file, indent=2)
+
+
 class NonConvergingErrorHandler(ErrorHandler):
     """
     Check if a run is hitting the maximum number of electronic steps at the
@@ -1597,20 +1961,22 @@ class NonConvergingErrorHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check for error."""
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
         n_elm = vi["INCAR"].get("NELM", 60)  # number of electronic steps
         try:
-            oszicar = Oszicar(os.path.join(directory, self.output_filename))
-            elec_steps = oszicar.electronic_steps
+            oszicar = IncrementalOszicar.for_file(os.path.join(directory, self.output_filename))
+            elec_steps = oszicar.electronic_step_counts
             if len(elec_steps) > self.nionic_steps:
-                return all(len(e) == n_elm for e in elec_steps[-(self.nionic_steps + 1) : -1])
+                return bool(np.all(elec_steps[-(self.nionic_steps + 1) : -1] == n_elm))
         except Exception:
             pass
         return False
 
     def correct(self, directory="./"):
         """Perform corrections."""
-        incar = (vi := VaspInput.from_directory(directory))["INCAR"]
+        from pymatgen.core.structure import Structure
+
+        incar = (vi := load_vasp_input(directory))["INCAR"]
         algo = incar.get("ALGO", "Normal").lower()
         amix = incar.get("AMIX", 0.4)
         bmix = incar.get("BMIX", 1.0)
@@ -1639,7 +2005,8 @@ class NonConvergingErrorHandler(ErrorHandler):
 
         # NOTE: This is the amin error handler
         # Sometimes an AMIN warning can appear with large unit cell dimensions, so we'll address it now
-        if max(Structure.from_file(os.path.join(directory, "CONTCAR")).lattice.abc) > 50 and amin > 0.01:
+        structure_file = "CONTCAR" if is_valid_poscar("CONTCAR", directory) else "POSCAR"
+        if max(Structure.from_file(os.path.join(directory, structure_file)).lattice.abc) > 50 and amin > 0.01:
             actions.append({"dict": "INCAR", "action": {"_set": {"AMIN": 0.01}}})
 
         # If a hybrid is used, do not set Algo = Fast or VeryFast. Hybrid calculations do not
@@ -1699,6 +2066,297 @@ class NonConvergingErrorHandler(ErrorHandler):
         )
 
 
+class SCFConvergencePredictorHandler(ErrorHandler):
+    """
+    Monitor predicting whether the SCF cycle of the ionic step in progress
+    can reach EDIFF within NELM electronic steps, from the log-linear trend of
+    the energy changes of its electronic steps in OSZICAR (see
+    :func:`custodian.vasp.utils.predict_scf_convergence`). When even the
+    optimistic bound of the trend misses EDIFF, the job is terminated without
+    waiting for NELM and ALGO/mixing are changed with the same ladder as
+    NonConvergingErrorHandler.
+
+    The predictions made for each ionic step are written with its outcome
+    (number of electronic steps used and whether it converged, or whether it
+    was terminated) as one JSON record per line to log_filename, so that the
+    confidence level can be calibrated.
+    """
+
+    is_monitor = True
+
+    def __init__(
+        self,
+        output_filename: str = "OSZICAR",
+        confidence: float = 0.99,
+        window: int = 20,
+        min_steps: int = 8,
+        log_filename: str = "scf_predictions.jsonl",
+    ) -> None:
+        """Initialize the handler.
+
+        Args:
+            output_filename (str): This is the OSZICAR file. Change
+                this only if it is different from the default (unlikely).
+            confidence (float): Confidence level of the optimistic bound of
+                the convergence rate that must miss EDIFF within NELM steps
+                for the job to be terminated.
+            window (int): Number of most recent electronic steps the trend is
+                fitted on.
+            min_steps (int): Minimum number of selfconsistent electronic steps
+                before predicting.
+            log_filename (str): File the predictions and outcomes are appended
+                to. Set to None to disable.
+        """
+        self.output_filename = output_filename
+        self.confidence = confidence
+        self.window = window
+        self.min_steps = min_steps
+        self.log_filename = log_filename
+        self._ionic_step: int | None = None
+        self._predictions: list[list] = []
+        self._nelm = 60
+        self._non_converging = NonConvergingErrorHandler(output_filename=output_filename)
+        self.logger = logging.getLogger(type(self).__name__)
+
+    def check(self, directory="./") -> bool:
+        """Check for error."""
+        incar = read_incar(os.path.join(directory, "INCAR"))
+        self._nelm = incar.get("NELM", 60)
+        ediff = incar.get("EDIFF", 1e-4)
+        nelmdl = incar.get("NELMDL")
+        if nelmdl is None:
+            # no non-selfconsistent steps when starting from a WAVECAR
+            wavecar = os.path.join(directory, "WAVECAR")
+            istart = incar.get("ISTART", int(os.path.isfile(wavecar) and os.path.getsize(wavecar) > 0))
+            veryfast = str(incar.get("ALGO", "Normal")).lower() == "veryfast"
+            nelmdl = 0 if istart > 0 else -12 if veryfast else -5
+        try:
+            oszicar = IncrementalOszicar.for_file(os.path.join(directory, self.output_filename))
+        except Exception:
+            return False
+
+        if self._ionic_step is not None and (
+            oszicar.n_ionic_steps >= self._ionic_step or oszicar.n_electronic_blocks < self._ionic_step
+        ):
+            # the ionic step predicted on has finished, or the file was restarted
+            counts = oszicar.electronic_step_counts
+            if len(counts) >= self._ionic_step:
+                n_steps = int(counts[self._ionic_step - 1])
+                self._log_outcome(directory, {"n_steps": n_steps, "converged": n_steps < self._nelm})
+            self._ionic_step, self._predictions = None, []
+
+        if oszicar.n_electronic_blocks <= oszicar.n_ionic_steps:
+            # no ionic step in progress
+            return False
+        # a negative NELMDL only applies to the first ionic step
+        skip = abs(nelmdl) if nelmdl > 0 or oszicar.n_electronic_blocks == 1 else 0
+        prediction = predict_scf_convergence(
+            oszicar.electronic_dE,
+            ediff,
+            self._nelm,
+            skip=skip,
+            window=self.window,
+            min_steps=self.min_steps,
+            confidence=self.confidence,
+        )
+        if prediction is None:
+            return False
+        self._ionic_step = oszicar.n_electronic_blocks
+        self._predictions.append(
+            [
+                prediction.n_steps,
+                _finite_or_none(prediction.predicted_steps),
+                _finite_or_none(prediction.optimistic_steps),
+            ]
+        )
+        return prediction.hopeless
+
+    def correct(self, directory="./"):
+        """Perform corrections."""
+        self._log_outcome(directory, {"terminated": True})
+        self._ionic_step, self._predictions = None, []
+        result = self._non_converging.correct(directory)
+        return {"errors": ["Predicted SCF non-convergence"], "actions": result["actions"]}
+
+    def _log_outcome(self, directory: str, outcome: dict) -> None:
+        record = {
+            "ionic_step": self._ionic_step,
+            "nelm": self._nelm,
+            "confidence": self.confidence,
+            "predictions": self._predictions,
+            **outcome,
+        }
+        self.logger.info(f"SCF convergence prediction: {record}")
+        if self.log_filename:
+            with open(os.path.join(directory, self.log_filename), mode="a") as file:
+                file.write(json.dumps(record) + "\n")
+
+
+def _finite_or_none(value: float) -> float | None:
+    return float(value) if np.isfinite(value) else None
+
+
+class IonicStagnationHandler(ErrorHandler):
+    """
+    Monitor for geometry optimizations that oscillate, stagnate or diverge
+    instead of converging to EDIFFG. The energies of the ionic steps (OSZICAR)
+    and the forces and displacements of the atoms (OUTCAR) are read
+    incrementally.
+
+    The last window of ionic steps is diagnosed as one of:
+
+    - diverging: the residual (max force, or energy change when EDIFFG > 0)
+      grew by divergence_factor over its minimum in the window while the
+      energy rose.
+    - oscillating: the energy changes alternate in sign with little net
+      progress.
+    - stagnating: the atoms barely move, or the log-linear trend of the
+      residual cannot reach EDIFFG within NSW steps even optimistically.
+
+    The run is then stopped gracefully with a STOPCAR, and IBRION or POTIM is
+    changed: a stagnating optimizer is swapped (CG <-> quasi-Newton), an
+    oscillating or diverging one is switched to CG or has its POTIM halved.
+    Once VASP has stopped, CONTCAR is copied to POSCAR and the STOPCAR is
+    removed so that the job restarts from the last geometry.
+    """
+
+    is_monitor = True
+
+    # VASP should stop itself with the STOPCAR so that CONTCAR is complete.
+    is_terminating = False
+
+    diagnoses: ClassVar = ("diverging", "oscillating", "stagnating")
+
+    def __init__(
+        self,
+        window: int = 10,
+        oscillation_fraction: float = 0.7,
+        divergence_factor: float = 3.0,
+        min_step: float = 1e-3,
+        confidence: float = 0.99,
+        min_potim: float = 0.05,
+    ) -> None:
+        """Initialize the handler.
+
+        Args:
+            window (int): Number of most recent ionic steps diagnosed.
+            oscillation_fraction (float): Minimum fraction of sign changes of
+                the energy changes in the window for an oscillation.
+            divergence_factor (float): Growth of the residual over its minimum
+                in the window for a divergence.
+            min_step (float): Median max displacement of the atoms (Angstrom)
+                in the window under which the optimization is stagnating.
+            confidence (float): Confidence level of the optimistic bound of the
+                residual trend that must miss EDIFFG within NSW steps.
+            min_potim (float): POTIM is not halved below this value.
+        """
+        self.window = window
+        self.oscillation_fraction = oscillation_fraction
+        self.divergence_factor = divergence_factor
+        self.min_step = min_step
+        self.confidence = confidence
+        self.min_potim = min_potim
+        self.diagnosis: str | None = None
+        self._stopped = False
+
+    def check(self, directory="./") -> bool:
+        """Check for error."""
+        incar = read_incar(os.path.join(directory, "INCAR"))
+        if incar.get("NSW", 0) <= 1 or incar.get("IBRION", -1) not in (1, 2, 3):
+            return False
+        try:
+            outcar = IncrementalOutcar.for_file(os.path.join(directory, "OUTCAR"), ionic_steps=self.window + 1)
+            oszicar = IncrementalOszicar.for_file(os.path.join(directory, "OSZICAR"))
+        except Exception:
+            return False
+        if self._stopped:
+            # wait for VASP to stop at the end of its ionic step
+            return outcar.finished
+        self.diagnosis = self._diagnose(directory, incar, outcar, oszicar)
+        return self.diagnosis is not None
+
+    def _diagnose(self, directory, incar, outcar, oszicar) -> str | None:
+        n_steps = min(outcar.n_ionic_steps, oszicar.n_ionic_steps)
+        # index in outcar.forces of the first ionic step of the window
+        first = n_steps - self.window - (outcar.n_ionic_steps - len(outcar.forces))
+        if n_steps <= self.window or first < 0:
+            return None
+        ediffg = incar.get("EDIFFG", 10 * incar.get("EDIFF", 1e-4))
+        energies = oszicar.F[:n_steps]
+        energy_changes = np.diff(energies[n_steps - self.window - 1 :])
+        forces = list(outcar.forces)[first : first + self.window]
+        mask = np.ones(forces[0].shape, dtype=bool)
+        if ediffg < 0:
+            selective_dynamics = load_poscar(os.path.join(directory, "POSCAR")).selective_dynamics
+            if selective_dynamics is not None:
+                mask = np.array(selective_dynamics, dtype=bool)
+            residuals = np.array([np.linalg.norm(step_forces * mask, axis=1).max() for step_forces in forces])
+        else:
+            residuals = np.abs(energy_changes)
+        if residuals[-1] < abs(ediffg):
+            return None
+
+        window = slice(n_steps - self.window, n_steps)
+        if residuals[-1] > self.divergence_factor * np.min(residuals) and energies[-1] > np.min(energies[window]):
+            return "diverging"
+
+        signs = np.sign(energy_changes[energy_changes != 0])
+        if (
+            len(signs) > 1
+            and np.mean(signs[1:] != signs[:-1]) >= self.oscillation_fraction
+            and abs(np.sum(energy_changes)) < 0.25 * np.sum(np.abs(energy_changes))
+        ):
+            return "oscillating"
+
+        step_sizes = [
+            np.linalg.norm(displacements * mask, axis=1).max()
+            for displacements in list(outcar.displacements)[first : first + self.window]
+        ]
+        if np.median(step_sizes) < self.min_step:
+            return "stagnating"
+        steps = np.arange(1, n_steps + 1)[window]
+        trend = fit_linear_trend(steps, np.log10(np.maximum(residuals, np.finfo(float).tiny)))
+        z_score = NormalDist().inv_cdf(self.confidence)
+        if trend.reach(steps[-1], np.log10(abs(ediffg)), z_score=z_score) > incar["NSW"]:
+            return "stagnating"
+        return None
+
+    def correct(self, directory="./"):
+        """Perform corrections."""
+        actions = []
+        if is_valid_poscar("CONTCAR", directory):
+            actions.append({"file": "CONTCAR", "action": {"_file_copy": {"dest": "POSCAR"}}})
+
+        if self._stopped:
+            # VASP has stopped: restart from its last geometry without the STOPCAR
+            if os.path.isfile(os.path.join(directory, "STOPCAR")):
+                actions.append({"file": "STOPCAR", "action": {"_file_delete": {"mode": "actual"}}})
+            VaspModder(directory=directory).apply_actions(actions)
+            self._stopped = False
+            return {"errors": [f"Ionic relaxation {self.diagnosis}"], "actions": actions}
+
+        incar = (vi := load_vasp_input(directory))["INCAR"]
+        ibrion = incar.get("IBRION", 2)
+        potim = incar.get("POTIM", 0.5)
+        if self.diagnosis == "stagnating":
+            settings = {"IBRION": 1 if ibrion != 1 else 2}
+        elif ibrion == 1:
+            settings = {"IBRION": 2}
+        elif potim / 2 >= self.min_potim:
+            settings = {"POTIM": round(potim / 2, 4)}
+        else:
+            return {"errors": [f"Ionic relaxation {self.diagnosis}"], "actions": None}
+
+        actions += [
+            {"dict": "INCAR", "action": {"_set": settings}},
+            {"file": "STOPCAR", "action": {"_file_create": {"content": "LSTOP = .TRUE."}}},
+        ]
+        backup(VASP_BACKUP_FILES, directory=directory)
+        VaspModder(vi=vi, directory=directory).apply_actions(actions)
+        self._stopped = True
+        return {"errors": [f"Ionic relaxation {self.diagnosis}"], "actions": actions}
+
+
 class WalltimeHandler(ErrorHandler):
     """
     Check if a run is nearing the walltime. If so, write a STOPCAR with
@@ -1706,6 +2364,16 @@ class WalltimeHandler(ErrorHandler):
     which is unfortunately necessary for SGE and SLURM systems. If you happen
     to be running on a PBS system and the PBS_WALLTIME variable is in the run
     environment, the wall time will be automatically determined if not set.
+
+    The duration of the next step is predicted from the trend and spread of
+    the step timings read incrementally from OUTCAR (see
+    :func:`custodian.vasp.utils.predict_step_time`), leaving out the first
+    step of the run, which includes the setup and non-selfconsistent steps,
+    and in electronic mode modelling the first electronic step of each ionic
+    step separately. The STOPCAR is written once the time left no longer
+    covers that step and the buffer time. The correction reports the
+    reclaimed_time, in seconds, the run gained over stopping at 3 x the
+    longest step: negative if it stopped earlier than that rule.
     """
 
     is_monitor = True
@@ -1718,7 +2386,7 @@ class WalltimeHandler(ErrorHandler):
     # error
     raises_runtime_error = False
 
-    def __init__(self, wall_time=None, buffer_time=300, electronic_step_stop=False) -> None:
+    def __init__(self, wall_time=None, buffer_time=300, electronic_step_stop=False, confidence=0.99) -> None:
         """Initialize the handler with a buffer time.
 
         Args:
@@ -1729,13 +2397,12 @@ class WalltimeHandler(ErrorHandler):
                 set, this handler will have no effect.
             buffer_time (int): The min amount of buffer time in secs at the
                 end that the STOPCAR will be written. The STOPCAR is written
-                when the time remaining is < the higher of 3 x the average
-                time for each ionic step and the buffer time. Defaults to
-                300 secs, which is the default polling time of Custodian.
-                This is typically sufficient for the current ionic step to
-                complete. But if other operations are being performed after
-                the run has stopped, the buffer time may need to be increased
-                accordingly.
+                when the time remaining is < the predicted time of the next
+                step plus the buffer time. Defaults to 300 secs, which is the
+                default polling time of Custodian, so that a step started
+                just after a check can complete. But if other operations are
+                being performed after the run has stopped, the buffer time
+                may need to be increased accordingly.
             electronic_step_stop (bool): Whether to check for electronic steps
                 instead of ionic steps (e.g. for static runs on large systems or
                 static HSE runs, ...). Be careful that results such as density
@@ -1743,6 +2410,8 @@ class WalltimeHandler(ErrorHandler):
                 Should be used with LWAVE = .True. to be useful. If this is
                 True, the STOPCAR is written with LABORT = .TRUE. instead of
                 LSTOP = .TRUE.
+            confidence (float): Confidence level of the predicted upper bound
+                on the time of the next step.
         """
         if wall_time is not None:
             self.wall_time = wall_time
@@ -1767,8 +2436,11 @@ class WalltimeHandler(ErrorHandler):
             )
 
         self.electronic_step_stop = electronic_step_stop
+        self.confidence = confidence
         self.electronic_steps_timings = [0]
         self.prev_check_time = self.start_time
+        self._legacy_stop_time: float | None = None
+        self._reclaimed_time = 0.0
 
     def check(self, directory="./") -> bool:
         """Check for error."""
@@ -1776,26 +2448,41 @@ class WalltimeHandler(ErrorHandler):
             run_time = datetime.datetime.now() - self.start_time
             total_secs = run_time.total_seconds()
             try:
-                outcar = load_outcar(os.path.join(directory, "OUTCAR"))
+                outcar = IncrementalOutcar.for_file(os.path.join(directory, "OUTCAR"))
             except Exception:  # Can't perform check if Outcar not valid (e.g. file being written)
                 return False
-            if not self.electronic_step_stop:
-                # Determine max time per ionic step.
-                outcar.read_pattern({"timings": r"LOOP\+.+real time(.+)"}, postprocess=float)
-                time_per_step = np.max(outcar.data.get("timings")) if outcar.data.get("timings", []) else 0
-            else:
-                # Determine max time per electronic step.
-                outcar.read_pattern({"timings": "LOOP:.+real time(.+)"}, postprocess=float)
-                time_per_step = np.max(outcar.data.get("timings")) if outcar.data.get("timings", []) else 0
+            timings = outcar.electronic_step_timings if self.electronic_step_stop else outcar.ionic_step_timings
+            time_per_step = self._predict_step_time(outcar)
 
-            # If the remaining time is less than average time for 3
-            # steps or buffer_time.
             time_left = self.wall_time - total_secs
-            if time_left < max(time_per_step * 3, self.buffer_time):
+            # the previous rule: stop at 3 x the longest step or the buffer time
+            legacy_margin = max(3 * max(timings, default=0), self.buffer_time)
+            if time_left < legacy_margin and self._legacy_stop_time is None:
+                self._legacy_stop_time = total_secs
+            if time_left < time_per_step + self.buffer_time:
+                if self._legacy_stop_time is None:
+                    self._reclaimed_time = legacy_margin - time_left
+                else:
+                    self._reclaimed_time = total_secs - self._legacy_stop_time
                 return True
 
         return False
 
+    def _predict_step_time(self, outcar) -> float:
+        if not self.electronic_step_stop:
+            timings = outcar.ionic_step_timings
+            return predict_step_time(timings[1:] or timings, confidence=self.confidence)
+        timings = outcar.electronic_step_timings
+        indices = outcar.electronic_step_indices[: len(timings)]
+        first = [time for time, idx in zip(timings, indices, strict=False) if idx == 1][1:]
+        regular = [time for time, idx in zip(timings[1:], indices[1:], strict=False) if idx != 1]
+        if not regular:
+            return predict_step_time(timings, confidence=self.confidence)
+        predictions = [predict_step_time(regular, confidence=self.confidence)]
+        if first:
+            predictions.append(predict_step_time(first, confidence=self.confidence))
+        return max(predictions)
+
     def correct(self, directory="./"):
         """Perform corrections."""
         content = "LSTOP = .TRUE." if not self.electronic_step_stop else "LABORT = .TRUE."
@@ -1805,7 +2492,7 @@ class WalltimeHandler(ErrorHandler):
         modder = Modder(actions=[FileActions], directory=directory)
         for action in actions:
             modder.modify(action["action"], action["file"])
-        return {"errors": ["Walltime reached"], "actions": None}
+        return {"errors": ["Walltime reached"], "actions": None, "reclaimed_time": round(self._reclaimed_time, 1)}
 
 
 class CheckpointHandler(ErrorHandler):
@@ -1935,8 +2622,8 @@ class PositiveEnergyErrorHandler(ErrorHandler):
     def check(self, directory="./") -> bool:
         """Check for error."""
         try:
-            oszicar = Oszicar(os.path.join(directory, self.output_filename))
-            if oszicar.final_energy > 0:
+            oszicar = IncrementalOszicar.for_file(os.path.join(directory, self.output_filename))
+            if oszicar.E0[-1] > 0:
                 return True
         except Exception:
             pass
@@ -1945,7 +2632,7 @@ class PositiveEnergyErrorHandler(ErrorHandler):
     def correct(self, directory="./"):
         """Perform corrections."""
         # change ALGO = Fast to Normal if ALGO is !Normal
-        vi = VaspInput.from_directory(directory)
+        vi = load_vasp_input(directory)
         algo = vi["INCAR"].get("ALGO", "Normal").lower()
         if algo not in {"normal", "n"}:
             backup(VASP_BACKUP_FILES | {self.output_filename}, directory=directory)
@@ -1960,3 +2647,86 @@ class PositiveEnergyErrorHandler(ErrorHandler):
             return {"errors": ["Positive energy"], "actions": actions}
         # Unfixable error. Just return None for actions.
         return {"errors": ["Positive energy"], "actions": None}
+
+
+class NEBImageHandler(ErrorHandler):
+    """
+    Apply a handler written for a single VASP directory to every image of a
+    NEB calculation (the 01, 02, ... directories of VaspNEBJob). The images
+    are checked concurrently in a thread pool, each by its own copy of the
+    handler with its own incremental readers and correction ladder, so that
+    the time of a check, dominated by reading the outputs of the images, does
+    not grow with their number. Only the images that failed are corrected,
+    one after the other in the main thread. Changes to the INCAR, KPOINTS and
+    POTCAR, which VASP reads from the root directory for all images, are
+    written there once (see :class:`custodian.vasp.io.NEBImageTransaction`).
+
+    The wrapped handler must read the inputs with load_vasp_input, as the
+    handlers of this module do. Handlers of the VASP standard output, e.g.
+    VaspErrorHandler, should not be wrapped since NEB runs write a single one
+    in the root directory.
+    """
+
+    def __init__(self, handler: ErrorHandler, max_workers: int | None = None) -> None:
+        """Initialize the handler.
+
+        Args:
+            handler (ErrorHandler): The handler to apply to every image.
+            max_workers (int): Maximum number of images checked at the same
+                time. Defaults to None, i.e. all of them.
+        """
+        self.handler = handler
+        self.max_workers = max_workers
+        self.is_monitor = handler.is_monitor
+        self.is_terminating = handler.is_terminating
+        self.raises_runtime_error = handler.raises_runtime_error
+        self.max_num_corrections = handler.max_num_corrections
+        self.raise_on_max = handler.raise_on_max
+        self._image_handlers: dict[str, ErrorHandler] = {}
+        self.failed_images: list[str] = []
+        self.logger = logging.getLogger(type(self).__name__)
+
+    def check(self, directory="./") -> bool:
+        """Check all the images, and record the ones that failed."""
+        images = neb_image_dirs(directory)
+        for image in images:
+            if image not in self._image_handlers:
+                self._image_handlers[image] = copy.deepcopy(self.handler)
+
+        with neb_image_inputs(directory, images):
+            open_transactions = InputTransaction.state.open_transactions
+
+            def check_image(image):
+                # the worker threads share the inputs of the current check
+                with InputTransaction.joined_scope(open_transactions):
+                    return self._image_handlers[image].check(directory=os.path.join(directory, image))
+
+            with ThreadPoolExecutor(max_workers=self.max_workers or max(len(images), 1)) as executor:
+                failed = list(executor.map(check_image, images))
+        self.failed_images = [image for image, has_error in zip(images, failed, strict=True) if has_error]
+        return bool(self.failed_images)
+
+    def correct(self, directory="./"):
+        """Correct the images that failed."""
+        corrections = {}
+        with neb_image_inputs(directory, self.failed_images):
+            for image in self.failed_images:
+                handler = self._image_handlers[image]
+                corrections[image] = handler.correct(directory=os.path.join(directory, image))
+                handler.n_applied_corrections += 1
+        self.logger.info(f"Corrected NEB images {', '.join(corrections)}.")
+
+        errors = []
+        for image, correction in corrections.items():
+            image_errors = correction["errors"]
+            errors += [
+                f"{error} (image {image})"
+                for error in (image_errors if isinstance(image_errors, list) else [image_errors])
+            ]
+        actions = None
+        if all(correction["actions"] is not None for correction in corrections.values()):
+            # Images failing with the same error get the same global correction
+            actions = []
+            for correction in corrections.values():
+                actions += [action for action in correction["actions"] if action not in actions]
+        return {"errors": errors, "actions": actions, "images": corrections}
@@ -2,10 +2,10 @@
 
 import os
 
-from pymatgen.io.vasp.inputs import VaspInput
-
 from custodian.ansible.actions import DictActions, FileActions
 from custodian.ansible.interpreter import Modder
+from custodian.utils import InputTransaction, atomic_path
+from custodian.vasp.io import VaspInputTransaction
 
 
 class VaspModder(Modder):
@@ -24,10 +24,18 @@ class VaspModder(Modder):
                 supplied, a ValueError is raised. Defaults to True.
             vi (VaspInput): A VaspInput object from the current directory.
                 Initialized automatically if not passed (but passing it will
-                avoid having to re-parse the directory).
+                avoid having to re-parse the directory). Within a Custodian
+                check, only the VaspInput shared by the handlers (see
+                :func:`custodian.vasp.io.load_vasp_input`) is accepted, and
+                modified files are staged and written once at the end of the
+                check.
             directory (str): The directory containing the VaspInput set.
         """
-        self.vi = vi or VaspInput.from_directory(directory)
+        self.transaction = VaspInputTransaction.for_directory(directory)
+        if vi is not None and InputTransaction.state.deferred and not self.transaction.shares(vi):
+            # writing it would overwrite the corrections staged by other handlers
+            raise ValueError("Within a Custodian check, pass the VaspInput of load_vasp_input(directory) or no vi.")
+        self.vi = vi if vi is not None else self.transaction.vi
         self.directory = directory
         actions = actions or [FileActions, DictActions]
         super().__init__(actions, strict, directory=directory)
@@ -42,15 +50,32 @@ class VaspModder(Modder):
                 'action': moddermodification} or {'dict': vaspinput_key,
                 'action': moddermodification}.
         """
-        modified = []
+        modified = {}
+        replaced = set()
         for action in actions:
             if "dict" in action:
                 k = action["dict"]
-                modified.append(k)
+                modified[k] = True
                 self.vi[k] = self.modify_object(action["action"], self.vi[k])
             elif "file" in action:
                 self.modify(action["action"], action["file"])
+                replaced.add(action["file"])
+                replaced.update(
+                    settings["dest"]
+                    for settings in action["action"].values()
+                    if isinstance(settings, dict) and "dest" in settings
+                )
             else:
                 raise ValueError(f"Unrecognized format: {action}")
+
+        # Files replaced on disk by file actions supersede earlier staged writes.
+        for file in replaced.difference(modified):
+            self.transaction.refresh(file)
+
         for file in modified:
-            self.vi[file].write_file(os.path.join(self.directory, file))
+            if self.transaction.shares(self.vi):
+                self.transaction.stage(file, self.vi[file])
+            else:
+                with atomic_path(os.path.join(self.directory, file)) as tmp:
+                    self.vi[file].write_file(tmp)
+                self.transaction.refresh(file)
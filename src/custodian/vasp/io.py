@@ -1,15 +1,83 @@
 """Helper functions for dealing with vasp files."""
 
-from pymatgen.io.vasp.outputs import Outcar, Vasprun
+from __future__ import annotations
 
-from custodian.utils import tracked_lru_cache
+import contextlib
+import functools
+import hashlib
+import inspect
+import io
+import logging
+import os
+import pickle
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import deque
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, ClassVar, NamedTuple
+from xml.etree import ElementTree as ET
 
+import numpy as np
+from monty.io import zopen
+from monty.os.path import zpath
+from monty.serialization import dumpfn, loadfn
 
-@tracked_lru_cache
+import custodian
+from custodian.utils import IncrementalFileReader, InputTransaction, file_signature, tracked_file_cache
+
+if TYPE_CHECKING:
+    from pymatgen.core import Structure
+    from pymatgen.io.vasp.inputs import Incar, Kpoints, VaspInput
+
+logger = logging.getLogger(__name__)
+
+# pymatgen.io.vasp is imported by the functions that need it, so that
+# importing custodian does not pay for it (see __getattr__ below).
+VASP_INPUT_FILES = ("INCAR", "KPOINTS", "POSCAR", "POTCAR")
+
+
+def read_vasp_input_file(filename, filepath):
+    """
+    Read one of the VASP_INPUT_FILES with the pymatgen class of its VaspInput entry.
+
+    Args:
+        filename (str): "INCAR", "KPOINTS", "POSCAR" or "POTCAR".
+        filepath: path to the file.
+    """
+    from pymatgen.io.vasp import inputs
+
+    return getattr(inputs, filename.title()).from_file(filepath)
+
+
+@functools.cache
+def vasprun_data_flags() -> dict:
+    """Vasprun kwargs that only add data to the parse when switched on, with their defaults."""
+    from pymatgen.io.vasp.outputs import Vasprun
+
+    parameters = inspect.signature(Vasprun).parameters
+    return {
+        key: parameters[key].default
+        for key in ("parse_dos", "parse_eigen", "parse_projected_eigen", "parse_potcar_file")
+    }
+
+
+def __getattr__(name):
+    # module constants derived from pymatgen, computed on first access (PEP 562)
+    if name == "VASPRUN_DATA_FLAGS":
+        return vasprun_data_flags()
+    if name == "VASP_INPUT_READERS":
+        return {filename: functools.partial(read_vasp_input_file, filename) for filename in VASP_INPUT_FILES}
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@tracked_file_cache
 def load_vasprun(filepath, **vasprun_kwargs):
     """
     Load Vasprun object from file path.
-    Caches the output for reuse.
+    Caches the output for reuse until the file changes.
 
     Args:
         filepath: path to the vasprun.xml file.
@@ -18,14 +86,427 @@ def load_vasprun(filepath, **vasprun_kwargs):
     Returns:
         The Vasprun object
     """
+    from pymatgen.io.vasp.outputs import Vasprun
+
     return Vasprun(filepath, **vasprun_kwargs)
 
 
-@tracked_lru_cache
+@load_vasprun.covers
+def _vasprun_kwargs_cover(cached_kwargs, vasprun_kwargs) -> bool:
+    """Whether a Vasprun parsed with cached_kwargs holds all the data asked for by vasprun_kwargs."""
+    data_flags = vasprun_data_flags()
+    other_keys = (set(cached_kwargs) | set(vasprun_kwargs)) - set(data_flags)
+    if any(cached_kwargs.get(key) != vasprun_kwargs.get(key) for key in other_keys):
+        return False
+    for key, default in data_flags.items():
+        requested = vasprun_kwargs.get(key, default)
+        if requested and cached_kwargs.get(key, default) != requested:
+            return False
+    return True
+
+
+# Blocks of vasprun.xml holding the bulk of the data of a run. They are cut
+# out of the file before it is parsed, unless a requested field needs them.
+VASPRUN_BULK_BLOCKS = (
+    "dos",
+    "projected",
+    "projected_kpoints_opt",
+    "eigenvalues",
+    "eigenvalues_kpoints_opt",
+    "dielectricfunction",
+)
+
+# The bulk blocks each VasprunSummary field is computed from. The header, and
+# the energies and structures of the ionic steps, are always kept.
+VASPRUN_FIELD_BLOCKS = {
+    "converged_electronic": (),
+    "converged_ionic": (),
+    "incar": (),
+    "final_lattice_abc": (),
+    "eigenvalue_band_properties": ("eigenvalues",),
+    "final_energy": (),
+    "ionic_energies": (),
+    "final_structure": (),
+    "parameters": (),
+}
+
+
+def iter_vasprun_without(filepath, blocks, chunk_size=1 << 20):
+    """
+    Stream the bytes of a vasprun.xml with some data blocks cut out. The
+    blocks are located with a plain substring search and never reach the XML
+    parser, so they cost neither parse time nor memory.
+
+    Args:
+        filepath: path to the vasprun.xml file.
+        blocks: tag names of the blocks to cut out, e.g. VASPRUN_BULK_BLOCKS.
+        chunk_size (int): number of bytes read at a time.
+
+    Yields:
+        bytes: consecutive pieces of the remaining document.
+    """
+    if not blocks:
+        with zopen(filepath, mode="rb") as file:
+            yield from iter(lambda: file.read(chunk_size), b"")
+        return
+    names = sorted((block.encode() for block in blocks), key=len, reverse=True)
+    start_patt = re.compile(rb"<(" + b"|".join(map(re.escape, names)) + rb")[\s>]")
+    # longest start tag or end tag that can straddle two chunks
+    overlap = len(names[0]) + 2
+    end_tag = None
+    buffer = b""
+    with zopen(filepath, mode="rb") as file:
+        while True:
+            chunk = file.read(chunk_size)
+            buffer += chunk
+            while True:
+                if end_tag is None:
+                    match = start_patt.search(buffer)
+                    if match is None:
+                        keep = len(buffer) if not chunk else max(len(buffer) - overlap, 0)
+                        yield buffer[:keep]
+                        buffer = buffer[keep:]
+                        break
+                    yield buffer[: match.start()]
+                    end_tag = b"</%s>" % match[1]
+                    buffer = buffer[match.end() :]
+                else:
+                    idx = buffer.find(end_tag)
+                    if idx == -1:
+                        buffer = buffer[-overlap:]
+                        break
+                    buffer = buffer[idx + len(end_tag) :]
+                    end_tag = None
+            if not chunk:
+                return
+
+
+def iter_volumetric_planes(filepath, chunk_size=1 << 20):
+    """
+    Stream the first grid of a CHGCAR-like file (CHGCAR, AECCAR*, LOCPOT,
+    ...) one z-plane at a time, so that the whole grid is never held in
+    memory. Values are parsed exactly as by Chgcar.from_file.
+
+    Args:
+        filepath: path to the volumetric data file.
+        chunk_size (int): approximate number of characters read at a time.
+
+    Yields:
+        np.ndarray: plane of shape (ny, nx) for each z in turn, where
+            plane[y, x] is data["total"][x, y, z] of the Chgcar.
+    """
+    with zopen(filepath, mode="rt", encoding="utf-8") as file:
+        # the structure ends at the first blank line and the grid shape follows
+        for idx, line in enumerate(file):
+            if idx and not line.strip():
+                break
+        nx, ny, nz = (int(val) for val in file.readline().split())
+        plane_size = nx * ny
+        carry = np.empty(0)
+        z = 0
+        while z < nz:
+            lines = file.readlines(chunk_size)
+            if not lines:
+                raise ValueError(f"{filepath} ends before the end of its {nx}x{ny}x{nz} grid")
+            # anything past the grid (augmentation occupancies, spin density) is not parsed
+            tokens = "".join(lines).split()[: (nz - z) * plane_size - len(carry)]
+            data = np.concatenate([carry, np.array(tokens, dtype=float)])
+            n_planes = len(data) // plane_size
+            yield from data[: n_planes * plane_size].reshape(n_planes, ny, nx)
+            carry = data[n_planes * plane_size :]
+            z += n_planes
+
+
+def volumetric_data_complete(filepath) -> bool:
+    """
+    Whether a CHGCAR-like file holds its whole first grid, i.e. it was not
+    truncated by a run killed while writing it. The grid is streamed with
+    iter_volumetric_planes.
+    """
+    try:
+        for _ in iter_volumetric_planes(filepath):
+            pass
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def wavecar_complete(filepath) -> bool:
+    """
+    Whether a WAVECAR holds all the records announced by its header, i.e. it
+    was not truncated by a run killed while writing it. The file is made of
+    records of the length given by its first value: two header records, then
+    for each spin and k-point one record for the k-point and one per band.
+    """
+    try:
+        with open(filepath, mode="rb") as file:
+            recl, nspin, _ = np.fromfile(file, dtype=np.float64, count=3)
+            file.seek(int(recl))
+            nkpts, nbands = np.fromfile(file, dtype=np.float64, count=2)
+        expected = int(recl) * (2 + int(nspin) * int(nkpts) * (int(nbands) + 1))
+    except (OSError, ValueError):
+        return False
+    return os.path.getsize(filepath) == expected
+
+
+def extract_vasprun(filepath, fields=None):
+    """
+    Parse only the parts of a vasprun.xml needed for some VasprunSummary
+    fields. The bulk blocks not needed (see VASPRUN_FIELD_BLOCKS) are cut
+    out of the file, and the much smaller remainder is parsed by pymatgen,
+    so that parse time and memory do not depend on the DOS, projections or
+    eigenvalues written by the run.
+
+    Args:
+        filepath: path to the vasprun.xml file.
+        fields: VasprunSummary fields needed. Defaults to all of them.
+
+    Returns:
+        Vasprun: parsed from a reduced copy of the file, which has been
+            removed by the time it is returned.
+    """
+    from pymatgen.io.vasp.outputs import Vasprun
+
+    fields = VasprunSummary._fields if fields is None else fields
+    needed = {block for field in fields for block in VASPRUN_FIELD_BLOCKS[field]}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        reduced_file = os.path.join(tmp_dir, "vasprun.xml")
+        with open(reduced_file, "wb") as file:
+            for data in iter_vasprun_without(filepath, set(VASPRUN_BULK_BLOCKS) - needed):
+                file.write(data)
+        return Vasprun(
+            reduced_file,
+            parse_dos=False,
+            parse_eigen="eigenvalues" in needed,
+            parse_projected_eigen=False,
+            parse_potcar_file=False,
+        )
+
+
+class VasprunSummary(NamedTuple):
+    """
+    The few results of a vasprun.xml that the handlers and validators need.
+    Fields that were not requested when loading the summary are None.
+    """
+
+    converged_electronic: bool
+    converged_ionic: bool
+    incar: Incar
+    final_lattice_abc: tuple[float, float, float]
+    eigenvalue_band_properties: tuple | None
+    final_energy: float | None = None
+    ionic_energies: list | None = None
+    final_structure: Structure | None = None
+    parameters: dict | None = None
+
+    @property
+    def converged(self) -> bool:
+        """Whether both the electronic and ionic steps are converged."""
+        return self.converged_electronic and self.converged_ionic
+
+    @classmethod
+    def from_file(cls, filepath, fields=None):
+        """
+        Parse a vasprun.xml in the current process and summarize it.
+
+        Args:
+            filepath: path to the vasprun.xml file.
+            fields: fields to fill in. Defaults to all of them.
+        """
+        fields = cls._fields if fields is None else fields
+        vasprun = extract_vasprun(filepath, fields)
+        values = {}
+        for field in fields:
+            if field == "final_lattice_abc":
+                values[field] = vasprun.final_structure.lattice.abc
+            elif field == "ionic_energies":
+                values[field] = [step.get("e_0_energy") for step in vasprun.ionic_steps]
+            elif field == "eigenvalue_band_properties":
+                with contextlib.suppress(Exception):
+                    values[field] = vasprun.eigenvalue_band_properties
+            else:
+                values[field] = getattr(vasprun, field)
+        return cls(**{field: values.get(field) for field in cls._fields})
+
+
+# Parse vasprun.xml in a child process, so that the memory of the parse is
+# returned to the OS instead of being kept by the long-lived Custodian process.
+# The child is reused for PARSE_WORKER_MAX_TASKS parses and then replaced.
+PARSE_OUT_OF_PROCESS = True
+PARSE_WORKER_MAX_TASKS = 10
+
+_SUMMARY_WORKER = (
+    "import pickle, sys\n"
+    "from custodian.vasp.io import VasprunSummary\n"
+    "out, sys.stdout = sys.stdout.buffer, sys.stderr\n"
+    "while True:\n"
+    "    try:\n"
+    "        filepath, fields = pickle.load(sys.stdin.buffer)\n"
+    "    except EOFError:\n"
+    "        break\n"
+    "    try:\n"
+    "        result = (True, VasprunSummary.from_file(filepath, fields))\n"
+    "    except Exception as exc:\n"
+    "        try:\n"
+    "            pickle.dumps(exc)\n"
+    "        except Exception:\n"
+    "            exc = RuntimeError(repr(exc))\n"
+    "        result = (False, exc)\n"
+    "    pickle.dump(result, out)\n"
+    "    out.flush()\n"
+)
+
+
+class _SummaryWorker:
+    """
+    Child process serving the vasprun.xml parses of load_vasprun_summary one
+    at a time. It is started on first use and exits once its stdin is closed.
+    """
+
+    lock: ClassVar[threading.Lock] = threading.Lock()
+    current: ClassVar[_SummaryWorker | None] = None
+
+    def __init__(self) -> None:
+        env = dict(os.environ)
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(custodian.__file__)))
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, (package_root, env.get("PYTHONPATH"))))
+        self.stderr = tempfile.TemporaryFile()  # noqa: SIM115
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", _SUMMARY_WORKER],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self.stderr,
+            env=env,
+        )
+        self.n_tasks = 0
+
+    @classmethod
+    def summarize(cls, filepath, fields) -> tuple[bool, object] | None:
+        """
+        Parse a vasprun.xml in the worker, starting or replacing it as needed.
+
+        Returns:
+            (ok, summary or exception) as sent back by the worker, or None if
+            the worker died or sent back garbage.
+        """
+        with cls.lock:
+            worker = cls.current
+            if worker is None or worker.process.poll() is not None:
+                worker = cls.current = cls()
+            try:
+                pickle.dump((os.path.abspath(filepath), fields), worker.process.stdin)
+                worker.process.stdin.flush()
+                result = pickle.load(worker.process.stdout)
+            except Exception:
+                cls.current = None
+                worker.process.kill()
+                worker.process.wait()
+                worker.stderr.seek(max(worker.stderr.seek(0, os.SEEK_END) - 1000, 0))
+                logger.warning(
+                    "vasprun.xml parser process failed (return code %s), parsing in process: %s",
+                    worker.process.returncode,
+                    worker.stderr.read().decode(errors="replace"),
+                )
+                worker.close()
+                return None
+            worker.n_tasks += 1
+            if worker.n_tasks >= PARSE_WORKER_MAX_TASKS:
+                worker.close()
+                cls.current = None
+            return result
+
+    def close(self) -> None:
+        """Stop the worker. It finishes on its own once its stdin is closed."""
+        with contextlib.suppress(OSError):
+            self.process.stdin.close()
+        self.process.wait()
+        self.process.stdout.close()
+        self.stderr.close()
+
+
+@tracked_file_cache
+def load_vasprun_summary(filepath, fields=None):
+    """
+    Load a VasprunSummary from file path, parsing the vasprun.xml in a child
+    process (see PARSE_OUT_OF_PROCESS). Caches the output for reuse until the
+    file changes. Parsing errors are raised as if the parse happened here.
+
+    Args:
+        filepath: path to the vasprun.xml file.
+        fields: tuple of the VasprunSummary fields needed, as declared by
+            the handlers in their vasprun_fields. Only the parts of the file
+            these fields are computed from are parsed. Defaults to all.
+
+    Returns:
+        The VasprunSummary object
+    """
+    if not PARSE_OUT_OF_PROCESS or (response := _SummaryWorker.summarize(filepath, fields)) is None:
+        return VasprunSummary.from_file(filepath, fields)
+    ok, result = response
+    if not ok:
+        raise result
+    return result
+
+
+@load_vasprun_summary.covers
+def _summary_fields_cover(cached_kwargs, kwargs) -> bool:
+    """Whether a summary loaded with cached_kwargs holds all the fields asked for by kwargs."""
+    cached_fields = cached_kwargs.get("fields") or VasprunSummary._fields
+    return set(kwargs.get("fields") or VasprunSummary._fields) <= set(cached_fields)
+
+
+@tracked_file_cache
+def check_vasprun_xml(filepath) -> int:
+    """
+    Structural check of a vasprun.xml, without building a Vasprun. The file
+    is streamed and every element is discarded once closed, so memory stays
+    bounded regardless of the size of the eigenvalue or projection blocks.
+
+    The file must be well-formed, with a closed <modeling> root and the
+    final structure written after the last ionic step, which VASP only does
+    once the run has finished.
+
+    Args:
+        filepath: path to the vasprun.xml file.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: if the file is not well-formed
+            XML, e.g. truncated.
+        ValueError: if the root or the final calculation block is missing.
+
+    Returns:
+        int: the number of ionic steps (<calculation> blocks).
+    """
+    n_calculations = 0
+    has_final_structure = False
+    stack: list[ET.Element] = []
+    with zopen(filepath, mode="rb") as file:
+        for event, elem in ET.iterparse(file, events=("start", "end")):
+            if event == "start":
+                if not stack and elem.tag != "modeling":
+                    raise ValueError(f"{filepath} has root <{elem.tag}> instead of <modeling>")
+                stack.append(elem)
+                continue
+            stack.pop()
+            if len(stack) == 1:
+                if elem.tag == "calculation":
+                    n_calculations += 1
+                    has_final_structure = False
+                elif elem.tag == "structure" and elem.get("name") == "finalpos":
+                    has_final_structure = True
+            if stack:
+                # the parent holds no other child at this point
+                stack[-1].remove(elem)
+    if n_calculations == 0 or not has_final_structure:
+        raise ValueError(f"{filepath} does not contain the final calculation block")
+    return n_calculations
+
+
+@tracked_file_cache
 def load_outcar(filepath):
     """
     Load Outcar object from file path.
-    Caches the output for reuse.
+    Caches the output for reuse until the file changes.
 
     Args:
         filepath: path to the OUTCAR file.
@@ -33,4 +514,717 @@ def load_outcar(filepath):
     Returns:
         The Vasprun object
     """
+    from pymatgen.io.vasp.outputs import Outcar
+
     return Outcar(filepath)
+
+
+@tracked_file_cache
+def load_poscar(filepath):
+    """
+    Load Poscar object from file path.
+    Caches the output for reuse until the file changes.
+
+    Args:
+        filepath: path to the POSCAR file.
+
+    Returns:
+        The Poscar object
+    """
+    from pymatgen.io.vasp.inputs import Poscar
+
+    return Poscar.from_file(filepath, check_for_potcar=False)
+
+
+# Summary of the outputs of a finished VASP job, written next to them by
+# VaspJob.postprocess so that later readers do not parse vasprun.xml again.
+VASP_SUMMARY_FILE = "vasp_summary.json"
+VASP_SUMMARY_VERSION = 1
+
+
+def file_sha256(filepath, chunk_size=1 << 20) -> str:
+    """SHA-256 hex digest of the content of a file."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_vasp_summary(directory="./", hash_files=False) -> dict:
+    """
+    Summarize the vasprun.xml and OUTCAR of a finished run in
+    VASP_SUMMARY_FILE: energies, final structure, convergence flags,
+    parameters, timings and magnetization, along with the signature of the
+    files they were read from. The vasprun.xml is parsed in a child process
+    (see load_vasprun_summary) and the OUTCAR by an IncrementalOutcar, which
+    only reads the lines a monitor has not read yet.
+
+    Args:
+        directory: directory of the run.
+        hash_files (bool): Whether to also store the SHA-256 of the files,
+            so that copies of the outputs are still recognized by
+            load_vasp_summary. This reads the files in full, which can be
+            slow for long runs. Defaults to False.
+
+    Returns:
+        dict: the summary written.
+    """
+    vasprun_file = os.path.join(directory, "vasprun.xml")
+    vasprun = load_vasprun_summary(
+        vasprun_file,
+        fields=(
+            "converged_electronic",
+            "converged_ionic",
+            "final_energy",
+            "ionic_energies",
+            "final_structure",
+            "parameters",
+        ),
+    )
+    summary = {
+        "@version": VASP_SUMMARY_VERSION,
+        "sources": {},
+        "converged_electronic": vasprun.converged_electronic,
+        "converged_ionic": vasprun.converged_ionic,
+        "final_energy": vasprun.final_energy,
+        "ionic_energies": vasprun.ionic_energies,
+        "n_ionic_steps": len(vasprun.ionic_energies),
+        "final_structure": vasprun.final_structure,
+        "parameters": vasprun.parameters,
+    }
+    sources = ["vasprun.xml"]
+    outcar_file = os.path.join(directory, "OUTCAR")
+    if os.path.isfile(outcar_file):
+        outcar = IncrementalOutcar.for_file(outcar_file)
+        summary["run_stats"] = {**outcar.run_stats, "cores": outcar.nranks}
+        summary["magnetization"] = outcar.magnetization
+        summary["total_magnetization"] = outcar.total_magnetization
+        sources.append("OUTCAR")
+    for filename in sources:
+        filepath = os.path.join(directory, filename)
+        summary["sources"][filename] = {"signature": file_signature(filepath)}
+        if hash_files:
+            summary["sources"][filename]["sha256"] = file_sha256(filepath)
+    dumpfn(summary, os.path.join(directory, VASP_SUMMARY_FILE))
+    return summary
+
+
+def load_vasp_summary(directory="./") -> dict | None:
+    """
+    Load the summary written by write_vasp_summary, provided it still
+    describes the outputs in the directory. If the summary holds the hash of
+    the files, files whose stat changed are hashed again, so copies of the
+    outputs are still recognized.
+
+    Args:
+        directory: directory of the run.
+
+    Returns:
+        dict, or None if there is no summary, it was written by another
+        version, or the outputs have changed since.
+    """
+    summary_file = os.path.join(directory, VASP_SUMMARY_FILE)
+    if not os.path.isfile(summary_file):
+        return None
+    try:
+        summary = loadfn(summary_file)
+    except Exception:
+        logger.warning(f"Unable to read {summary_file}", exc_info=True)
+        return None
+    if summary.get("@version") != VASP_SUMMARY_VERSION:
+        return None
+    for filename, source in summary["sources"].items():
+        filepath = os.path.join(directory, filename)
+        if not os.path.isfile(filepath):
+            return None
+        if list(file_signature(filepath)) != source["signature"] and (
+            "sha256" not in source or file_sha256(filepath) != source["sha256"]
+        ):
+            return None
+    return summary
+
+
+class IncrementalOutcar(IncrementalFileReader):
+    """
+    OUTCAR reader for monitors, parsing only the lines appended since the last
+    check (see :class:`custodian.utils.IncrementalFileReader`).
+
+    The results mirror what the handlers used to get from Outcar.read_pattern:
+
+    - ionic_step_timings: real time of each ionic step ("LOOP+" lines).
+    - electronic_step_timings: real time of each electronic step ("LOOP:" lines).
+    - drift: total drift [x, y, z] of each ionic step.
+    - smearing_entropy: entropy T*S of each electronic step.
+    - electronic_step_indices: index of each electronic step in its ionic step.
+    - completed_ionic_steps: number of "aborting loop" lines.
+    - nbands: first NBANDS= value.
+    - nelect: last number of electrons.
+    - nranks: number of MPI ranks the run uses.
+    - total_magnetization: last total magnetization.
+    - magnetization: total magnetization of each ion ("tot" column of the
+      last "magnetization (x)" block).
+    - run_stats: timings and memory of the "General timing" section, as in
+      Outcar.run_stats (without "cores", see nranks).
+    - n_ionic_steps: number of ionic steps with forces.
+    - forces: forces on the atoms at each of the last ionic_steps ionic steps
+      (float32 arrays).
+    - displacements: minimum-image displacement of the atoms at each of the
+      last ionic_steps ionic steps from the previous one (float32 arrays, zero
+      at the first step).
+    - finished: whether the run has ended ("General timing" line).
+    """
+
+    _ionic_timing_patt = re.compile(rb"LOOP\+.+real time(.+)")
+    _electronic_timing_patt = re.compile(rb"LOOP:.+real time(.+)")
+    _drift_patt = re.compile(rb"total drift:\s+([\.\-\d]+)\s+([\.\-\d]+)\s+([\.\-\d]+)")
+    _entropy_patt = re.compile(rb"entropy T\*S.*= *(\D\d*\.\d*)")
+    _iteration_patt = re.compile(rb"Iteration\s*\d+\s*\(\s*(\d+)\s*\)")
+    _nelect_patt = re.compile(rb"number of electron\s+(\S+)\s+magnetization\s*(\S+)?")
+    _nranks_patt = re.compile(rb"running\s+(?:on\s+)?(\d+)\s+(?:mpi-ranks|total cores)")
+
+    def __init__(self, filepath: str, ionic_steps: int = 1) -> None:
+        """
+        Args:
+            filepath (str): path to the OUTCAR file.
+            ionic_steps (int): Number of most recent ionic steps whose forces
+                and displacements are kept.
+        """
+        self.ionic_steps = ionic_steps
+        super().__init__(filepath)
+
+    @classmethod
+    def for_file(cls, filepath: str, ionic_steps: int = 1):
+        """
+        Get the reader of a file, shared by all callers, updated with the new
+        content. The file is read again from the start if the forces and
+        displacements of more ionic steps than kept so far are asked for.
+        """
+        key = (cls, os.path.abspath(filepath))
+        if key not in cls.readers:
+            cls.readers[key] = cls(key[1], ionic_steps)
+        reader = cls.readers[key]
+        if ionic_steps > reader.ionic_steps:
+            reader.ionic_steps = ionic_steps
+            reader.reset()
+        return reader.update()
+
+    def reset(self) -> None:
+        """Forget everything read so far."""
+        super().reset()
+        self.ionic_step_timings: list[float] = []
+        self.electronic_step_timings: list[float] = []
+        self.drift: list[list[float]] = []
+        self.smearing_entropy: list[float] = []
+        self.electronic_step_indices: list[int] = []
+        self.completed_ionic_steps = 0
+        self.nbands: int | None = None
+        self.nelect: float | None = None
+        self.nranks: int | None = None
+        self.total_magnetization: float | None = None
+        self.magnetization: list[float] = []
+        self.run_stats: dict[str, float | None] = {}
+        self.n_ionic_steps = 0
+        self.forces: deque[np.ndarray] = deque(maxlen=self.ionic_steps)
+        self.displacements: deque[np.ndarray] = deque(maxlen=self.ionic_steps)
+        self.finished = False
+        self._lattice: np.ndarray | None = None
+        self._lattice_block: list[list[float]] | None = None
+        self._positions: np.ndarray | None = None
+        self._force_block: list[list[float]] | None = None
+        self._magnetization_block: list[float] | None = None
+
+    def parse_line(self, line: bytes) -> None:
+        """Update the results with a line of the OUTCAR."""
+        if self._force_block is not None:
+            self._parse_force_line(line)
+        elif self._lattice_block is not None:
+            self._lattice_block.append([float(value) for value in line.split()[:3]])
+            if len(self._lattice_block) == 3:
+                self._lattice, self._lattice_block = np.array(self._lattice_block), None
+        elif self._magnetization_block is not None:
+            tokens = line.split()
+            if tokens and tokens[0].isdigit():
+                self._magnetization_block.append(float(tokens[-1]))
+            elif tokens and tokens[0] == b"tot":
+                self.magnetization, self._magnetization_block = self._magnetization_block, None
+        elif self.finished:
+            if b"(sec)" in line or b"(kb)" in line:
+                key, _, value = line.partition(b":")
+                try:
+                    self.run_stats[key.strip().decode()] = float(value)
+                except ValueError:
+                    self.run_stats[key.strip().decode()] = None
+        elif b"LOOP" in line:
+            if match := self._ionic_timing_patt.search(line):
+                self.ionic_step_timings.append(float(match[1]))
+            elif match := self._electronic_timing_patt.search(line):
+                self.electronic_step_timings.append(float(match[1]))
+        elif b"total drift:" in line:
+            if match := self._drift_patt.search(line):
+                self.drift.append([float(value) for value in match.groups()])
+        elif b"entropy T*S" in line:
+            if match := self._entropy_patt.search(line):
+                self.smearing_entropy.append(float(match[1]))
+        elif b"Iteration" in line:
+            if match := self._iteration_patt.search(line):
+                self.electronic_step_indices.append(int(match[1]))
+        elif b"aborting loop" in line:
+            self.completed_ionic_steps += 1
+        elif b"NBANDS=" in line:
+            if self.nbands is None:
+                with contextlib.suppress(IndexError, ValueError):
+                    self.nbands = int(line.split(b"=")[-1].strip())
+        elif b"number of electron" in line and (match := self._nelect_patt.search(line)):
+            self.nelect = float(match[1])
+            if match[2]:
+                self.total_magnetization = float(match[2])
+        elif b"magnetization (x)" in line:
+            self._magnetization_block = []
+        elif b"running" in line and self.nranks is None and (match := self._nranks_patt.search(line)):
+            self.nranks = int(match[1])
+        elif b"TOTAL-FORCE" in line:
+            self._force_block = []
+        elif b"direct lattice vectors" in line:
+            self._lattice_block = []
+        elif b"General timing and accounting" in line:
+            self.finished = True
+
+    def _parse_force_line(self, line: bytes) -> None:
+        if not line.strip().startswith(b"-"):
+            self._force_block.append([float(value) for value in line.split()[:6]])
+        elif self._force_block:
+            block = np.array(self._force_block)
+            positions = block[:, :3]
+            displacements = np.zeros_like(positions)
+            if self._positions is not None and len(self._positions) == len(positions):
+                displacements = positions - self._positions
+                if self._lattice is not None:
+                    frac = np.linalg.solve(self._lattice.T, displacements.T).T
+                    displacements = (frac - np.rint(frac)) @ self._lattice
+            self._positions = positions
+            self.n_ionic_steps += 1
+            self.forces.append(block[:, 3:].astype(np.float32))
+            self.displacements.append(displacements.astype(np.float32))
+            self._force_block = None
+
+
+class IncrementalOszicar(IncrementalFileReader):
+    """
+    OSZICAR reader for monitors, parsing only the lines appended since the
+    last check (see :class:`custodian.utils.IncrementalFileReader`).
+
+    Lines are interpreted as by pymatgen's Oszicar, except that only the
+    lines with F= or E0= count as ionic steps, and only compact arrays are
+    kept:
+
+    - electronic_step_counts: number of electronic steps of each ionic step,
+      including the one in progress.
+    - E0, dE, F: energies of each completed ionic step (NaN when absent).
+    - electronic_dE, electronic_ncg: energy change and number of Hamiltonian
+      evaluations of each electronic step of the ionic step in progress
+      (empty once it is completed).
+    """
+
+    _electronic_patt = re.compile(rb"\s*\w+\s*:(.*)")
+    _ionic_patt = re.compile(rb"(\w+)=\s*(\S+)")
+    _ionic_keys = (b"E0", b"dE", b"F")
+
+    def reset(self) -> None:
+        """Forget everything read so far."""
+        super().reset()
+        self._counts = np.zeros(64, dtype=int)
+        self._energies = np.full((64, len(self._ionic_keys)), np.nan)
+        self.n_electronic_blocks = 0
+        self.n_ionic_steps = 0
+        self._electronic: list[tuple[float, float]] = []
+
+    @property
+    def electronic_step_counts(self) -> np.ndarray:
+        """Number of electronic steps of each ionic step."""
+        return self._counts[: self.n_electronic_blocks]
+
+    @property
+    def E0(self) -> np.ndarray:
+        """Energy sigma->0 of each ionic step."""
+        return self._energies[: self.n_ionic_steps, 0]
+
+    @property
+    def dE(self) -> np.ndarray:
+        """Energy change of each ionic step."""
+        return self._energies[: self.n_ionic_steps, 1]
+
+    @property
+    def F(self) -> np.ndarray:
+        """Free energy of each ionic step."""
+        return self._energies[: self.n_ionic_steps, 2]
+
+    @property
+    def electronic_dE(self) -> np.ndarray:
+        """Energy change of each electronic step of the ionic step in progress."""
+        return np.array([step[0] for step in self._electronic])
+
+    @property
+    def electronic_ncg(self) -> np.ndarray:
+        """Number of Hamiltonian evaluations of each electronic step of the ionic step in progress."""
+        return np.array([step[1] for step in self._electronic])
+
+    def parse_line(self, line: bytes) -> None:
+        """Update the results with a line of the OSZICAR."""
+        line = line.strip()
+        if match := self._electronic_patt.match(line):
+            tokens = match[1].split()
+            if not tokens or tokens[0] == b"1" or self.n_electronic_blocks == 0:
+                if self.n_electronic_blocks == len(self._counts):
+                    self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+                self.n_electronic_blocks += 1
+                self._electronic = []
+            self._counts[self.n_electronic_blocks - 1] += 1
+            try:
+                self._electronic.append((float(tokens[2]), float(tokens[4])))
+            except (IndexError, ValueError):
+                self._electronic.append((np.nan, np.nan))
+        elif (values := dict(self._ionic_patt.findall(line.replace(b"d E ", b"dE")))).keys() & {b"F", b"E0"}:
+            # only the "N F= ... E0= ..." lines complete an ionic step
+            if self.n_ionic_steps == len(self._energies):
+                self._energies = np.concatenate([self._energies, np.full_like(self._energies, np.nan)])
+            for idx, key in enumerate(self._ionic_keys):
+                with contextlib.suppress(KeyError, ValueError):
+                    self._energies[self.n_ionic_steps, idx] = float(values[key])
+            self.n_ionic_steps += 1
+            self._electronic = []
+
+
+class VaspInputTransaction(InputTransaction):
+    """
+    VaspInput of a directory shared by all the handlers of a Custodian check.
+    The inputs (including the POTCAR) are parsed once, the first time they are
+    needed, and modified files are written once, atomically, at the end of the
+    check. See :class:`custodian.utils.InputTransaction`.
+    """
+
+    def __init__(self, directory: str = "./") -> None:
+        """
+        Args:
+            directory (str): Directory containing the VASP input files.
+        """
+        super().__init__(directory)
+        self._vi = None
+
+    @property
+    def vi(self) -> VaspInput:
+        """The VaspInput, reflecting all the actions applied so far."""
+        if self._vi is None:
+            from pymatgen.io.vasp.inputs import VaspInput
+
+            self._vi = VaspInput.from_directory(self.directory)
+        return self._vi
+
+    def shares(self, vi) -> bool:
+        """Whether vi is the VaspInput held by this transaction."""
+        return vi is not None and vi is self._vi
+
+    def refresh(self, filename: str) -> None:
+        """
+        Reload an input file that has been replaced on disk, e.g. by a
+        CONTCAR -> POSCAR copy. Any staged write of this file is dropped,
+        since the file action happened after it.
+        """
+        self.discard(filename)
+        if self._vi is not None and filename in VASP_INPUT_FILES:
+            path = zpath(os.path.join(self.directory, filename))
+            self._vi[filename] = read_vasp_input_file(filename, path) if os.path.isfile(path) else None
+
+
+class NEBImageTransaction(VaspInputTransaction):
+    """
+    Inputs of a NEB image directory. VASP reads the INCAR, KPOINTS and POTCAR
+    of all the images from the root directory, so these are taken from (and
+    staged to) the transaction of the root, and only the POSCAR is read from
+    and written to the image directory.
+
+    The images of a :func:`neb_image_inputs` context see the root inputs as
+    they were when the first of them was loaded, so that images failing with
+    the same error get the same correction instead of escalating one after
+    the other. The INCAR changes of the images are merged in the root.
+    """
+
+    root_files: ClassVar[tuple[str, ...]] = ("INCAR", "KPOINTS", "POTCAR")
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, directory: str, root: str) -> None:
+        """
+        Args:
+            directory (str): Directory of the image.
+            root (str): Directory of the NEB calculation.
+        """
+        super().__init__(directory)
+        self.root = VaspInputTransaction.for_directory(root)
+        self.base: dict = {}
+
+    @property
+    def vi(self) -> VaspInput:
+        """The VaspInput of the image, with the root inputs of the context."""
+        # Images may be checked concurrently, the root inputs are parsed once.
+        with NEBImageTransaction._lock:
+            if self._vi is None:
+                from pymatgen.io.vasp.inputs import VaspInput
+
+                self._vi = VaspInput.from_directory(self.directory)
+            for filename in self.root_files:
+                if filename not in self.base:
+                    self.base[filename] = self.root.vi[filename]
+                self._vi[filename] = self.base[filename]
+        return self._vi
+
+    def stage(self, filename: str, obj) -> None:
+        """Stage a write, merged in the root directory for the INCAR, KPOINTS and POTCAR."""
+        if filename not in self.root_files:
+            super().stage(filename, obj)
+            return
+        base, current = self.base.get(filename), self.root.vi[filename]
+        if filename == "INCAR" and base is not None and current is not None:
+            merged = current.copy()
+            merged.update({key: val for key, val in obj.items() if base.get(key) != val})
+            for key in set(base).difference(obj):
+                merged.pop(key, None)
+            obj = merged
+        self.root.vi[filename] = obj
+        self.root.stage(filename, obj)
+
+    def refresh(self, filename: str) -> None:
+        """Reload an input file replaced on disk, in the root directory if shared."""
+        if filename in self.root_files:
+            self.root.refresh(filename)
+            self.base.pop(filename, None)
+        else:
+            super().refresh(filename)
+
+
+@contextlib.contextmanager
+def neb_image_inputs(directory: str, images):
+    """
+    Within this context, the inputs loaded with :func:`load_vasp_input` and
+    modified with VaspModder in the image directories of a NEB calculation
+    are those of :class:`NEBImageTransaction`, so that handlers written for a
+    single directory can check and correct an image. Uses the deferred scope
+    of the current Custodian check if there is one, and opens one otherwise.
+
+    Args:
+        directory (str): Directory of the NEB calculation.
+        images ([str]): Names of the image directories.
+    """
+    scope = contextlib.nullcontext() if InputTransaction.state.deferred else InputTransaction.deferred_scope()
+    with scope:
+        base: dict = {}
+        for image in images:
+            image_dir = os.path.join(directory, image)
+            key = (VaspInputTransaction, os.path.abspath(image_dir))
+            transaction = InputTransaction.state.open_transactions.get(key)
+            if not isinstance(transaction, NEBImageTransaction):
+                transaction = InputTransaction.state.open_transactions[key] = NEBImageTransaction(image_dir, directory)
+            transaction.base = base
+        yield
+
+
+def load_vasp_input(directory="./"):
+    """
+    Load the VaspInput of a directory. Within a Custodian check the object is
+    shared between handlers, so the inputs are only parsed once per check.
+
+    Args:
+        directory: directory containing the VASP input files.
+
+    Returns:
+        The VaspInput object
+    """
+    return VaspInputTransaction.for_directory(directory).vi
+
+
+class IncarView(Mapping):
+    """
+    Read-only view of the tags of an INCAR file, for handler checks that only
+    look at a few tags. Values are typed on access with Incar.proc_val, so
+    they are the same as in an Incar object. Keys are case-insensitive.
+    """
+
+    def __init__(self, raw: dict) -> None:
+        """
+        Args:
+            raw (dict): upper-case tag -> untyped value string.
+        """
+        self.raw = raw
+        self._values: dict = {}
+
+    def __getitem__(self, key):
+        from pymatgen.io.vasp.inputs import Incar
+
+        key = key.strip().upper()
+        if key not in self._values:
+            if key == "MAGMOM":
+                # noncollinear MAGMOM is reshaped according to other tags
+                tags = ("MAGMOM", "LSORBIT", "LNONCOLLINEAR")
+                self._values[key] = Incar({tag: Incar.proc_val(tag, self.raw[tag]) for tag in tags if tag in self.raw})[
+                    key
+                ]
+            else:
+                self._values[key] = Incar.proc_val(key, self.raw[key])
+        return self._values[key]
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and key.strip().upper() in self.raw
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def to_incar(self) -> Incar:
+        """Incar object with the same tags, for corrections that write the file."""
+        from pymatgen.io.vasp.inputs import Incar
+
+        return Incar({key: self[key] for key in self.raw})
+
+
+def _input_file_cache(func):
+    """
+    tracked_file_cache for the readers of VASP input files. Within a Custodian
+    check, a file staged by an earlier correction, which is only written at
+    the end of the check, is read from the staged object instead, without
+    caching.
+    """
+    cached = tracked_file_cache(func)
+
+    @functools.wraps(func)
+    def wrapper(filepath):
+        if InputTransaction.staged_object(filepath) is not None:
+            return func(filepath)
+        return cached(filepath)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def _open_input(filepath):
+    """
+    Open a VASP input file as text, or the text of the version staged for it
+    in the current Custodian check.
+    """
+    if (staged := InputTransaction.staged_object(filepath)) is not None:
+        yield io.StringIO(str(staged))
+    else:
+        with zopen(filepath, mode="rt", encoding="utf-8") as file:
+            yield file
+
+
+@_input_file_cache
+def read_incar(filepath) -> IncarView:
+    """
+    Read the tags of an INCAR file without building an Incar object.
+    Caches the output for reuse until the file changes, and sees the
+    corrections staged earlier in the current Custodian check.
+
+    Args:
+        filepath: path to the INCAR file.
+
+    Returns:
+        IncarView
+    """
+    from pymatgen.util.io_utils import clean_lines
+
+    raw = {}
+    with _open_input(filepath) as file:
+        for line in clean_lines(file):
+            for statement in line.split(";"):
+                if match := re.match(r"(\w+)\s*=\s*(.*)", statement.strip()):
+                    raw[match[1].upper()] = match[2].strip()
+    return IncarView(raw)
+
+
+class KpointsHeader(NamedTuple):
+    """The first lines of a KPOINTS file, which tell how the k-points are generated."""
+
+    comment: str
+    num_kpts: int
+    style: Kpoints.supported_modes
+
+
+@_input_file_cache
+def read_kpoints_header(filepath) -> KpointsHeader:
+    """
+    Read the header of a KPOINTS file, with the generation style as pymatgen
+    would determine it, without reading the k-points themselves.
+    Caches the output for reuse until the file changes.
+
+    Args:
+        filepath: path to the KPOINTS file.
+
+    Returns:
+        KpointsHeader
+    """
+    from pymatgen.io.vasp.inputs import Kpoints
+
+    with _open_input(filepath) as file:
+        comment, num_kpts, style = (file.readline().strip() for _ in range(3))
+    num_kpts = int(num_kpts.split()[0])
+    style = style.lower()[0]
+    modes = Kpoints.supported_modes
+    if style in {"a", "g", "m", "l"}:
+        mode = {"a": modes.Automatic, "g": modes.Gamma, "m": modes.Monkhorst, "l": modes.Line_mode}[style]
+    else:
+        mode = modes.Cartesian if style in "ck" else modes.Reciprocal
+    return KpointsHeader(comment, num_kpts, mode)
+
+
+class PoscarHeader(NamedTuple):
+    """The lattice and composition lines of a POSCAR file."""
+
+    comment: str
+    lattice: np.ndarray
+    species: list[str] | None
+    natoms: list[int]
+
+    @property
+    def n_atoms(self) -> int:
+        """Total number of atoms."""
+        return sum(self.natoms)
+
+
+@_input_file_cache
+def read_poscar_header(filepath) -> PoscarHeader:
+    """
+    Read the header of a POSCAR or CONTCAR file, stopping before the atomic
+    positions. Caches the output for reuse until the file changes.
+
+    Args:
+        filepath: path to the POSCAR file.
+
+    Returns:
+        PoscarHeader, with the lattice scaled as in Poscar.structure. species
+        is None for VASP 4 files, which do not list them.
+    """
+    from pymatgen.util.io_utils import clean_lines
+
+    with _open_input(filepath) as file:
+        lines = clean_lines(file, remove_empty_lines=False)
+        comment = next(lines)
+        scale = float(next(lines))
+        lattice = np.array([[float(val) for val in next(lines).split()] for _ in range(3)])
+        species: list[str] | None = None
+        while True:
+            tokens = next(lines).split()
+            try:
+                natoms = [int(val) for val in tokens]
+                break
+            except ValueError:
+                # symbols may be written as in POTCAR, e.g. Mg_pv/f474ac0d
+                species = [*(species or []), *(token.split("/")[0].split("_")[0] for token in tokens)]
+        # counts of many species groups are wrapped over several lines
+        while species and len(natoms) < len(species):
+            natoms += [int(val) for val in next(lines).split()]
+    if scale < 0:
+        lattice *= (-scale / abs(np.linalg.det(lattice))) ** (1 / 3)
+    else:
+        lattice *= scale
+    return PoscarHeader(comment, lattice, species, natoms)
@@ -1,27 +1,54 @@
 """This module implements basic kinds of jobs for VASP runs."""
 
+from __future__ import annotations
+
 import logging
 import math
 import os
 import shutil
 import signal
 import subprocess
+import time
 from shutil import which
+from typing import TYPE_CHECKING
 
 import numpy as np
 from monty.serialization import dumpfn, loadfn
 from monty.shutil import decompress_dir
-from pymatgen.core.structure import Structure
-from pymatgen.io.vasp.inputs import Incar, Kpoints, Poscar, VaspInput
-from pymatgen.io.vasp.outputs import Outcar, Vasprun
 
-from custodian.custodian import SENTRY_DSN, Job
-from custodian.utils import backup
-from custodian.vasp.handlers import VASP_BACKUP_FILES
+from custodian.custodian import Job, init_sentry
+from custodian.utils import StreamTee, backup, get_mpi_ranks, lazy_imports, set_mpi_ranks
+from custodian.vasp.handlers import VASP_BACKUP_FILES, preflight_corrections
 from custodian.vasp.interpreter import VaspModder
+from custodian.vasp.io import (
+    VASP_SUMMARY_FILE,
+    VaspInputTransaction,
+    load_vasp_summary,
+    volumetric_data_complete,
+    wavecar_complete,
+    write_vasp_summary,
+)
+from custodian.vasp.utils import is_valid_poscar
+
+if TYPE_CHECKING:
+    from pymatgen.io.vasp.inputs import VaspInput
 
 logger = logging.getLogger(__name__)
 
+# pymatgen objects formerly imported at module level, now resolved on first
+# access (PEP 562) so that importing the jobs stays cheap.
+_LAZY_IMPORTS = {
+    "Structure": "pymatgen.core.structure",
+    "Incar": "pymatgen.io.vasp.inputs",
+    "Kpoints": "pymatgen.io.vasp.inputs",
+    "Poscar": "pymatgen.io.vasp.inputs",
+    "VaspInput": "pymatgen.io.vasp.inputs",
+    "Outcar": "pymatgen.io.vasp.outputs",
+    "Vasprun": "pymatgen.io.vasp.outputs",
+}
+
+__getattr__ = lazy_imports(__name__, _LAZY_IMPORTS)
+
 
 VASP_INPUT_FILES = ("INCAR", "POSCAR", "POTCAR", "KPOINTS")
 
@@ -63,6 +90,49 @@ VASP_NEB_OUTPUT_SUB_FILES = (
     "XDATCAR",
 )
 
+# INCAR tags that a correction may change without invalidating the WAVECAR
+# and CHGCAR of the previous attempt (see VaspJob.warm_restart).
+WARM_RESTART_INCAR_KEYS = frozenset(
+    {
+        "ALGO",
+        "IALGO",
+        "AMIN",
+        "AMIX",
+        "AMIX_MAG",
+        "BMIX",
+        "BMIX_MAG",
+        "IMIX",
+        "INIMIX",
+        "MAXMIX",
+        "MIXPRE",
+        "WC",
+        "NELM",
+        "NELMIN",
+        "NELMDL",
+        "EDIFF",
+        "EDIFFG",
+        "IBRION",
+        "ISIF",
+        "NSW",
+        "POTIM",
+        "ISMEAR",
+        "SIGMA",
+        "LREAL",
+        "NCORE",
+        "NPAR",
+        "KPAR",
+        "NSIM",
+        "LPLANE",
+        "LWAVE",
+        "LCHARG",
+        "ISTART",
+        "ICHARG",
+    }
+)
+
+# Changes that only invalidate the WAVECAR, the density stays a good guess.
+WARM_RESTART_DENSITY_KEYS = frozenset({"NBANDS", "ISYM", "SYMPREC", "KSPACING", "KGAMMA"})
+
 
 class VaspJob(Job):
     """
@@ -86,6 +156,11 @@ class VaspJob(Job):
         auto_continue=False,
         update_incar=False,
         terminate_timeout: float = 10.0,
+        capture_stdout: bool = False,
+        compress_stdout: bool = False,
+        write_summary: bool = False,
+        preflight: str | None = None,
+        warm_restart: bool = False,
     ) -> None:
         """
         This constructor is necessarily complex due to the need for
@@ -147,7 +222,36 @@ class VaspJob(Job):
             terminate_timeout (float): Timeout in seconds to wait for graceful
                 termination (SIGTERM) before escalating to SIGKILL. Large MPI
                 jobs may need longer timeouts. Defaults to 10.0 seconds.
+            capture_stdout (bool): Whether Custodian should own the stdout pipe
+                of VASP instead of redirecting it straight to output_file. A
+                reader thread then writes the stream to disk and feeds it to
+                streaming matchers (see :class:`custodian.utils.StreamTee`), so
+                handlers such as VaspErrorHandler detect errors as soon as the
+                line is written, without re-reading output_file. Defaults to False.
+            compress_stdout (bool): Whether to gzip the captured stdout on the
+                fly, in which case it is written to output_file + ".gz". Only
+                used if capture_stdout is True. Note that handlers reading
+                output_file directly will not find it. Defaults to False.
+            write_summary (bool): Whether to summarize vasprun.xml and OUTCAR
+                in custodian.vasp.io.VASP_SUMMARY_FILE once the run is done.
+                copy_magmom, update_incar and the job generators then read
+                the summary instead of parsing the outputs again, as long as
+                the outputs have not changed. Defaults to False.
+            preflight (str): What to do at the end of setup with the inputs
+                that are known to make VASP fail (see
+                :func:`custodian.vasp.handlers.preflight_corrections`):
+                "correct" applies the corrections VaspErrorHandler would apply
+                after the failure, "warn" only logs them, and None skips the
+                checks. The corrections are recorded in the run log as
+                preemptive_corrections in both cases. A preflight that fails
+                itself is logged and skipped. Defaults to None.
+            warm_restart (bool): Whether to restart the SCF of the attempts
+                that follow a correction from the WAVECAR or CHGCAR left by
+                the previous attempt, when the correction kept them valid
+                (see :meth:`warm_restart_actions`). Defaults to False.
         """
+        if preflight not in {None, "warn", "correct"}:
+            raise ValueError(f"Unknown {preflight=}, must be None, 'warn' or 'correct'.")
         self.vasp_cmd = tuple(vasp_cmd)
         self.output_file = output_file
         self.stderr_file = stderr_file
@@ -162,8 +266,15 @@ class VaspJob(Job):
         self.auto_continue = auto_continue
         self.update_incar = update_incar
         self.terminate_timeout = terminate_timeout
-
-        if SENTRY_DSN:
+        self.capture_stdout = capture_stdout
+        self.compress_stdout = compress_stdout
+        self.write_summary = write_summary
+        self.preflight = preflight
+        self.warm_restart = warm_restart
+        self._launch: dict | None = None
+        self._restart_tags: dict[str, tuple] = {}
+
+        if init_sentry():
             # if using Sentry logging, add specific VASP executable to scope
             from sentry_sdk import configure_scope
 
@@ -184,7 +295,12 @@ class VaspJob(Job):
         Performs initial setup for VaspJob, including overriding any settings
         and backing up.
         """
+        from pymatgen.io.vasp.inputs import Incar
+        from pymatgen.io.vasp.outputs import Vasprun
+
         decompress_dir(directory)
+        self._launch = None
+        self._restart_tags = {}
 
         if self.backup:
             for file in VASP_INPUT_FILES:
@@ -243,8 +359,10 @@ class VaspJob(Job):
 
         if self.update_incar:
             try:
-                vasprun = Vasprun(os.path.join(directory, "vasprun.xml"))
-                params = vasprun.parameters
+                summary = load_vasp_summary(directory)
+                params = (
+                    summary["parameters"] if summary else Vasprun(os.path.join(directory, "vasprun.xml")).parameters
+                )
                 incar = Incar.from_file(os.path.join(directory, "INCAR"))
                 for k, v in incar.items():
                     incar[k] = params.get(k, v)
@@ -255,6 +373,21 @@ class VaspJob(Job):
         if self.settings_override is not None:
             VaspModder(directory=directory).apply_actions(self.settings_override)
 
+        self.preemptive_corrections = []
+        if self.preflight:
+            apply = self.preflight == "correct"
+            try:
+                for correction in preflight_corrections(directory):
+                    logger.warning(
+                        f"Inputs expected to fail with {correction['errors']}. "
+                        f"{'Applying' if apply else 'Suggested'} actions: {correction['actions']}"
+                    )
+                    if apply:
+                        VaspModder(directory=directory).apply_actions(correction["actions"])
+                    self.preemptive_corrections.append({**correction, "applied": apply})
+            except Exception:
+                logger.exception("Preflight checks of the inputs failed, running the job as is")
+
     def run(self, directory="./"):
         """
         Perform the actual VASP run.
@@ -262,6 +395,17 @@ class VaspJob(Job):
         Returns:
             (subprocess.Popen) Used for monitoring.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
+        if self.warm_restart:
+            if self._launch is not None:
+                actions = self.warm_restart_actions(directory)
+                if actions:
+                    logger.info(f"Warm restart from the previous attempt. Actions: {actions}")
+                    VaspModder(directory=directory).apply_actions(actions)
+                    self._record_restart_tags(actions)
+            self._launch = self._read_launch_inputs(directory)
+
         cmd = list(self.vasp_cmd)
         if self.auto_gamma:
             vi = VaspInput.from_directory(directory)
@@ -271,6 +415,18 @@ class VaspJob(Job):
                 elif which(cmd[-1] + ".gamma"):
                     cmd[-1] += ".gamma"
         logger.info(f"Running {' '.join(cmd)}")
+        if self.capture_stdout:
+            with open(os.path.join(directory, self.stderr_file), "w", buffering=1) as f_err:
+                self._vasp_process = subprocess.Popen(
+                    cmd, cwd=directory, stdout=subprocess.PIPE, stderr=f_err, start_new_session=True
+                )
+            StreamTee(
+                self._vasp_process.stdout,
+                os.path.join(directory, self.output_file),
+                compress=self.compress_stdout,
+                process=self._vasp_process,
+            ).start()
+            return self._vasp_process
         with (
             open(os.path.join(directory, self.output_file), "w") as f_std,
             open(os.path.join(directory, self.stderr_file), "w", buffering=1) as f_err,
@@ -286,7 +442,22 @@ class VaspJob(Job):
         Postprocessing includes renaming and gzipping where necessary.
         Also copies the magmom to the incar if necessary.
         """
-        for file in (*VASP_OUTPUT_FILES, self.output_file):
+        from pymatgen.io.vasp.inputs import Incar
+        from pymatgen.io.vasp.outputs import Outcar
+
+        if tee := StreamTee.get(os.path.join(directory, self.output_file)):
+            tee.drain()
+        summary = None
+        if self.write_summary:
+            try:
+                summary = write_vasp_summary(directory)
+            except Exception:
+                logger.exception(f"Unable to write {VASP_SUMMARY_FILE}")
+
+        output_file = self.output_file
+        if self.capture_stdout and self.compress_stdout:
+            output_file += ".gz"
+        for file in (*VASP_OUTPUT_FILES, VASP_SUMMARY_FILE, output_file):
             file = os.path.join(directory, file)
             if os.path.isfile(file):
                 if self.final and self.suffix != "":
@@ -296,8 +467,11 @@ class VaspJob(Job):
 
         if self.copy_magmom and not self.final:
             try:
-                outcar = Outcar(os.path.join(directory, "OUTCAR"))
-                magmom = [m["tot"] for m in outcar.magnetization]
+                if summary and "magnetization" in summary:
+                    magmom = summary["magnetization"]
+                else:
+                    outcar = Outcar(os.path.join(directory, "OUTCAR"))
+                    magmom = [m["tot"] for m in outcar.magnetization]
                 incar = Incar.from_file(os.path.join(directory, "INCAR"))
                 incar["MAGMOM"] = magmom
                 incar.write_file(os.path.join(directory, "INCAR"))
@@ -346,6 +520,8 @@ class VaspJob(Job):
         Returns:
             List of two jobs corresponding to an AFLOW style run.
         """
+        from pymatgen.io.vasp.inputs import Kpoints
+
         incar_update = {"ISTART": 1}
         if ediffg:
             incar_update["EDIFFG"] = ediffg
@@ -404,6 +580,8 @@ class VaspJob(Job):
         to precondition the electronic structure optimizer. The metaGGA
         optimization is performed using the double relaxation scheme.
         """
+        from pymatgen.io.vasp.inputs import Incar
+
         incar = Incar.from_file(os.path.join(directory, "INCAR"))
         # Defaults to using the SCAN metaGGA
         metaGGA = incar.get("METAGGA", "SCAN")
@@ -490,6 +668,8 @@ class VaspJob(Job):
         Returns:
             Generator of jobs.
         """
+        from pymatgen.io.vasp.inputs import Kpoints, Poscar
+
         for step in range(max_steps):
             if step == 0:
                 settings = None
@@ -590,6 +770,10 @@ class VaspJob(Job):
             Generator of jobs. At the end of the run, an "EOS.txt" is written
             which provides a quick look at the E vs lattice parameter.
         """
+        from pymatgen.core.structure import Structure
+        from pymatgen.io.vasp.inputs import Incar, Poscar
+        from pymatgen.io.vasp.outputs import Vasprun
+
         nsw = 99 if atom_relax else 0
 
         incar = Incar.from_file(os.path.join(directory, "INCAR"))
@@ -615,9 +799,11 @@ class VaspJob(Job):
                 backup = True
             else:
                 backup = False
-                v = Vasprun("vasprun.xml")
-                structure = v.final_structure
-                energy = v.final_energy
+                if summary := load_vasp_summary():
+                    structure, energy = summary["final_structure"], summary["final_energy"]
+                else:
+                    v = Vasprun("vasprun.xml")
+                    structure, energy = v.final_structure, v.final_energy
                 lattice = structure.lattice
 
                 x = lattice.abc[lattice_index]
@@ -709,6 +895,171 @@ class VaspJob(Job):
             for key in sorted(energies):
                 file.write(f"{key} {energies[key]}\n")
 
+    @staticmethod
+    def _read_launch_inputs(directory: str) -> dict:
+        """The inputs an attempt is launched with, to compare them with the next one."""
+        from pymatgen.io.vasp.inputs import Incar, Poscar
+
+        try:
+            structure = Poscar.from_file(os.path.join(directory, "POSCAR")).structure
+        except Exception:
+            structure = None
+        return {
+            "time": time.time(),
+            "incar": dict(Incar.from_file(os.path.join(directory, "INCAR"))),
+            "kpoints": _read_text(os.path.join(directory, "KPOINTS")),
+            "structure": structure,
+        }
+
+    def warm_restart_actions(self, directory: str = "./") -> list[dict]:
+        """
+        Decide how the next attempt of the job can reuse the outputs of the
+        previous one, once the handlers have applied their corrections.
+
+        The WAVECAR is still valid if the structure and KPOINTS are unchanged
+        and the corrections only changed INCAR tags in WARM_RESTART_INCAR_KEYS
+        (ALGO, mixing, convergence and parallelization settings), in which case
+        ISTART is set to 1. The CHGCAR also survives the changes listed in
+        WARM_RESTART_DENSITY_KEYS (NBANDS, symmetry and k-points), in which case
+        ICHARG is set to 1. Only complete outputs written by the previous
+        attempt are used, and a valid CONTCAR of a relaxation is copied to
+        POSCAR as well.
+        Nothing is reused if a correction set ISTART or ICHARG itself.
+
+        When the outputs cannot be reused, e.g. because a correction deleted
+        them, the ISTART and ICHARG set by an earlier warm restart are
+        reverted, unless a correction changed them since.
+
+        Args:
+            directory (str): directory of the job.
+
+        Returns:
+            [dict]: The actions to apply, empty if there is nothing to reuse
+                or revert.
+        """
+        from pymatgen.io.vasp.inputs import Incar
+
+        if self._launch is None:
+            return []
+        incar = dict(Incar.from_file(os.path.join(directory, "INCAR")))
+        tags, copy_contcar = self._reusable_outputs(directory, incar)
+
+        actions = []
+        revert = {
+            key: original
+            for key, (value, original) in self._restart_tags.items()
+            if key not in tags and incar.get(key) == value
+        }
+        if unset := [key for key, original in revert.items() if original is None]:
+            actions.append({"dict": "INCAR", "action": {"_unset": dict.fromkeys(unset, 1)}})
+        if reset := {key: original for key, original in revert.items() if original is not None}:
+            actions.append({"dict": "INCAR", "action": {"_set": reset}})
+        if tags:
+            actions.append({"dict": "INCAR", "action": {"_set": tags}})
+        if copy_contcar:
+            actions.append({"file": "CONTCAR", "action": {"_file_copy": {"dest": "POSCAR"}}})
+        return actions
+
+    def _reusable_outputs(self, directory: str, incar: dict) -> tuple[dict, bool]:
+        """
+        The ISTART/ICHARG tags restarting from the outputs of the previous
+        attempt (empty if they are not valid anymore) and whether to copy the
+        CONTCAR. See warm_restart_actions.
+        """
+        from pymatgen.io.vasp.inputs import Poscar
+
+        launch = self._launch
+        changed = {k for k in set(incar) | set(launch["incar"]) if incar.get(k) != launch["incar"].get(k)}
+        if changed & {"ISTART", "ICHARG"} or incar.get("ICHARG", 0) >= 10:
+            return {}, False
+        if changed - WARM_RESTART_INCAR_KEYS - WARM_RESTART_DENSITY_KEYS:
+            return {}, False
+
+        def written(filename):
+            path = os.path.join(directory, filename)
+            return os.path.isfile(path) and os.path.getsize(path) > 0 and os.path.getmtime(path) >= launch["time"]
+
+        contcar = None
+        if written("CONTCAR") and is_valid_poscar("CONTCAR", directory):
+            contcar = Poscar.from_file(os.path.join(directory, "CONTCAR")).structure
+        try:
+            structure = Poscar.from_file(os.path.join(directory, "POSCAR")).structure
+        except Exception:
+            return {}, False
+        # A correction may have copied the CONTCAR already, any other change
+        # of the structure invalidates the outputs.
+        if launch["structure"] is None or structure not in (launch["structure"], contcar):
+            return {}, False
+
+        # a run killed while writing them leaves truncated files
+        same_kpoints = _read_text(os.path.join(directory, "KPOINTS")) == launch["kpoints"]
+        if (
+            written("WAVECAR")
+            and same_kpoints
+            and not changed & WARM_RESTART_DENSITY_KEYS
+            and wavecar_complete(os.path.join(directory, "WAVECAR"))
+        ):
+            tags = {"ISTART": 1}
+        elif written("CHGCAR") and volumetric_data_complete(os.path.join(directory, "CHGCAR")):
+            tags = {"ISTART": 0, "ICHARG": 1}
+        else:
+            return {}, False
+        return tags, contcar is not None and contcar != structure and incar.get("NSW", 0) > 0
+
+    def _record_restart_tags(self, actions: list[dict]) -> None:
+        """Remember the INCAR tags set by a warm restart and the values they replaced."""
+        for action in actions:
+            if action.get("dict") != "INCAR":
+                continue
+            for key in action["action"].get("_unset", {}):
+                self._restart_tags.pop(key, None)
+            for key, value in action["action"].get("_set", {}).items():
+                original = self._restart_tags[key][1] if key in self._restart_tags else self._launch["incar"].get(key)
+                if value == original:
+                    self._restart_tags.pop(key, None)
+                else:
+                    self._restart_tags[key] = (value, original)
+
+    def reduce_ranks(self, nranks: int, directory: str = "./") -> int:
+        """
+        Rewrite the number of MPI ranks (and the host list, if it gives the
+        slots of each host) of vasp_cmd and gamma_vasp_cmd for the next
+        attempts. KPAR, NCORE and NPAR are lowered in the INCAR when they no
+        longer divide the ranks (of each k-point group for NCORE and NPAR).
+
+        Args:
+            nranks (int): number of MPI ranks to run with.
+            directory (str): directory of the job.
+
+        Returns:
+            int: number of ranks freed, 0 if vasp_cmd does not set the number
+                of ranks or already uses no more than nranks.
+        """
+        current = get_mpi_ranks(self.vasp_cmd)
+        if current is None or not 0 < nranks < current:
+            logger.warning(f"Cannot run {' '.join(self.vasp_cmd)} on {nranks} MPI ranks.")
+            return 0
+        self.vasp_cmd = tuple(set_mpi_ranks(self.vasp_cmd, nranks))
+        if self.gamma_vasp_cmd and get_mpi_ranks(self.gamma_vasp_cmd) is not None:
+            self.gamma_vasp_cmd = tuple(set_mpi_ranks(self.gamma_vasp_cmd, nranks))
+        logger.info(f"Running VASP on {nranks} MPI ranks instead of {current}: {' '.join(self.vasp_cmd)}")
+
+        if os.path.isfile(incar_path := os.path.join(directory, "INCAR")):
+            from pymatgen.io.vasp.inputs import Incar
+
+            incar = Incar.from_file(incar_path)
+            parallelization = {}
+            if nranks % (kpar := incar.get("KPAR", 1)):
+                kpar = parallelization["KPAR"] = math.gcd(kpar, nranks)
+            for key in ("NCORE", "NPAR"):
+                if key in incar and (nranks // kpar) % incar[key]:
+                    parallelization[key] = math.gcd(incar[key], nranks // kpar)
+            if parallelization:
+                logger.info(f"Setting {parallelization} for {nranks} MPI ranks")
+                incar.update(parallelization)
+                VaspInputTransaction.for_directory(directory).stage("INCAR", incar)
+        return current - nranks
+
     def terminate(self, directory: str = "./") -> None:
         """Kill all VASP processes associated with the current job.
 
@@ -873,6 +1224,8 @@ class VaspNEBJob(VaspJob):
         """Performs initial setup for VaspNEBJob, including overriding any settings
         and backing up.
         """
+        from pymatgen.io.vasp.inputs import Incar, Kpoints
+
         neb_dirs, neb_sub = self._get_neb_dirs(directory)
 
         if self.backup:
@@ -936,6 +1289,8 @@ class VaspNEBJob(VaspJob):
         Returns:
             (subprocess.Popen) Used for monitoring.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         cmd = list(self.vasp_cmd)
         if self.auto_gamma:
             vi = VaspInput.from_directory(directory)
@@ -1015,6 +1370,8 @@ class GenerateVaspInputJob(Job):
 
     def run(self, directory="./") -> None:
         """Run the calculation."""
+        from pymatgen.core.structure import Structure
+
         if os.path.isfile(os.path.join(directory, "CONTCAR")):
             structure = Structure.from_file(os.path.join(directory, "CONTCAR"))
         elif (not self.contcar_only) and os.path.isfile(os.path.join(directory, "POSCAR")):
@@ -1030,6 +1387,14 @@ class GenerateVaspInputJob(Job):
         """Dummy postprocess."""
 
 
+def _read_text(filename: str) -> str | None:
+    """Contents of a text file, None if it does not exist."""
+    if not os.path.isfile(filename):
+        return None
+    with open(filename) as file:
+        return file.read()
+
+
 def _gamma_point_only_check(vis: VaspInput) -> bool:
     """
     Check if only a single k-point is used in this calculation.
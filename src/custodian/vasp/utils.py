@@ -2,15 +2,20 @@
 
 from __future__ import annotations
 
+import json
 import logging
 import os
-from typing import TYPE_CHECKING, Any
+from glob import glob
+from math import ceil, log2
+from statistics import NormalDist
+from typing import TYPE_CHECKING, Any, NamedTuple
 
 import numpy as np
-from pymatgen.io.vasp.inputs import Kpoints, Poscar
+from monty.io import zopen
 
 if TYPE_CHECKING:
     from pymatgen.core import Structure
+    from pymatgen.io.vasp.inputs import Kpoints, VaspInput
 
 logger = logging.getLogger(__name__)
 
@@ -67,6 +72,8 @@ def increase_k_point_density(
             The new Kpoints object / KSPACING consistent with constraints.
             If an empty dict, no new k-point mesh could be found.
     """
+    from pymatgen.io.vasp.inputs import Kpoints
+
     uses_kspacing = isinstance(kpoints, float | int)
 
     if uses_kspacing:
@@ -109,6 +116,22 @@ def increase_k_point_density(
     return new_kpoints if success else {}  # type: ignore
 
 
+def neb_image_dirs(directory: str = "./") -> list[str]:
+    """Names of the directories of the intermediate images (01, 02, ...) of a
+    NEB calculation, without the fixed end points.
+
+    Args:
+        directory: Directory of the NEB calculation.
+
+    Returns:
+        The sorted names of the image directories.
+    """
+    neb_dirs = sorted(
+        path for path in os.listdir(directory) if path.isdigit() and os.path.isdir(os.path.join(directory, path))
+    )
+    return neb_dirs[1:-1]
+
+
 def is_valid_poscar(filename: str, directory: str = "./") -> bool:
     """Check if a POSCAR/CONTCAR file is valid and can be parsed.
 
@@ -130,8 +153,307 @@ def is_valid_poscar(filename: str, directory: str = "./") -> bool:
         return False
 
     # Try to parse as POSCAR
+    from pymatgen.io.vasp.inputs import Poscar
+
     try:
         Poscar.from_file(filepath)
         return True
     except Exception:
         return False
+
+
+class LinearTrend(NamedTuple):
+    """Least-squares straight line fitted through a series, with its uncertainty."""
+
+    slope: float
+    intercept: float
+    slope_stderr: float
+    residual_std: float
+
+    def __call__(self, x):
+        """Value of the fitted line at x."""
+        return self.intercept + self.slope * x
+
+    def reach(self, x: float, target: float, z_score: float = 0.0) -> float:
+        """
+        Abscissa at which the line, continued from its value at x with its
+        slope lowered by z_score standard errors, falls to target.
+
+        Args:
+            x (float): abscissa to continue the line from.
+            target (float): value to reach.
+            z_score (float): number of standard errors subtracted from the
+                slope, e.g. to get an optimistic bound for a decreasing series.
+
+        Returns:
+            float: x if the line is already at or below target, inf if it never
+                reaches it.
+        """
+        current = self(x)
+        if current <= target:
+            return float(x)
+        slope = self.slope - z_score * self.slope_stderr
+        return float(x + (target - current) / slope) if slope < 0 else np.inf
+
+
+def fit_linear_trend(x, y) -> LinearTrend:
+    """
+    Fit a straight line through (x, y) by least squares.
+
+    Args:
+        x (array-like): abscissae, at least 3 distinct values.
+        y (array-like): ordinates.
+
+    Returns:
+        LinearTrend: slope and intercept of the line, standard error of the
+            slope and standard deviation of the residuals.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) < 3:
+        raise ValueError("At least 3 points are needed to fit a trend with its uncertainty.")
+    x_mean, y_mean = x.mean(), y.mean()
+    sxx = np.sum((x - x_mean) ** 2)
+    slope = np.sum((x - x_mean) * (y - y_mean)) / sxx
+    intercept = y_mean - slope * x_mean
+    residual_std = np.sqrt(np.sum((y - intercept - slope * x) ** 2) / (len(x) - 2))
+    return LinearTrend(float(slope), float(intercept), float(residual_std / np.sqrt(sxx)), float(residual_std))
+
+
+class SCFPrediction(NamedTuple):
+    """
+    Prediction of the number of electronic steps needed to reach EDIFF.
+    Step counts are inf when the trend never reaches EDIFF.
+    """
+
+    n_steps: int
+    predicted_steps: float
+    optimistic_steps: float
+    nelm: int
+
+    @property
+    def converges(self) -> bool:
+        """Whether EDIFF is expected to be reached within NELM steps."""
+        return self.predicted_steps <= self.nelm
+
+    @property
+    def hopeless(self) -> bool:
+        """Whether even the optimistic bound of the trend misses EDIFF within NELM steps."""
+        return self.optimistic_steps > self.nelm
+
+
+def predict_scf_convergence(
+    dE, ediff: float, nelm: int, skip: int = 5, window: int = 20, min_steps: int = 8, confidence: float = 0.99
+) -> SCFPrediction | None:
+    """
+    Predict whether an SCF cycle reaches EDIFF within NELM electronic steps,
+    from the log-linear trend of the energy changes of its last steps.
+
+    Args:
+        dE (array-like): energy change of each electronic step so far.
+        ediff (float): EDIFF of the calculation.
+        nelm (int): NELM of the calculation.
+        skip (int): number of initial steps left out of the fit, e.g. the
+            non-selfconsistent steps set by NELMDL.
+        window (int): number of most recent steps the trend is fitted on.
+        min_steps (int): minimum number of steps to fit before predicting.
+        confidence (float): one-sided confidence level of the optimistic
+            bound of the convergence rate.
+
+    Returns:
+        SCFPrediction, or None if there are too few steps to predict.
+    """
+    dE = np.abs(np.asarray(dE, dtype=float))
+    n_steps = len(dE)
+    steps = np.arange(1, n_steps + 1)
+    if n_steps and dE[-1] < ediff:
+        return SCFPrediction(n_steps, n_steps, n_steps, nelm)
+    mask = np.isfinite(dE) & (steps > skip)
+    steps, dE = steps[mask][-window:], dE[mask][-window:]
+    if len(dE) < max(min_steps, 3):
+        return None
+
+    trend = fit_linear_trend(steps, np.log10(np.maximum(dE, np.finfo(float).tiny)))
+    target = np.log10(ediff)
+    return SCFPrediction(
+        n_steps,
+        trend.reach(steps[-1], target),
+        trend.reach(steps[-1], target, z_score=NormalDist().inv_cdf(confidence)),
+        nelm,
+    )
+
+
+def predict_step_time(timings, window: int = 10, confidence: float = 0.95) -> float:
+    """
+    Predict an upper bound on the duration of the next step of a series, from
+    the linear trend of the last timings and the spread around it.
+
+    Args:
+        timings (array-like): durations of the steps so far.
+        window (int): number of most recent timings the trend is fitted on.
+        confidence (float): one-sided confidence level of the bound.
+
+    Returns:
+        float: upper bound of the prediction interval of the next duration,
+            never less than the shortest timing in the window. With fewer
+            than 3 timings, the longest one; with none, 0.
+    """
+    timings = np.asarray(timings, dtype=float)[-window:]
+    if len(timings) < 3:
+        return float(timings.max()) if len(timings) else 0.0
+    steps = np.arange(len(timings))
+    trend = fit_linear_trend(steps, timings)
+    # standard error of a new observation at the next step
+    stderr = np.sqrt(
+        trend.residual_std**2 * (1 + 1 / len(steps)) + (trend.slope_stderr * (len(steps) - steps.mean())) ** 2
+    )
+    bound = trend(len(steps)) + NormalDist().inv_cdf(confidence) * stderr
+    return float(max(bound, timings.min()))
+
+
+def functional_label(incar) -> str:
+    """
+    Short label of the exchange-correlation functional set in an INCAR, e.g.
+    "PE", "R2SCAN", "HSE" or "PE+U", to group calculations that behave alike.
+
+    Args:
+        incar (dict-like): INCAR tags.
+
+    Returns:
+        str: the label.
+    """
+    if incar.get("LHFCALC"):
+        label = "HSE" if incar.get("HFSCREEN", 0) > 0 else "HF"
+    elif metagga := str(incar.get("METAGGA", "")).strip():
+        label = metagga.upper()
+    else:
+        label = str(incar.get("GGA", "PE")).upper()
+    return f"{label}+U" if incar.get("LDAU") else label
+
+
+def system_features(vi: VaspInput) -> dict:
+    """
+    Features of a VASP calculation that correction outcomes are grouped by
+    (see :class:`CorrectionHistory`).
+
+    Args:
+        vi (VaspInput): inputs of the calculation.
+
+    Returns:
+        dict: number of sites, sorted element symbols, functional label (see
+            :func:`functional_label`) and ISPIN.
+    """
+    structure = vi["POSCAR"].structure
+    return {
+        "nsites": len(structure),
+        "elements": sorted(el.symbol for el in structure.composition.elements),
+        "functional": functional_label(vi["INCAR"]),
+        "ispin": vi["INCAR"].get("ISPIN", 1),
+    }
+
+
+class CorrectionHistory:
+    """
+    Outcomes of past corrections mined from Custodian run logs, to rank the
+    rungs of a correction ladder by how likely they are to fix an error.
+
+    Handlers record in their corrections the rung applied for each error
+    ("rungs": {error: rung}) and the system features ("features", see
+    :func:`system_features`). A rung succeeded if the error did not come back
+    in the job and the job did not end on an error. Its cost is the number of
+    attempts of the job from the correction until the error came back or the
+    job ended. Rungs are ranked by smoothed success rate per attempt, among
+    the calculations that share as many features as possible: functional,
+    ISPIN, size (rounded up to a power of 2) and elements, then fewer of
+    them, as long as there are min_samples outcomes for the error.
+    """
+
+    def __init__(self, patterns: str | list[str], min_samples: int = 5) -> None:
+        """
+        Args:
+            patterns (str | list[str]): glob patterns (recursive) of the run
+                logs, e.g. "~/runs/**/custodian.json*".
+            min_samples (int): minimum number of outcomes of an error for a
+                group of calculations to be used to rank its rungs.
+        """
+        self.patterns = [patterns] if isinstance(patterns, str) else list(patterns)
+        self.min_samples = min_samples
+        self._outcomes: list[tuple[str, Any, dict, bool, int]] | None = None
+
+    @property
+    def outcomes(self) -> list[tuple[str, Any, dict, bool, int]]:
+        """(error, rung, features, success, cost) of each recorded correction, read once."""
+        if self._outcomes is None:
+            paths = sorted(
+                {path for pattern in self.patterns for path in glob(os.path.expanduser(pattern), recursive=True)}
+            )
+            self._outcomes = []
+            for path in paths:
+                try:
+                    with zopen(path, mode="rt", encoding="utf-8") as file:
+                        run_log = json.load(file)
+                except (OSError, ValueError):
+                    logger.warning(f"Skipping unreadable run log {path}")
+                    continue
+                for entry in run_log if isinstance(run_log, list) else []:
+                    self._outcomes += self._entry_outcomes(entry)
+        return self._outcomes
+
+    @staticmethod
+    def _entry_outcomes(entry: dict) -> list[tuple[str, Any, dict, bool, int]]:
+        corrections = entry.get("corrections") or []
+        failed = any(
+            entry.get(key)
+            for key in ("handler", "validator", "max_errors", "max_errors_per_job", "max_errors_per_handler")
+        )
+        outcomes = []
+        for idx, correction in enumerate(corrections):
+            features = correction.get("features")
+            for error, rung in (correction.get("rungs") or {}).items():
+                recurrence = next(
+                    (jdx for jdx in range(idx + 1, len(corrections)) if error in corrections[jdx].get("errors", [])),
+                    None,
+                )
+                success = recurrence is None and not failed
+                cost = (len(corrections) if recurrence is None else recurrence) - idx
+                outcomes.append((error, rung, features or {}, success, cost))
+        return outcomes
+
+    @staticmethod
+    def feature_keys(features: dict) -> list[tuple | None]:
+        """Keys of the groups of a calculation, from the most to the least specific, None if unknown."""
+        if not features:
+            return [None, None, None, ()]
+        size = 2 ** ceil(log2(max(features.get("nsites", 1), 1)))
+        base = (features.get("functional"), features.get("ispin"))
+        return [(*base, size, "-".join(features.get("elements", []))), (*base, size), base, ()]
+
+    def best(self, error: str, features: dict, candidates: list) -> Any | None:
+        """
+        The rung with the best success rate per attempt for an error.
+
+        Args:
+            error (str): the error to correct.
+            features (dict): features of the calculation.
+            candidates (list): rungs that may be applied, in ladder order,
+                which breaks ties.
+
+        Returns:
+            The best rung among the candidates with recorded outcomes in the
+            most specific group with enough outcomes, or None.
+        """
+        outcomes = [outcome for outcome in self.outcomes if outcome[0] == error]
+        for depth, key in enumerate(self.feature_keys(features)):
+            group = [outcome for outcome in outcomes if key is not None and self.feature_keys(outcome[2])[depth] == key]
+            if len(group) < self.min_samples:
+                continue
+            scores = {}
+            for rung in candidates:
+                results = [(success, cost) for _, other, _, success, cost in group if other == rung]
+                if results:
+                    rate = (sum(success for success, _ in results) + 1) / (len(results) + 2)
+                    scores[rung] = rate / np.mean([cost for _, cost in results])
+            if scores:
+                return max(scores, key=lambda rung: (scores[rung], -candidates.index(rung)))
+            return None
+        return None
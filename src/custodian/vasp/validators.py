@@ -6,14 +6,18 @@ import logging
 import os
 from collections import deque
 
-from pymatgen.io.vasp import Chgcar, Incar
+import numpy as np
 
 from custodian.custodian import Validator
-from custodian.vasp.io import load_outcar, load_vasprun
+from custodian.vasp.io import check_vasprun_xml, iter_volumetric_planes, load_outcar, read_incar
 
 
 class VasprunXMLValidator(Validator):
-    """Checks that a valid vasprun.xml was generated."""
+    """
+    Checks that a valid vasprun.xml was generated. Only the structure of the
+    file is checked, in a streaming pass; the data is parsed when needed by
+    handlers or analysis.
+    """
 
     def __init__(self, output_file: str = "vasp.out", stderr_file: str = "std_err.txt") -> None:
         """
@@ -30,7 +34,7 @@ class VasprunXMLValidator(Validator):
     def check(self, directory="./") -> bool:
         """Check for errors."""
         try:
-            load_vasprun(os.path.join(directory, "vasprun.xml"))
+            check_vasprun_xml(os.path.join(directory, "vasprun.xml"))
         except Exception:
             exception_context: dict[str, str | float] = {}
 
@@ -86,7 +90,7 @@ class VaspNpTMDValidator(Validator):
 
     def check(self, directory="./"):
         """Check for error."""
-        incar = Incar.from_file(os.path.join(directory, "INCAR"))
+        incar = read_incar(os.path.join(directory, "INCAR"))
         is_npt = incar.get("MDALGO") == 3
         if not is_npt:
             return False
@@ -105,10 +109,7 @@ class VaspAECCARValidator(Validator):
 
     def check(self, directory="./"):
         """Check for error."""
-        aeccar0 = Chgcar.from_file(os.path.join(directory, "AECCAR0"))
-        aeccar2 = Chgcar.from_file(os.path.join(directory, "AECCAR2"))
-        aeccar = aeccar0 + aeccar2
-        return check_broken_chgcar(aeccar)
+        return check_broken_chgcar_files([os.path.join(directory, "AECCAR0"), os.path.join(directory, "AECCAR2")])
 
 
 def check_broken_chgcar(chgcar, diff_thresh=None) -> bool:
@@ -136,3 +137,35 @@ def check_broken_chgcar(chgcar, diff_thresh=None) -> bool:
             return True
 
     return False
+
+
+def check_broken_chgcar_files(filepaths, diff_thresh=None) -> bool:
+    """
+    Same as check_broken_chgcar on the sum of the Chgcars of several files,
+    e.g. AECCAR0 and AECCAR2, but streamed one z-plane at a time: only two
+    planes of the summed density are in memory at any point, and reading
+    stops as soon as the density is known to be broken.
+
+    Args:
+        filepaths (list): paths of the CHGCAR-like files to add up.
+        diff_thresh (Float): Threshold for diagonal difference.
+            None means we won't check for this.
+    """
+    n_negative = 0
+    max_val = min_val = max_diff = None
+    previous = None
+    for planes in zip(*(iter_volumetric_planes(filepath) for filepath in filepaths), strict=True):
+        plane = sum(planes[1:], planes[0])
+        n_negative += (plane < 0).sum()
+        if n_negative > 100:
+            # a decent bunch of the values are negative this for sure means a broken charge density
+            return True
+        if diff_thresh:
+            max_val = plane.max() if max_val is None else np.maximum(max_val, plane.max())
+            min_val = plane.min() if min_val is None else np.minimum(min_val, plane.min())
+            if previous is not None:
+                diff = (previous[:-1, :-1] - plane[1:, 1:]).max()
+                max_diff = diff if max_diff is None else np.maximum(max_diff, diff)
+            previous = plane
+
+    return bool(diff_thresh and max_diff is not None and max_diff / (max_val - min_val) > diff_thresh)
@@ -1,6 +1,7 @@
 import os
 import random
 import subprocess
+import sys
 import unittest
 from glob import glob
 
@@ -66,6 +67,12 @@ class ExampleJob(Job):
         return f"ExampleJob{self.jobid}"
 
 
+class PreemptiveJob(ExampleJob):
+    def setup(self, directory="./") -> None:
+        super().setup(directory)
+        self.preemptive_corrections = [{"errors": ["too_small"], "actions": [], "applied": False}]
+
+
 class ExampleHandler(ErrorHandler):
     def __init__(self, params) -> None:
         self.params = params
@@ -125,6 +132,32 @@ class ExampleHandler2b(ExampleHandler2):
         return {"errors": "Unrecoverable error", "actions": []}
 
 
+class RankJob(ExampleJob):
+    def __init__(self, jobid, params=None, nranks=4) -> None:
+        super().__init__(jobid, params)
+        self.nranks = nranks
+
+    def reduce_ranks(self, nranks, directory="./") -> int:
+        freed, self.nranks = self.nranks - nranks, nranks
+        return freed
+
+
+class ExampleHandler3(ErrorHandler):
+    """
+    This handler asks for the job to be rerun on fewer ranks, once.
+    """
+
+    def __init__(self) -> None:
+        self.has_error = False
+
+    def check(self, directory="./") -> bool:
+        return not self.has_error
+
+    def correct(self, directory="./"):
+        self.has_error = True
+        return {"errors": ["Too many ranks"], "actions": [], "nranks": 2}
+
+
 class ExampleValidator1(Validator):
     def __init__(self) -> None:
         pass
@@ -170,6 +203,23 @@ class CustodianTest(unittest.TestCase):
         assert len(output) == n_jobs
         ExampleHandler(params).as_dict()
 
+    def test_preemptive_corrections(self) -> None:
+        c = Custodian([], [ExampleJob(0), PreemptiveJob(1)])
+        c.run()
+        assert "preemptive_corrections" not in c.run_log[0]
+        assert c.run_log[1]["preemptive_corrections"] == [{"errors": ["too_small"], "actions": [], "applied": False}]
+        assert c.total_errors == 0
+
+    def test_reduce_ranks(self) -> None:
+        job = RankJob(0)
+        c = Custodian([ExampleHandler3()], [job], max_errors=2)
+        c.run()
+        assert job.nranks == 2
+        assert c.run_log[-1]["corrections"][0]["freed_ranks"] == 2
+        c = Custodian([ExampleHandler3()], [ExampleJob(0)], max_errors=2)
+        with pytest.raises(NonRecoverableError):
+            c.run()
+
     def test_run_interrupted(self) -> None:
         n_jobs = 100
         params = {"initial": 0, "total": 0}
@@ -346,3 +396,20 @@ custodian_params:
 #         assert len(c.run()) == 5
 #         os.remove("custodian.json")
 #         os.chdir(self.cwd)
+
+
+@pytest.mark.parametrize(
+    "module", ["custodian.custodian", "custodian.vasp.handlers", "custodian.vasp.jobs", "custodian.cli.run_vasp"]
+)
+def test_import_time(module) -> None:
+    """Importing handlers, jobs and CLIs must not pull in pymatgen or sentry."""
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - start)\n"
+        "print(','.join(m for m in sys.modules if m.split('.')[0] in ('pymatgen', 'sentry_sdk')))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split("\n")
+    assert out[1] == ""
+    assert float(out[0]) < 1
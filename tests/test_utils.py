@@ -1,7 +1,30 @@
+import gzip
+import os
+import subprocess
+import sys
 import tarfile
+import time
 from pathlib import Path
 
-from custodian.utils import backup, tracked_lru_cache
+import numpy as np
+import psutil
+import pytest
+
+from custodian.utils import (
+    MultiPatternMatcher,
+    ProcessTreeMonitor,
+    SignatureMatcher,
+    SignatureScanner,
+    StreamTee,
+    backup,
+    get_mpi_ranks,
+    job_processes,
+    memory_limit,
+    register_job_process,
+    set_mpi_ranks,
+    tracked_file_cache,
+    tracked_lru_cache,
+)
 
 
 def test_cache_and_clear() -> None:
@@ -30,6 +53,67 @@ def test_cache_and_clear() -> None:
     assert n_calls == 3
 
 
+def test_file_cache_persists_until_file_changes(tmp_path) -> None:
+    n_calls = 0
+
+    @tracked_file_cache
+    def read(filepath, upper=False):
+        nonlocal n_calls
+        n_calls += 1
+        text = Path(filepath).read_text()
+        return text.upper() if upper else text
+
+    path = tmp_path / "OUTCAR"
+    path.write_text("first")
+    # make the file old enough for its signature to be trusted across checks
+    os.utime(path, ns=(0, 0))
+
+    assert read(path) == "first"
+    assert read(path) == "first"
+    assert read(path, upper=True) == "FIRST"
+    assert n_calls == 2
+    assert read.cache_info()[:4] == (1, 2, None, 2)
+
+    tracked_lru_cache.tracked_cache_clear()
+    assert read(path) == "first"
+    assert n_calls == 2
+
+    path.write_text("second")
+    assert read(path) == "second"
+    assert n_calls == 3
+    assert read.cache_info().currsize == 1
+
+    # a recently modified file is only cached within the current check
+    tracked_lru_cache.tracked_cache_clear()
+    assert read(path) == "second"
+    assert n_calls == 4
+
+    read.cache_clear()
+    assert read.cache_info()[:5] == (0, 0, None, 0, 0)
+
+
+def test_file_cache_covers(tmp_path) -> None:
+    n_calls = 0
+
+    @tracked_file_cache
+    def parse(filepath, parse_dos=True):
+        nonlocal n_calls
+        n_calls += 1
+        return parse_dos
+
+    @parse.covers
+    def _covers(cached_kwargs, kwargs):
+        return cached_kwargs.get("parse_dos", True) or not kwargs.get("parse_dos", True)
+
+    path = tmp_path / "vasprun.xml"
+    path.write_text("")
+    assert parse(path) is True
+    assert parse(path, parse_dos=False) is True
+    assert n_calls == 1
+    assert parse(tmp_path / "missing") is True
+    assert n_calls == 2
+
+
 def test_backup(tmp_path, monkeypatch) -> None:
     monkeypatch.chdir(tmp_path)
     with open("INCAR", "w") as f:
@@ -70,3 +154,241 @@ def test_backup_with_directory(tmp_path) -> None:
     with tarfile.open(tmp_path / "error.1.tar.gz", "r:gz") as tar:
         assert len(tar.getmembers()) == 1
         assert tar.getnames() == ["error.1/INCAR"]
+
+
+def test_file_cache_memory_budget(tmp_path, monkeypatch) -> None:
+    @tracked_file_cache
+    def parse(filepath):
+        # same parsing time for all the files, so that the worth of an entry only depends on its size
+        time.sleep(0.01)
+        return np.zeros(Path(filepath).stat().st_size)
+
+    paths = []
+    for name, size in (("small", 100), ("medium", 1000), ("large", 2000)):
+        paths.append(tmp_path / name)
+        paths[-1].write_bytes(b"x" * size)
+    monkeypatch.setattr(tracked_file_cache, "max_bytes", 2200)
+
+    small, medium, large = (parse(path) for path in paths)
+    info = parse.cache_info()
+    assert info.nbytes <= info.max_bytes
+    # the large entry is the cheapest to keep per byte, so it is evicted first
+    assert info.currsize == 2
+    assert parse(paths[0]) is small
+    assert parse(paths[1]) is medium
+    assert parse(paths[2]) is not large
+
+    monkeypatch.setattr(tracked_file_cache, "max_bytes", 0)
+    tracked_file_cache.evict()
+    assert parse.cache_info().nbytes == 0
+
+
+def test_signature_scanner(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(SignatureScanner, "chunk_size", 7)
+    error_msgs = {"brmix": ["BRIONS problems: POTIM should be increased"], "zbrent": ["ZBRENT: fatal error"]}
+    path = tmp_path / "vasp.out"
+    path.write_text("running on 4 cores\n" + "x" * 100 + "BRIONS problems: POTIM sh")
+    scanner = SignatureScanner.for_file(path, error_msgs)
+    assert scanner.found() == []
+
+    with open(path, "a") as file:
+        file.write("ould be increased\n")
+    assert SignatureScanner.for_file(path, error_msgs) is scanner
+    assert scanner.found() == [("brmix", "BRIONS problems: POTIM should be increased")]
+    assert scanner.update().offset == path.stat().st_size
+
+    # a restarted job overwrites the file with the same header, and it grows past the old offset
+    path.write_text("running on 4 cores\n" + "y" * 200 + "ZBRENT: fatal error\n")
+    assert SignatureScanner.for_file(path, error_msgs).found() == [("zbrent", "ZBRENT: fatal error")]
+
+
+def test_multi_pattern_matcher(tmp_path) -> None:
+    matcher = MultiPatternMatcher(
+        {"mem": [r"use (\d+) MW", r"at least (\d+)\s*MB"], "fail": ["Error termination"]}, regex=True
+    )
+    text = b"please use 256 MW\nand at least 12 MB\nError termination via Lnk1e\n"
+    matches = list(matcher.finditer(text))
+    assert [(m.key, m.groups) for m in matches] == [("mem", (b"256",)), ("mem", (b"12",)), ("fail", ())]
+    assert matches[2].text == b"Error termination"
+    assert matcher.search(text) == {"mem": {r"use (\d+) MW", r"at least (\d+)\s*MB"}, "fail": {"Error termination"}}
+
+    literal = MultiPatternMatcher({"brmix": ["BRMIX: very serious", r"reciprocal lattice (\d+)"], "tet": ["BZINTS"]})
+    path = tmp_path / "out"
+    path.write_bytes(b"BZINTS\nreciprocal lattice (\\d+)\n")
+    assert literal.search_file(str(path)) == {"brmix": {r"reciprocal lattice (\d+)"}, "tet": {"BZINTS"}}
+    path.write_bytes(b"")
+    assert literal.search_file(str(path)) == {}
+
+    # literals overlapping in the text, a prefix of another, or shared by two keys are all found
+    overlapping = MultiPatternMatcher(
+        {"zbrent": ["ZBRENT", "ZBRENT: fatal"], "fatal": ["fatal error", "ZBRENT"], "tet": ["BZINTS"]}
+    )
+    assert overlapping.search(b"... ZBRENT: fatal error\n") == {
+        "zbrent": {"ZBRENT", "ZBRENT: fatal"},
+        "fatal": {"fatal error", "ZBRENT"},
+    }
+
+
+def _echo_process(*lines):
+    code = "import sys; sys.stdout.write(sys.argv[1])"
+    return subprocess.Popen([sys.executable, "-c", code, "\n".join(lines) + "\n"], stdout=subprocess.PIPE)
+
+
+def test_stream_tee(tmp_path) -> None:
+    process = _echo_process("line 1", "BRMIX: very serious problems", "line 3")
+    matcher = SignatureMatcher({"brmix": ["BRMIX: very serious problems"], "tet": ["BZINTS"]})
+    tee = StreamTee(process.stdout, str(tmp_path / "vasp.out"), process=process)
+    tee.matchers.append(matcher)
+    tee.start()
+    process.wait()
+    tee.drain()
+
+    assert matcher.matched == {"brmix": {"BRMIX: very serious problems"}}
+    assert (tmp_path / "vasp.out").read_text() == "line 1\nBRMIX: very serious problems\nline 3\n"
+    assert StreamTee.get(str(tmp_path / "vasp.out")) is None
+
+
+def test_stream_tee_compressed_late_matcher(tmp_path) -> None:
+    process = _echo_process("BZINTS", "done")
+    tee = StreamTee(process.stdout, str(tmp_path / "vasp.out"), compress=True, process=process).start()
+    process.wait()
+    tee.drain()
+
+    # A matcher registered after the output was written still sees all of it.
+    matcher = SignatureMatcher({"tet": ["BZINTS"]})
+    tee.add_matcher(matcher)
+    assert matcher.matched == {"tet": {"BZINTS"}}
+    with gzip.open(tmp_path / "vasp.out.gz", "rt") as file:
+        assert file.read() == "BZINTS\ndone\n"
+
+
+def test_process_tree_monitor(tmp_path) -> None:
+    sleeper = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"], cwd=tmp_path)
+    spinner = subprocess.Popen([sys.executable, "-c", "while True: pass"], cwd=tmp_path)
+    try:
+        time.sleep(0.5)
+        assert {sleeper.pid, spinner.pid} <= {proc.pid for proc in job_processes(tmp_path)}
+
+        monitor = ProcessTreeMonitor(str(tmp_path))
+        assert monitor.update()
+        time.sleep(1)
+        assert monitor.update()
+        # the spinner keeps the job busy, but neither process does any I/O
+        assert monitor.idle_time() == 0
+        assert monitor.stalled_time() > 0.5
+        assert monitor.peak_memory > 0
+        assert len(monitor.memory_history) == 2
+        assert monitor.is_frozen(output_age=10, idle_timeout=100, stall_timeout=0.5)
+        # the output was updated recently, so the job is not frozen
+        assert not monitor.is_frozen(output_age=0.1, idle_timeout=100, stall_timeout=0.5)
+
+        spinner.kill()
+        spinner.wait()
+        assert monitor.update()
+        time.sleep(1)
+        assert monitor.update()
+        assert monitor.idle_time() > 0.5
+        assert monitor.is_frozen(output_age=10, idle_timeout=0.5, stall_timeout=100)
+    finally:
+        for proc in (sleeper, spinner):
+            proc.kill()
+            proc.wait()
+    assert not monitor.update()
+
+
+def test_job_processes_launcher(tmp_path) -> None:
+    code = (
+        "import subprocess, sys, time\n"
+        "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+        "time.sleep(60)"
+    )
+    launcher = subprocess.Popen([sys.executable, "-c", code], cwd=tmp_path)
+    # another process of the user in the job directory
+    other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"], cwd=tmp_path)
+    time.sleep(1)
+    (rank,) = psutil.Process(launcher.pid).children()
+    try:
+        register_job_process(str(tmp_path), launcher.pid)
+        assert {proc.pid for proc in job_processes(tmp_path)} == {launcher.pid, rank.pid}
+
+        # the launcher exited and left its rank behind: the working directory is matched instead
+        launcher.kill()
+        launcher.wait()
+        assert {proc.pid for proc in job_processes(tmp_path)} == {rank.pid, other.pid}
+    finally:
+        register_job_process(str(tmp_path), None)
+        rank.kill()
+        for proc in (launcher, other):
+            proc.kill()
+            proc.wait()
+
+
+def test_process_tree_monitor_shared_memory(tmp_path) -> None:
+    # two processes sharing the pages of a large buffer after a fork
+    code = "import os, time\nbuffer = bytearray(2**26)\nos.fork()\ntime.sleep(60)"
+    parent = subprocess.Popen([sys.executable, "-c", code], cwd=tmp_path)
+    try:
+        time.sleep(1)
+        monitor = ProcessTreeMonitor(str(tmp_path))
+        assert monitor.update()
+        assert len(monitor.samples) == 2
+        rss = sum(psutil.Process(pid).memory_info().rss for pid in monitor.samples)
+        # the shared pages are only counted once
+        assert monitor.peak_memory < 0.75 * rss
+    finally:
+        for proc in psutil.Process(parent.pid).children(recursive=True):
+            proc.kill()
+        parent.kill()
+        parent.wait()
+
+
+def test_process_tree_monitor_launcher(tmp_path) -> None:
+    # a launcher that keeps waking up while its rank spins in a deadlock
+    code = (
+        "import subprocess, sys, time\n"
+        "rank = subprocess.Popen([sys.executable, '-c', 'while True: pass'])\n"
+        "while True: time.sleep(0.01)"
+    )
+    launcher = subprocess.Popen([sys.executable, "-c", code], cwd=tmp_path)
+    try:
+        time.sleep(1)
+        monitor = ProcessTreeMonitor(str(tmp_path))
+        assert monitor.update()
+        assert len(monitor.samples) == 2
+        time.sleep(1)
+        assert monitor.update()
+        assert monitor.idle_time() == 0
+        # the voluntary context switches of the launcher do not count
+        assert monitor.stalled_time() > 0.5
+    finally:
+        for proc in psutil.Process(launcher.pid).children(recursive=True):
+            proc.kill()
+        launcher.kill()
+        launcher.wait()
+
+
+def test_memory_limit(tmp_path) -> None:
+    total = psutil.virtual_memory().total
+    assert 0 < memory_limit() <= total
+
+    # limits at the root of fake cgroup v2 and v1 hierarchies
+    (tmp_path / "memory.max").write_text("max\n")
+    assert memory_limit(str(tmp_path)) == total
+    (tmp_path / "memory.max").write_text("12345\n")
+    (tmp_path / "memory").mkdir()
+    (tmp_path / "memory" / "memory.limit_in_bytes").write_text("23456\n")
+    assert memory_limit(str(tmp_path)) in {12345, 23456}
+
+
+def test_mpi_ranks() -> None:
+    assert get_mpi_ranks(["vasp_std"]) is None
+    assert get_mpi_ranks(["mpirun", "-np", "16", "vasp_std"]) == 16
+    assert get_mpi_ranks(["srun", "--ntasks=64", "vasp_std"]) == 64
+    assert set_mpi_ranks(["srun", "--ntasks=64", "vasp_std"], 32) == ["srun", "--ntasks=32", "vasp_std"]
+    # hosts with their slots that are no longer needed are dropped
+    cmd = ["mpirun", "-n", "16", "--host", "node1:8,node2:8", "vasp_std"]
+    assert set_mpi_ranks(cmd, 8) == ["mpirun", "-n", "8", "--host", "node1:8", "vasp_std"]
+    assert set_mpi_ranks(cmd, 12) == ["mpirun", "-n", "12", "--host", "node1:8,node2:8", "vasp_std"]
+    assert set_mpi_ranks(["mpirun", "-n", "16", "-H", "node1,node2", "vasp"], 8)[-2] == "node1,node2"
+    with pytest.raises(ValueError, match="No number of MPI ranks"):
+        set_mpi_ranks(["vasp_std"], 8)
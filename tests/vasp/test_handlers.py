@@ -1,38 +1,51 @@
 """Created on Jun 1, 2012."""
 
 import datetime
+import json
 import os
 import shutil
+import subprocess
+import sys
 import tarfile
+import time
 from glob import glob
 from pathlib import Path
 
+import numpy as np
+import psutil
 import pytest
 from monty.io import zopen
 from monty.os.path import zpath
 from pymatgen.io.vasp.inputs import Incar, Kpoints, Structure, VaspInput
 from pymatgen.util.testing import MatSciTest
 
-from custodian.utils import tracked_lru_cache
+from custodian.utils import StreamTee, tracked_lru_cache
 from custodian.vasp.handlers import (
     AliasingErrorHandler,
     DriftErrorHandler,
     FrozenJobErrorHandler,
     IncorrectSmearingHandler,
+    IonicStagnationHandler,
     KspacingMetalHandler,
     LargeSigmaHandler,
     LrfCommutatorHandler,
+    MemoryPressureHandler,
     MeshSymmetryErrorHandler,
+    NEBImageHandler,
     NonConvergingErrorHandler,
     PositiveEnergyErrorHandler,
     PotimErrorHandler,
     ScanMetalHandler,
+    SCFConvergencePredictorHandler,
     StdErrHandler,
     UnconvergedErrorHandler,
     VaspErrorHandler,
     WalltimeHandler,
+    preflight_corrections,
 )
 from custodian.vasp.interpreter import VaspModder
+from custodian.vasp.io import NEBImageTransaction, VaspInputTransaction
+from custodian.vasp.utils import system_features
 from tests.conftest import TEST_FILES
 
 __author__ = "Shyue Ping Ong, Stephen Dacek, Janosh Riebesell"
@@ -78,6 +91,74 @@ class VaspErrorHandlerTest(MatSciTest):
         assert dct["errors"] == ["Frozen job"]
         assert Incar.from_file("INCAR")["ALGO"] == "Normal"
 
+    def test_frozen_job_idle_processes(self) -> None:
+        Path("vasp.out").touch()
+        os.utime("vasp.out", (time.time() - 100, time.time() - 100))
+        handler = FrozenJobErrorHandler(idle_timeout=0.5)
+        assert not handler.check()
+
+        sleeper = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+        try:
+            time.sleep(0.5)
+            assert not handler.check()
+            time.sleep(1)
+            # all the processes of the job are idle and vasp.out is not updated
+            assert handler.check()
+            assert not FrozenJobErrorHandler(idle_timeout=None).check()
+        finally:
+            sleeper.kill()
+            sleeper.wait()
+
+    def test_subspace_history(self) -> None:
+        features = system_features(VaspInput.from_directory("."))
+        correction = {"errors": ["subspacematrix"], "actions": [], "rungs": {"subspacematrix": 1}, "features": features}
+        os.mkdir("history")
+        with open("history/custodian.json", mode="w") as file:
+            json.dump([{"corrections": [correction]}] * 5, file)
+
+        handler = VaspErrorHandler("vasp.subspace", history="history/*.json")
+        assert handler.check()
+        # the second rung of the ladder always worked for this system
+        dct = handler.correct()
+        assert dct["rungs"] == {"subspacematrix": 1}
+        assert dct["features"] == features
+        assert dct["actions"] == [{"dict": "INCAR", "action": {"_set": {"PREC": "Accurate"}}}]
+
+        # without history for the other rungs, the ladder is followed from
+        # there, and then from its start
+        assert handler.check()
+        dct = handler.correct()
+        assert dct["rungs"] == {"subspacematrix": 2}
+        assert handler.check()
+        dct = handler.correct()
+        assert dct["rungs"] == {"subspacematrix": 0}
+        assert dct["actions"] == [{"dict": "INCAR", "action": {"_set": {"LREAL": False}}}]
+
+    def test_brmix_history(self) -> None:
+        features = system_features(VaspInput.from_directory("."))
+        correction = {"errors": ["brmix"], "actions": [], "rungs": {"brmix": 4}, "features": features}
+        os.mkdir("history")
+        with open("history/custodian.json", mode="w") as file:
+            json.dump([{"corrections": [correction]}] * 5, file)
+
+        handler = VaspErrorHandler("vasp.brmix", history="history/*.json")
+        assert handler.check()
+        # the brmix rungs depend on one another and are never reordered
+        dct = handler.correct()
+        assert dct["rungs"] == {}
+        assert dct["actions"] == [{"dict": "INCAR", "action": {"_set": {"IMIX": 1}}}]
+
+    def test_check_compressed_stdout(self) -> None:
+        code = "import sys; sys.stdout.write('BRMIX: very serious problems\\n')"
+        process = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE)
+        StreamTee(process.stdout, os.path.abspath("vasp.out"), compress=True, process=process).start()
+        handler = VaspErrorHandler(errors_subset_to_catch=["brmix"])
+        process.wait()
+        assert handler.check()
+        # The tee is done and only vasp.out.gz is left
+        assert StreamTee.get("vasp.out") is None
+        assert handler.check()
+
     def test_algotet(self) -> None:
         shutil.copy("INCAR.algo_tet_only", "INCAR")
         handler = VaspErrorHandler("vasp.algo_tet_only")
@@ -107,6 +188,13 @@ class VaspErrorHandlerTest(MatSciTest):
         assert dct["errors"] == ["subspacematrix"]
         assert dct["actions"] == [{"action": {"_set": {"PREC": "Accurate"}}, "dict": "INCAR"}]
 
+        # 3rd error should run on fewer MPI ranks
+        shutil.copy("OUTCAR_auto_nbands", "OUTCAR")
+        handler.check()
+        dct = handler.correct()
+        assert dct["actions"] == []
+        assert dct["nranks"] == 32
+
     def test_check_correct(self) -> None:
         handler = VaspErrorHandler("vasp.ksymm")
         handler.check()
@@ -661,6 +749,28 @@ class UnconvergedErrorHandlerTest(MatSciTest):
     def setUp(self) -> None:
         copy_tmp_files(self.tmp_path, *glob("unconverged/*", root_dir=TEST_FILES))
 
+    def test_correct_electronic_history(self) -> None:
+        shutil.copy("vasprun.xml.electronic_veryfast", "vasprun.xml")
+        features = system_features(VaspInput.from_directory("."))
+        correction = {
+            "errors": ["Unconverged"],
+            "actions": [],
+            "rungs": {"Unconverged": "mixing"},
+            "features": features,
+        }
+        with open("custodian.json", mode="w") as file:
+            json.dump([{"corrections": [correction]}] * 5, file)
+
+        handler = UnconvergedErrorHandler(history="custodian.json")
+        assert handler.check()
+        dct = handler.correct()
+        assert dct["rungs"] == {"Unconverged": "mixing"}
+        assert dct["actions"][0]["action"]["_set"]["BMIX"] == 0.001
+        shutil.copy("vasprun.xml.electronic_veryfast", "vasprun.xml")
+        dct = handler.correct()
+        assert dct["rungs"] == {"Unconverged": "fast"}
+        assert dct["actions"] == [{"action": {"_set": {"ALGO": "Fast"}}, "dict": "INCAR"}]
+
     def test_check_correct_electronic(self) -> None:
         shutil.copy("vasprun.xml.electronic", "vasprun.xml")
         handler = UnconvergedErrorHandler()
@@ -908,10 +1018,8 @@ class ZpotrfErrorHandlerTest(MatSciTest):
         dct = handler.correct()
         assert dct["errors"] == ["zpotrf"]
         s2 = Structure.from_file("POSCAR")
-        # NOTE (@janosh on 2023-09-10) next code line used to be:
-        # assert s2.volume == pytest.approx(s1.volume * 1.2**3)
-        # unclear why s2.volume changed
-        assert s2.volume == pytest.approx(s1.volume)
+        # the comment line of OSZICAR.empty is not an ionic step, so the volume is increased
+        assert s2.volume == pytest.approx(s1.volume * 1.2**3)
         assert s1.volume == pytest.approx(64.346221)
 
     def test_potim_correction(self) -> None:
@@ -1016,6 +1124,26 @@ class WalltimeHandlerTest(MatSciTest):
             assert content == "LABORT = .TRUE."
         os.remove("STOPCAR")
 
+    def test_predicted_step_time(self) -> None:
+        # the first ionic step takes 10.9 s and the others 1.9-4.9 s, so the
+        # previous rule kept 3 x 10.9 s in reserve where ~5 s are enough
+        handler = WalltimeHandler(wall_time=3600, buffer_time=10)
+        handler.start_time = datetime.datetime.now() - datetime.timedelta(seconds=3580)
+        assert not handler.check()
+        handler.start_time -= datetime.timedelta(seconds=10)
+        assert handler.check()
+        dct = handler.correct()
+        assert dct["reclaimed_time"] == pytest.approx(10, abs=1)
+        os.remove("STOPCAR")
+
+        # with a long buffer, the predicted step is kept on top of it, which
+        # stops earlier than the previous rule and is reported as negative
+        handler = WalltimeHandler(wall_time=3600, buffer_time=100)
+        handler.start_time = datetime.datetime.now() - datetime.timedelta(seconds=3498)
+        assert handler.check()
+        assert handler.correct()["reclaimed_time"] == pytest.approx(-2, abs=1)
+        os.remove("STOPCAR")
+
     def test_check_with_malformed_outcar(self, tmp_path: Path) -> None:
         """Test that WalltimeHandler.check() returns False on malformed OUTCAR.
 
@@ -1059,6 +1187,52 @@ class PositiveEnergyHandlerTest(MatSciTest):
         assert incar["ALGO"] == "Normal"
 
 
+class NEBImageHandlerTest(MatSciTest):
+    def setUp(self) -> None:
+        copy_tmp_files(self.tmp_path, *glob("setup_neb/*", root_dir=TEST_FILES))
+        shutil.copy(f"{TEST_FILES}/OSZICAR", "01/OSZICAR")
+        for image in ("02", "03"):
+            shutil.copy(f"{TEST_FILES}/positive_energy/OSZICAR", f"{image}/OSZICAR")
+
+    def test_check_correct(self) -> None:
+        handler = NEBImageHandler(PositiveEnergyErrorHandler())
+        assert handler.is_monitor
+        assert handler.check()
+        assert handler.failed_images == ["02", "03"]
+        dct = handler.correct()
+        assert dct["errors"] == ["Positive energy (image 02)", "Positive energy (image 03)"]
+        # Both images get the same correction, instead of escalating to POTIM
+        assert dct["actions"] == [{"dict": "INCAR", "action": {"_set": {"ALGO": "Normal"}}}]
+        assert list(dct["images"]) == ["02", "03"]
+        # The INCAR is shared by all the images
+        assert Incar.from_file("INCAR")["ALGO"] == "Normal"
+        assert not os.path.isfile("02/INCAR")
+        assert os.path.isfile("02/error.1.tar.gz")
+
+        handler = NEBImageHandler.from_dict(handler.as_dict())
+        assert isinstance(handler.handler, PositiveEnergyErrorHandler)
+        for image in ("02", "03"):
+            shutil.copy(f"{TEST_FILES}/OSZICAR", f"{image}/OSZICAR")
+        assert not handler.check()
+
+    def test_check_concurrent(self) -> None:
+        handler = NEBImageHandler(SlowPositiveEnergyErrorHandler())
+        start = time.perf_counter()
+        assert handler.check()
+        # the three images are checked at the same time
+        assert time.perf_counter() - start < 1.2
+        assert handler.failed_images == ["02", "03"]
+
+
+class SlowPositiveEnergyErrorHandler(PositiveEnergyErrorHandler):
+    """PositiveEnergyErrorHandler taking 0.5 s to check, from the inputs of the NEB image."""
+
+    def check(self, directory="./") -> bool:
+        time.sleep(0.5)
+        assert isinstance(VaspInputTransaction.for_directory(directory), NEBImageTransaction)
+        return super().check(directory)
+
+
 class PotimHandlerTest(MatSciTest):
     def setUp(self) -> None:
         copy_tmp_files(self.tmp_path, "potim/INCAR", "potim/POSCAR", "potim/OSZICAR")
@@ -1081,6 +1255,56 @@ class PotimHandlerTest(MatSciTest):
         assert incar["IBRION"] == 3
 
 
+class PreflightCorrectionsTest(MatSciTest):
+    def setUp(self) -> None:
+        copy_tmp_files(self.tmp_path, "INCAR", "KPOINTS", "POSCAR")
+
+    def test_preflight_corrections(self) -> None:
+        assert preflight_corrections() == []
+
+        shutil.copy(f"{TEST_FILES}/INCAR.algo_tet_only", "INCAR")
+        assert preflight_corrections() == [
+            {"errors": ["algo_tet"], "actions": [{"dict": "INCAR", "action": {"_set": {"ALGO": "Fast"}}}]}
+        ]
+        # too few k-points for the tetrahedron method
+        Kpoints.gamma_automatic((1, 1, 2)).write_file("KPOINTS")
+        assert preflight_corrections() == [
+            {"errors": ["tet"], "actions": [{"dict": "INCAR", "action": {"_set": {"ISMEAR": 0, "SIGMA": 0.05}}}]}
+        ]
+        # VASP uses KSPACING = 0.5 without KPOINTS, i.e. a 3x2x2 mesh here
+        os.remove("KPOINTS")
+        assert [corr["errors"] for corr in preflight_corrections()] == [["algo_tet"]]
+
+        incar = Incar.from_file("INCAR")
+        incar.update(ALGO="Fast", IBRION=8, NCORE=4, LELF=True, KPAR=2)
+        incar.write_file("INCAR")
+        structure = Structure.from_file("POSCAR")
+        structure.scale_lattice(structure.volume * 1500)
+        structure.to(filename="POSCAR")
+        Kpoints.gamma_automatic((4, 4, 4)).write_file("KPOINTS")
+        assert preflight_corrections() == [
+            {"errors": ["amin"], "actions": [{"dict": "INCAR", "action": {"_set": {"AMIN": 0.01}}}]},
+            {
+                "errors": ["dfpt_ncore"],
+                "actions": [
+                    {"dict": "INCAR", "action": {"_unset": {"NCORE": 0}}},
+                    {"dict": "INCAR", "action": {"_unset": {"NPAR": 0}}},
+                ],
+            },
+            {"errors": ["elf_kpar"], "actions": [{"dict": "INCAR", "action": {"_set": {"KPAR": 1}}}]},
+        ]
+
+        incar.pop("IBRION")
+        incar.write_file("INCAR")
+        Structure.from_spacegroup(
+            "Fm-3m", [[5.6, 0, 0], [0, 5.6, 0], [0, 0, 5.6]], ["Na", "Cl"], [[0, 0, 0], [0.5, 0.5, 0.5]]
+        ).get_primitive_structure().to(filename="POSCAR")
+        assert preflight_corrections()[0] == {
+            "errors": ["zpotrf"],
+            "actions": [{"dict": "INCAR", "action": {"_set": {"NCORE": 1}}}],
+        }
+
+
 class LrfCommHandlerTest(MatSciTest):
     def setUp(self) -> None:
         copy_tmp_files(self.tmp_path, "lrf_comm/INCAR", "lrf_comm/OUTCAR", "lrf_comm/std_err.txt")
@@ -1126,6 +1350,77 @@ class OutOfMemoryHandlerTest(MatSciTest):
         assert dct["actions"] == [{"dict": "INCAR", "action": {"_set": {"KPAR": 2}}}]
 
 
+class MemoryPressureHandlerTest(MatSciTest):
+    def setUp(self) -> None:
+        copy_tmp_files(self.tmp_path, "INCAR")
+
+    def test_check(self) -> None:
+        handler = MemoryPressureHandler(max_memory=10**15, horizon=1e9)
+        assert not handler.check()
+
+        sleeper = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+        try:
+            for _ in range(4):
+                time.sleep(0.2)
+                assert not handler.check()
+            # the memory of the job exceeds 90% of its memory limit
+            assert MemoryPressureHandler(max_memory=10**6).check()
+            dct = handler.correct()
+            assert dct["errors"] == ["Memory pressure"]
+            assert dct["peak_memory"] > 0
+        finally:
+            sleeper.kill()
+            sleeper.wait()
+
+        with open("memory_usage.json") as file:
+            attempts = json.load(file)
+        assert attempts[0]["memory_limit"] == 10**15
+        assert attempts[0]["peak_memory"] == dct["peak_memory"]
+        assert attempts[0]["terminated"]
+
+        code = "import time\nchunks = []\nwhile True:\n    chunks.append(bytearray(2**23))\n    time.sleep(0.1)"
+        leaker = subprocess.Popen([sys.executable, "-c", code])
+        try:
+            time.sleep(0.2)
+            results = []
+            for _ in range(4):
+                time.sleep(0.3)
+                results.append(handler.check())
+            # the memory of the job keeps growing towards the limit
+            assert results[-1]
+        finally:
+            leaker.kill()
+            leaker.wait()
+        with open("memory_usage.json") as file:
+            assert len(json.load(file)) == 2
+
+    def test_correct(self) -> None:
+        vi = VaspInput.from_directory(".")
+        VaspModder(vi=vi).apply_actions([{"dict": "INCAR", "action": {"_set": {"KPAR": 4, "NPAR": 2}}}])
+        handler = MemoryPressureHandler()
+        dct = handler.correct()
+        assert dct["actions"] == [{"dict": "INCAR", "action": {"_set": {"KPAR": 2}}}]
+        handler.correct()
+        dct = handler.correct()
+        assert dct["actions"] == [{"dict": "INCAR", "action": {"_set": {"NPAR": 1}}}]
+        # NCORE cannot be raised when NPAR is set and LREAL is already Auto
+        assert handler.correct()["actions"] is None
+        shutil.copy(f"{TEST_FILES}/OUTCAR_auto_nbands", "OUTCAR")
+        dct = handler.correct()
+        assert dct["actions"] == []
+        assert dct["nranks"] == 32
+
+        incar = Incar.from_file("INCAR")
+        incar.pop("NPAR")
+        incar["LREAL"] = False
+        incar.write_file("INCAR")
+        dct = handler.correct()
+        n_cores = psutil.cpu_count(logical=False) or os.cpu_count()
+        expected = {"NCORE": 2} if n_cores >= 2 else {"LREAL": "Auto"}
+        assert dct["actions"] == [{"dict": "INCAR", "action": {"_set": expected}}]
+        assert dct["peak_memory"] is None
+
+
 class DriftErrorHandlerTest(MatSciTest):
     def setUp(self) -> None:
         copy_tmp_files(self.tmp_path, "INCAR", "drift/OUTCAR", "drift/CONTCAR")
@@ -1226,3 +1521,177 @@ class NonConvergingErrorHandlerTest(MatSciTest):
         h2 = NonConvergingErrorHandler.from_dict(handler.as_dict())
         assert isinstance(h2, NonConvergingErrorHandler)
         assert h2.output_filename == "OSZICAR_random"
+
+
+class SCFConvergencePredictorHandlerTest(MatSciTest):
+    def setUp(self) -> None:
+        copy_tmp_files(self.tmp_path, *glob("nonconv/*", root_dir=TEST_FILES))
+        incar = Incar.from_file("INCAR")
+        incar["NELM"] = 60
+        incar.write_file("INCAR")
+
+    @staticmethod
+    def write_oszicar(*electronic_dE) -> None:
+        with open("OSZICAR", mode="w") as file:
+            file.write("       N       E                     dE             d eps       ncg     rms          rms(c)\n")
+            for ionic_step, dEs in enumerate(electronic_dE, start=1):
+                for step, dE in enumerate(dEs, start=1):
+                    file.write(f"DAV: {step:3d}    -0.100000000000E+02   {dE:.5E}   -0.10000E-01  8192   0.100E+00\n")
+                if ionic_step < len(electronic_dE):
+                    file.write(f"{ionic_step:4d} F= -.10000000E+02 E0= -.10000000E+02  d E =-.100000E+02\n")
+
+    def test_check_correct(self) -> None:
+        handler = SCFConvergencePredictorHandler()
+        converging = [10 ** (-0.4 * step) for step in range(1, 15)]
+        self.write_oszicar(converging)
+        assert not handler.check()
+
+        stagnant = [(-1) ** step * 10 ** (-2 - 0.005 * step + 0.05 * (step % 3)) for step in range(1, 21)]
+        self.write_oszicar(converging, stagnant)
+        assert handler.check()
+        dct = handler.correct()
+        assert dct["errors"] == ["Predicted SCF non-convergence"]
+        assert Incar.from_file("INCAR")["ALGO"].lower() == "normal"
+
+        with open("scf_predictions.jsonl") as file:
+            records = [json.loads(line) for line in file]
+        assert [record.get("terminated") for record in records] == [None, True]
+        assert [record["ionic_step"] for record in records] == [1, 2]
+        assert records[0]["n_steps"] == 14
+        assert records[0]["converged"]
+        assert records[1]["predictions"][-1][0] == 20
+
+    def test_outcome_logged(self) -> None:
+        handler = SCFConvergencePredictorHandler(log_filename="predictions.jsonl")
+        steps = [10 ** (-0.3 * step) for step in range(1, 16)]
+        self.write_oszicar(steps)
+        assert not handler.check()
+        assert not os.path.isfile("predictions.jsonl")
+
+        self.write_oszicar([*steps, 1e-7], [1.0])
+        assert not handler.check()
+        with open("predictions.jsonl") as file:
+            (record,) = (json.loads(line) for line in file)
+        assert record["ionic_step"] == 1
+        assert record["n_steps"] == 16
+        assert record["converged"]
+        assert len(record["predictions"]) == 1
+
+    def test_completed_ionic_step(self) -> None:
+        handler = SCFConvergencePredictorHandler()
+        stagnant = [(-1) ** step * 10 ** (-2 - 0.005 * step + 0.05 * (step % 3)) for step in range(1, 21)]
+        # the ionic step is completed: its electronic steps are not predicted on
+        self.write_oszicar(stagnant, [])
+        assert not handler.check()
+        assert not os.path.isfile("scf_predictions.jsonl")
+
+    def test_nelmdl_from_wavecar(self) -> None:
+        incar = Incar.from_file("INCAR")
+        incar.pop("NELMDL")
+        incar.write_file("INCAR")
+        handler = SCFConvergencePredictorHandler(min_steps=4)
+        # 8 steps converging slowly after a first badly converged one
+        steps = [1.0] + [10 ** (-0.2 * step) for step in range(1, 8)]
+        self.write_oszicar(steps)
+        # without a WAVECAR, the first 5 steps are non-selfconsistent and too few are left
+        assert not handler.check()
+        with open("WAVECAR", mode="wb") as file:
+            file.write(b"\0" * 8)
+        assert not handler.check()
+        assert handler._predictions[-1][0] == 8
+
+    def test_correct_twice(self) -> None:
+        handler = SCFConvergencePredictorHandler()
+        delegate = handler._non_converging
+        assert handler.correct()["actions"] == [{"dict": "INCAR", "action": {"_set": {"ALGO": "Normal"}}}]
+        # the same delegate continues the ladder from the corrected inputs
+        assert handler.correct()["actions"][0]["action"]["_set"]["AMIX"] == 0.1
+        assert handler._non_converging is delegate
+
+    def test_as_from_dict(self) -> None:
+        handler = SCFConvergencePredictorHandler(confidence=0.9, window=10)
+        h2 = SCFConvergencePredictorHandler.from_dict(handler.as_dict())
+        assert h2.confidence == 0.9
+        assert h2.window == 10
+
+
+class IonicStagnationHandlerTest(MatSciTest):
+    def setUp(self) -> None:
+        copy_tmp_files(self.tmp_path, *glob("drift/*", root_dir=TEST_FILES))
+        incar = Incar.from_file("INCAR")
+        incar["EDIFFG"] = -0.02
+        incar.write_file("INCAR")
+
+    @staticmethod
+    def write_outputs(energies, max_forces, step_size, finished=False) -> None:
+        """Write an OSZICAR and OUTCAR for two atoms moving by step_size per ionic step."""
+        with open("OSZICAR", mode="w") as file:
+            for step, energy in enumerate(energies, start=1):
+                file.write(f"DAV:   1    {energy:.8E}   -0.10000E-05   -0.10000E-05  8192   0.100E-03\n")
+                file.write(f"{step:4d} F= {energy:.8E} E0= {energy:.8E}  d E =-.100000E-02\n")
+        with open("OUTCAR", mode="w") as file:
+            file.write("      direct lattice vectors                 reciprocal lattice vectors\n")
+            for row in np.eye(3) * 10:
+                file.write(" ".join(f"{value:14.9f}" for value in (*row, *row / 100)) + "\n")
+            for step, force in enumerate(max_forces):
+                file.write(" POSITION                                       TOTAL-FORCE (eV/Angst)\n")
+                file.write(" " + "-" * 83 + "\n")
+                for x in (0.1, 5.0):
+                    # the first atom crosses the periodic boundary, which is not a large step
+                    position = (x - step * step_size) % 10
+                    file.write(f"{position:13.5f} {0:12.5f} {0:12.5f} {force:16.6f} {0:13.6f} {0:13.6f}\n")
+                file.write(" " + "-" * 83 + "\n")
+            if finished:
+                file.write(" General timing and accounting informations for this job:\n")
+
+    def test_converging(self) -> None:
+        handler = IonicStagnationHandler()
+        self.write_outputs(-10 - 0.01 * np.arange(15), 10 ** (-0.15 * np.arange(15)), 0.05)
+        assert not handler.check()
+
+    def test_oscillating(self) -> None:
+        handler = IonicStagnationHandler()
+        self.write_outputs(-10 + 0.05 * (-1) ** np.arange(15), np.full(15, 0.5), 0.05)
+        assert handler.check()
+        assert handler.diagnosis == "oscillating"
+        dct = handler.correct()
+        assert dct["errors"] == ["Ionic relaxation oscillating"]
+        assert Incar.from_file("INCAR")["POTIM"] == 0.25
+        assert os.path.isfile("STOPCAR")
+
+        # VASP is left to finish its ionic step, then restarts from CONTCAR
+        assert not handler.check()
+        self.write_outputs(-10 + 0.05 * (-1) ** np.arange(16), np.full(16, 0.5), 0.05, finished=True)
+        os.remove("POSCAR")
+        assert handler.check()
+        dct = handler.correct()
+        assert dct["actions"][0]["file"] == "CONTCAR"
+        assert os.path.isfile("POSCAR")
+        assert not os.path.isfile("STOPCAR")
+
+    def test_stagnating(self) -> None:
+        handler = IonicStagnationHandler()
+        # the atoms barely move
+        self.write_outputs(-10 - 1e-4 * np.arange(15), np.full(15, 0.3), 1e-4)
+        assert handler.check()
+        assert handler.diagnosis == "stagnating"
+        handler.correct()
+        assert Incar.from_file("INCAR")["IBRION"] == 1
+
+        # the forces decrease too slowly to reach EDIFFG within NSW
+        handler = IonicStagnationHandler()
+        self.write_outputs(-10 - 0.01 * np.arange(15), 0.5 * 10 ** (-0.002 * np.arange(15)), 0.05)
+        assert handler.check()
+        assert handler.diagnosis == "stagnating"
+
+    def test_diverging(self) -> None:
+        handler = IonicStagnationHandler()
+        self.write_outputs(-10 + 0.01 * np.arange(15) ** 2, 0.05 * 1.5 ** np.arange(15), 0.05)
+        assert handler.check()
+        assert handler.diagnosis == "diverging"
+        handler.correct()
+        assert Incar.from_file("INCAR")["POTIM"] == 0.25
+
+        handler = IonicStagnationHandler(min_potim=0.5)
+        assert handler.check()
+        assert handler.correct()["actions"] is None
@@ -1,8 +1,35 @@
+import os
+import shutil
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree.ElementTree import ParseError
+
+import numpy as np
 import pytest
 from monty.os.path import zpath
+from pymatgen.io.vasp.inputs import Incar, Kpoints, Poscar
+from pymatgen.io.vasp.outputs import Oszicar, Outcar
 
-from custodian.utils import tracked_lru_cache
-from custodian.vasp.io import load_outcar, load_vasprun
+from custodian.custodian import Custodian, ErrorHandler
+from custodian.utils import InputTransaction, backup, tracked_lru_cache
+from custodian.vasp import io as vasp_io
+from custodian.vasp.interpreter import VaspModder
+from custodian.vasp.io import (
+    IncrementalOszicar,
+    IncrementalOutcar,
+    VasprunSummary,
+    check_vasprun_xml,
+    iter_vasprun_without,
+    load_outcar,
+    load_vasp_input,
+    load_vasp_summary,
+    load_vasprun,
+    load_vasprun_summary,
+    read_incar,
+    read_kpoints_header,
+    read_poscar_header,
+    write_vasp_summary,
+)
 from tests.conftest import TEST_FILES
 
 
@@ -12,6 +39,25 @@ def _clear_tracked_cache() -> None:
     tracked_lru_cache.tracked_cache_clear()
 
 
+class SetIncarTagHandler(ErrorHandler):
+    """Sets an INCAR tag, once the tag required is set."""
+
+    def __init__(self, tag: str, value, required: str | None = None) -> None:
+        self.tag = tag
+        self.value = value
+        self.required = required
+
+    def check(self, directory="./") -> bool:
+        incar = read_incar(os.path.join(directory, "INCAR"))
+        return incar.get(self.tag) != self.value and (self.required is None or self.required in incar)
+
+    def correct(self, directory="./") -> dict:
+        backup(["INCAR"], directory=directory)
+        actions = [{"dict": "INCAR", "action": {"_set": {self.tag: self.value}}}]
+        VaspModder(vi=load_vasp_input(directory), directory=directory).apply_actions(actions)
+        return {"errors": [self.tag], "actions": actions}
+
+
 class TestIO:
     def test_load_outcar(self) -> None:
         outcar_file = zpath(f"{TEST_FILES}/io/OUTCAR")
@@ -32,3 +78,347 @@ class TestIO:
         assert vr is vr2
 
         assert len(tracked_lru_cache.cached_functions) == 1
+
+    def test_load_vasprun_covers_lighter_parses(self) -> None:
+        vasprun_file = zpath(f"{TEST_FILES}/io/vasprun.xml")
+        vr = load_vasprun(vasprun_file, parse_potcar_file=False)
+        assert load_vasprun(vasprun_file, parse_dos=False, parse_eigen=False, parse_potcar_file=False) is vr
+        assert load_vasprun(vasprun_file, parse_projected_eigen=True, parse_potcar_file=False) is not vr
+        assert load_vasprun(vasprun_file, parse_potcar_file=False, exception_on_bad_xml=False) is not vr
+
+    def test_load_vasprun_summary(self, monkeypatch) -> None:
+        vasprun_file = zpath(f"{TEST_FILES}/io/vasprun.xml")
+        summary = load_vasprun_summary(vasprun_file)
+        assert isinstance(summary, VasprunSummary)
+        assert summary.converged
+        assert summary.incar["ISMEAR"] == 0
+        assert summary == VasprunSummary.from_file(vasprun_file)
+        assert load_vasprun_summary(vasprun_file) is summary
+
+        # parse errors of the child process are raised in the caller
+        with pytest.raises(ParseError):
+            load_vasprun_summary(f"{TEST_FILES}/bad_vasprun/vasprun.xml")
+
+        monkeypatch.setattr(vasp_io, "PARSE_OUT_OF_PROCESS", False)
+        with pytest.raises(ParseError):
+            load_vasprun_summary(f"{TEST_FILES}/bad_vasprun/vasprun.xml")
+
+    def test_load_vasprun_summary_worker(self, monkeypatch) -> None:
+        load_vasprun_summary.cache_clear()
+        monkeypatch.setattr(vasp_io._SummaryWorker, "current", None)
+        load_vasprun_summary(f"{TEST_FILES}/vasprun.xml.indirect", fields=("incar",))
+        worker = vasp_io._SummaryWorker.current
+        # the same child process serves the next parse
+        load_vasprun_summary(f"{TEST_FILES}/vasprun.xml.indirect", fields=("converged_ionic",))
+        assert vasp_io._SummaryWorker.current is worker
+        assert worker.n_tasks == 2
+
+        # a dead worker is replaced
+        worker.process.kill()
+        worker.process.wait()
+        assert load_vasprun_summary(zpath(f"{TEST_FILES}/io/vasprun.xml")).converged
+        assert vasp_io._SummaryWorker.current is not worker
+
+        # and a worker is retired after PARSE_WORKER_MAX_TASKS parses
+        monkeypatch.setattr(vasp_io, "PARSE_WORKER_MAX_TASKS", 1)
+        load_vasprun_summary(f"{TEST_FILES}/vasprun.xml.indirect")
+        assert vasp_io._SummaryWorker.current is None
+        load_vasprun_summary.cache_clear()
+
+    def test_load_vasprun_summary_fields(self) -> None:
+        vasprun_file = f"{TEST_FILES}/vasprun.xml.indirect"
+        summary = load_vasprun_summary(vasprun_file, fields=("incar", "eigenvalue_band_properties"))
+        assert summary.converged_electronic is None
+        assert summary.eigenvalue_band_properties == VasprunSummary.from_file(vasprun_file).eigenvalue_band_properties
+        assert load_vasprun_summary(vasprun_file, fields=("incar",)) is summary
+        assert load_vasprun_summary(vasprun_file, fields=("converged_ionic",)) is not summary
+
+    def test_iter_vasprun_without(self) -> None:
+        vasprun_file = f"{TEST_FILES}/vasprun.xml.indirect"
+        reduced = b"".join(iter_vasprun_without(vasprun_file, ("eigenvalues", "dos")))
+        assert b"<dos>" not in reduced
+        assert b"<eigenvalues>" not in reduced
+        assert b"</calculation>" in reduced
+        # blocks straddling two chunks are cut all the same
+        assert b"".join(iter_vasprun_without(vasprun_file, ("eigenvalues", "dos"), chunk_size=5)) == reduced
+
+    def test_check_vasprun_xml(self, tmp_path) -> None:
+        vasprun_file = f"{TEST_FILES}/unconverged/vasprun.xml.ionic"
+        assert check_vasprun_xml(vasprun_file) == 2
+        assert check_vasprun_xml(zpath(f"{TEST_FILES}/io/vasprun.xml")) == 3
+        with pytest.raises(ParseError):
+            check_vasprun_xml(f"{TEST_FILES}/bad_vasprun/vasprun.xml")
+
+        with open(vasprun_file) as file:
+            content = file.read()
+        path = tmp_path / "vasprun.xml"
+        # killed right after an ionic step, with the document closed by hand
+        path.write_text(content[: content.rindex("</calculation>") + 14] + "\n</modeling>\n")
+        with pytest.raises(ValueError, match="final calculation block"):
+            check_vasprun_xml(str(path))
+        path.write_text(content.replace("modeling>", "calculation>"))
+        with pytest.raises(ValueError, match="instead of <modeling>"):
+            check_vasprun_xml(str(path))
+
+
+class TestInputHeaders:
+    def test_read_incar(self, tmp_path) -> None:
+        incar_file = f"{TEST_FILES}/large_sigma/INCAR"
+        incar = read_incar(incar_file)
+        assert incar.to_incar() == Incar.from_file(incar_file)
+        assert incar.get("ismear") == Incar.from_file(incar_file)["ISMEAR"]
+        assert read_incar(incar_file) is incar
+
+        path = tmp_path / "INCAR"
+        path.write_text("ALGO = Fast; nelect = 10 # charged\nLSORBIT = .TRUE.\nMAGMOM = 0 0 1 0 0 -1\n")
+        incar = read_incar(str(path))
+        assert "NELECT" in incar
+        assert "nelect" in incar
+        assert incar["NELECT"] == 10.0
+        assert incar["MAGMOM"] == [[0, 0, 1], [0, 0, -1]]
+        assert incar.get("ISMEAR", 1) == 1
+
+    def test_read_kpoints_header(self, tmp_path) -> None:
+        path = tmp_path / "KPOINTS"
+        path.write_text("Fully automatic\n0\nAuto\n 20\n")
+        assert read_kpoints_header(str(path)).style == Kpoints.supported_modes.Automatic
+        path.write_text("Automatic mesh\n0\nGamma\n4 4 4\n")
+        assert read_kpoints_header(str(path)) == ("Automatic mesh", 0, Kpoints.supported_modes.Gamma)
+
+    def test_read_poscar_header(self, tmp_path) -> None:
+        poscar_file = f"{TEST_FILES}/large_sigma/POSCAR"
+        header = read_poscar_header(poscar_file)
+        structure = Poscar.from_file(poscar_file).structure
+        assert header.n_atoms == len(structure)
+        assert header.lattice == pytest.approx(structure.lattice.matrix)
+
+        # VASP 6 symbols, wrapped species and counts lines, negative scale (volume)
+        path = tmp_path / "POSCAR"
+        path.write_text("comment\n-1.0\n2 0 0\n0 2 0\n0 0 2\nFe_pv/f474ac0d Cr\nNi\n1 2\n3\nDirect\n")
+        header = read_poscar_header(str(path))
+        assert header.species == ["Fe", "Cr", "Ni"]
+        assert header.natoms == [1, 2, 3]
+        assert header.lattice == pytest.approx(np.eye(3))
+
+
+class TestVaspSummary:
+    def test_write_load(self, tmp_path) -> None:
+        for file in ("vasprun.xml", "OUTCAR"):
+            shutil.copy(f"{TEST_FILES}/postprocess/{file}", tmp_path)
+        summary = write_vasp_summary(tmp_path)
+        vasprun = load_vasprun(str(tmp_path / "vasprun.xml"))
+        outcar = Outcar(str(tmp_path / "OUTCAR"))
+        assert summary["final_energy"] == pytest.approx(vasprun.final_energy)
+        assert summary["n_ionic_steps"] == len(vasprun.ionic_steps)
+        assert summary["magnetization"] == pytest.approx([3.007, 1.397, -0.189, -0.189])
+        assert summary["total_magnetization"] == pytest.approx(outcar.total_mag)
+        assert summary["run_stats"] == outcar.run_stats
+        assert "sha256" not in summary["sources"]["OUTCAR"]
+
+        loaded = load_vasp_summary(tmp_path)
+        assert loaded["final_structure"] == vasprun.final_structure
+        assert loaded["parameters"] == vasprun.parameters
+
+        # without hashes, only the files the summary was written from are recognized
+        copy_dir = tmp_path / "copy"
+        shutil.copytree(tmp_path, copy_dir)
+        assert load_vasp_summary(copy_dir) is None
+
+        # with hashes, a copy of the outputs is still described by the summary, modified outputs are not
+        write_vasp_summary(tmp_path, hash_files=True)
+        shutil.rmtree(copy_dir)
+        shutil.copytree(tmp_path, copy_dir)
+        assert load_vasp_summary(copy_dir) is not None
+        with open(copy_dir / "OUTCAR", "a") as file:
+            file.write("\n")
+        assert load_vasp_summary(copy_dir) is None
+        assert load_vasp_summary(tmp_path / "missing") is None
+
+
+class TestIncrementalOutcar:
+    def test_incremental_read(self, tmp_path) -> None:
+        with open(f"{TEST_FILES}/drift/OUTCAR", "rb") as file:
+            content = file.read()
+        outcar = load_outcar(f"{TEST_FILES}/drift/OUTCAR")
+        path = tmp_path / "OUTCAR"
+
+        # written in three pieces, the first two ending in the middle of a line
+        path.write_bytes(content[: len(content) // 3])
+        reader = IncrementalOutcar.for_file(path)
+        assert reader.offset < len(content) // 3
+        assert not reader.finished
+        with open(path, "ab") as file:
+            file.write(content[len(content) // 3 : 2 * len(content) // 3])
+        assert IncrementalOutcar.for_file(path) is reader
+        with open(path, "ab") as file:
+            file.write(content[2 * len(content) // 3 :])
+        reader = IncrementalOutcar.for_file(path)
+        assert reader.offset == len(content)
+
+        assert reader.drift == outcar.drift
+        assert reader.nbands == 222
+        assert reader.nranks == 24
+        assert reader.nelect == pytest.approx(outcar.nelect)
+        assert reader.completed_ionic_steps == len(reader.ionic_step_timings) == 10
+        outcar.read_pattern({"timings": r"LOOP:.+real time(.+)"}, postprocess=float)
+        assert reader.electronic_step_timings == [t[0] for t in outcar.data["timings"]]
+        assert reader.finished
+        # only the forces and displacements of the last ionic step are kept by default
+        assert reader.n_ionic_steps == 10
+        assert len(reader.forces) == len(reader.displacements) == 1
+        assert IncrementalOutcar.for_file(path, ionic_steps=10) is reader
+        assert reader.n_ionic_steps == 10
+        assert len(reader.forces) == len(reader.displacements) == 10
+        assert reader.forces[0].shape == (84, 3)
+        assert reader.forces[0][0] == pytest.approx([-0.020968, -0.00733, 0.022761])
+        assert not reader.displacements[0].any()
+        assert reader.displacements[1][0] == pytest.approx([0.00003, 0.00061, -0.00057], abs=1e-6)
+
+        # a restarted run truncates the file
+        path.write_bytes(content[: len(content) // 2])
+        reader = IncrementalOutcar.for_file(path)
+        assert reader.offset <= len(content) // 2
+        assert len(reader.drift) < len(outcar.drift)
+
+        path.unlink()
+        assert IncrementalOutcar.for_file(path).nbands is None
+
+
+class TestIncrementalOszicar:
+    def test_incremental_read(self, tmp_path) -> None:
+        with open(f"{TEST_FILES}/OSZICAR", "rb") as file:
+            content = file.read()
+        oszicar = Oszicar(f"{TEST_FILES}/OSZICAR")
+        path = tmp_path / "OSZICAR"
+
+        # cut in the middle of an ionic step line
+        cut = content.index(b"F=", len(content) // 2)
+        path.write_bytes(content[:cut])
+        reader = IncrementalOszicar.for_file(path)
+        # the incomplete line has no energies yet and does not complete the ionic step
+        assert reader.n_ionic_steps == len(Oszicar(path).ionic_steps) - 1
+        with open(path, "ab") as file:
+            file.write(content[cut:])
+        reader = IncrementalOszicar.for_file(path)
+        assert reader.n_ionic_steps == len(oszicar.ionic_steps)
+
+        assert list(reader.electronic_step_counts) == [len(steps) for steps in oszicar.electronic_steps]
+        for key in ("E0", "dE", "F"):
+            assert getattr(reader, key) == pytest.approx([step[key] for step in oszicar.ionic_steps])
+        # the last ionic step is completed
+        assert len(reader.electronic_dE) == len(reader.electronic_ncg) == 0
+
+        # cut before the line completing the last ionic step
+        path.write_bytes(content[: content.rindex(b"\n", 0, content.rindex(b"F=")) + 1])
+        reader = IncrementalOszicar.for_file(path)
+        assert reader.n_ionic_steps == len(oszicar.ionic_steps) - 1
+        assert reader.electronic_dE == pytest.approx([step["dE"] for step in oszicar.electronic_steps[-1]])
+        assert reader.electronic_ncg == pytest.approx([step["ncg"] for step in oszicar.electronic_steps[-1]])
+
+    def test_non_step_lines(self, tmp_path) -> None:
+        path = tmp_path / "OSZICAR"
+        path.write_bytes(
+            b"       N       E                     dE             d eps       ncg     rms          rms(c)\n"
+            b"DAV:   1    -0.100000000000E+02   -0.10000E+02   -0.10000E-01  8192   0.100E+00\n"
+            b"   1 F= -.10000000E+02 E0= -.10000000E+02  d E =-.100000E+02\n"
+            b" bond charge predicted\n"
+            b"DAV:   1    -0.110000000000E+02   -0.10000E+01   -0.10000E-01  8192   0.100E+00\n"
+            b"DAV:   2    -0.110100000000E+02   -0.10000E-01   -0.10000E-02  8192   0.100E-01\n"
+        )
+        reader = IncrementalOszicar.for_file(path)
+        assert reader.n_ionic_steps == 1
+        assert list(reader.electronic_step_counts) == [1, 2]
+        assert reader.electronic_dE == pytest.approx([-1.0, -0.01])
+
+
+class TestVaspInputTransaction:
+    @pytest.fixture(autouse=True)
+    def _setup(self, tmp_path) -> None:
+        for file in ("INCAR", "KPOINTS", "POSCAR", "CONTCAR", "POTCAR"):
+            src = zpath(f"{TEST_FILES}/drift/{file}")
+            shutil.copy(src, tmp_path / src.rsplit("/", 1)[-1])
+        self.directory = str(tmp_path)
+
+    def test_shared_and_deferred(self) -> None:
+        with InputTransaction.deferred_scope():
+            vi = load_vasp_input(self.directory)
+            assert load_vasp_input(self.directory) is vi
+            VaspModder(vi=vi, directory=self.directory).apply_actions(
+                [{"dict": "INCAR", "action": {"_set": {"ALGO": "All"}}}]
+            )
+            VaspModder(vi=load_vasp_input(self.directory), directory=self.directory).apply_actions(
+                [{"dict": "INCAR", "action": {"_set": {"POTIM": 0.1}}}]
+            )
+            # nothing is written before the end of the check
+            assert "POTIM" not in Incar.from_file(f"{self.directory}/INCAR")
+
+        incar = Incar.from_file(f"{self.directory}/INCAR")
+        assert incar["ALGO"] == "All"
+        assert incar["POTIM"] == 0.1
+        assert not InputTransaction.state.open_transactions
+
+    def test_discarded_on_exception(self) -> None:
+        def failed_check() -> None:
+            with InputTransaction.deferred_scope():
+                VaspModder(vi=load_vasp_input(self.directory), directory=self.directory).apply_actions(
+                    [{"dict": "INCAR", "action": {"_set": {"POTIM": 0.1}}}]
+                )
+                raise RuntimeError("check failed")
+
+        with pytest.raises(RuntimeError, match="check failed"):
+            failed_check()
+        assert "POTIM" not in Incar.from_file(f"{self.directory}/INCAR")
+        assert not InputTransaction.state.open_transactions
+
+    def test_deferred_per_thread(self) -> None:
+        with InputTransaction.deferred_scope():
+            vi = load_vasp_input(self.directory)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                # another thread is outside of the scope of this one
+                assert executor.submit(load_vasp_input, self.directory).result() is not vi
+                assert not executor.submit(lambda: InputTransaction.state.deferred).result()
+            assert load_vasp_input(self.directory) is vi
+
+    def test_handlers_of_one_check(self) -> None:
+        incar = Incar.from_file(f"{self.directory}/INCAR")
+        incar.pop("POTIM", None)
+        incar.write_file(f"{self.directory}/INCAR")
+        custodian = Custodian([], [], directory=self.directory)
+        custodian.run_log = [{"corrections": []}]
+        # the second handler only sees its error once the correction of the first is staged
+        handlers = [SetIncarTagHandler("POTIM", 0.1), SetIncarTagHandler("ALGO", "All", required="POTIM")]
+        assert custodian._do_check(handlers)
+        assert [corr["errors"] for corr in custodian.run_log[-1]["corrections"]] == [["POTIM"], ["ALGO"]]
+
+        incar = Incar.from_file(f"{self.directory}/INCAR")
+        assert incar["POTIM"] == 0.1
+        assert incar["ALGO"] == "All"
+        # the backup of the second handler has the correction of the first
+        with tarfile.open(f"{self.directory}/error.2.tar.gz") as tar:
+            backed_up = Incar.from_str(tar.extractfile("error.2/INCAR").read().decode())
+        assert backed_up["POTIM"] == 0.1
+        assert backed_up.get("ALGO") != "All"
+
+    def test_foreign_vi_in_check(self) -> None:
+        vi = load_vasp_input(self.directory)
+        with InputTransaction.deferred_scope():
+            with pytest.raises(ValueError, match="load_vasp_input"):
+                VaspModder(vi=vi, directory=self.directory)
+            load_vasp_input(self.directory)
+        assert not InputTransaction.state.open_transactions
+
+    def test_not_shared_outside_check(self) -> None:
+        vi = load_vasp_input(self.directory)
+        assert load_vasp_input(self.directory) is not vi
+        VaspModder(vi=vi, directory=self.directory).apply_actions(
+            [{"dict": "INCAR", "action": {"_set": {"ALGO": "All"}}}]
+        )
+        assert Incar.from_file(f"{self.directory}/INCAR")["ALGO"] == "All"
+
+    def test_file_action_refreshes_input(self) -> None:
+        contcar = Poscar.from_file(f"{self.directory}/CONTCAR")
+        with InputTransaction.deferred_scope():
+            VaspModder(vi=load_vasp_input(self.directory), directory=self.directory).apply_actions(
+                [{"file": "CONTCAR", "action": {"_file_copy": {"dest": "POSCAR"}}}]
+            )
+            assert load_vasp_input(self.directory)["POSCAR"].structure == contcar.structure
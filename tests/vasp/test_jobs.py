@@ -9,6 +9,7 @@ from types import SimpleNamespace
 from typing import TYPE_CHECKING
 from unittest.mock import Mock, patch
 
+import numpy as np
 import pymatgen
 import pytest
 from monty.os import cd
@@ -17,6 +18,8 @@ from pymatgen.core import Structure
 from pymatgen.io.vasp import Incar, Kpoints, Poscar
 from pymatgen.io.vasp.sets import MPRelaxSet
 
+from custodian.utils import atomic_path
+from custodian.vasp.io import load_vasp_summary
 from custodian.vasp.jobs import GenerateVaspInputJob, VaspJob, VaspNEBJob, _gamma_point_only_check
 from tests.conftest import TEST_FILES
 
@@ -26,6 +29,24 @@ if TYPE_CHECKING:
 pymatgen.core.SETTINGS["PMG_VASP_PSP_DIR"] = TEST_FILES
 
 
+def write_wavecar(filename, nbands=2, truncate=0) -> None:
+    """Write a WAVECAR with one spin and k-point and empty records, without its last truncate bytes."""
+    recl = 64
+    records = np.zeros((2 + nbands + 1, recl // 8))
+    records[0, :3] = (recl, 1, 45200)
+    records[1, :2] = (1, nbands)
+    data = records.tobytes()
+    with open(filename, mode="wb") as file:
+        file.write(data[: len(data) - truncate])
+
+
+def write_chgcar(filename, truncate=False) -> None:
+    """Write a CHGCAR with a 2x2x2 grid for the POSCAR, without its last line if truncate."""
+    lines = [Poscar.from_file("POSCAR").get_str().rstrip(), "", "   2   2   2", " 1.0 1.0 1.0 1.0 1.0", " 1.0 1.0 1.0"]
+    with open(filename, mode="w") as file:
+        file.write("\n".join(lines[:-1] if truncate else lines) + "\n")
+
+
 class TestVaspJob:
     def test_as_from_dict(self) -> None:
         v = VaspJob(["hello"])
@@ -43,6 +64,41 @@ class TestVaspJob:
             if count > 3:
                 assert incar["NPAR"] > 1
 
+    def test_setup_preflight(self) -> None:
+        with cd(TEST_FILES), ScratchDir(".", copy_from_current_on_enter=True):
+            shutil.copy("INCAR.algo_tet_only", "INCAR")
+            v = VaspJob(["hello"])
+            v.setup()
+            assert v.preemptive_corrections == []
+
+            v = VaspJob(["hello"], preflight="warn")
+            v.setup()
+            assert Incar.from_file("INCAR")["ALGO"] == "All"
+            assert v.preemptive_corrections == [
+                {
+                    "errors": ["algo_tet"],
+                    "actions": [{"dict": "INCAR", "action": {"_set": {"ALGO": "Fast"}}}],
+                    "applied": False,
+                }
+            ]
+
+            v = VaspJob(["hello"], preflight="correct")
+            v.setup()
+            assert Incar.from_file("INCAR")["ALGO"] == "Fast"
+            assert v.preemptive_corrections[0]["applied"]
+
+            v = VaspJob(["hello"], preflight=None)
+            v.setup()
+            assert v.preemptive_corrections == []
+            with pytest.raises(ValueError, match="Unknown preflight="):
+                VaspJob(["hello"], preflight="fix")
+
+            # a preflight that breaks does not stop the job
+            v = VaspJob(["hello"], preflight="correct")
+            with patch("custodian.vasp.jobs.preflight_corrections", side_effect=ValueError("bad POSCAR")):
+                v.setup()
+            assert v.preemptive_corrections == []
+
     def test_setup_run_no_kpts(self) -> None:
         # just make sure v.setup() and v.run() exit cleanly when no KPOINTS file is present
         with cd(f"{TEST_FILES}/kspacing"), ScratchDir(".", copy_from_current_on_enter=True):
@@ -69,7 +125,7 @@ class TestVaspJob:
         with cd(f"{TEST_FILES}/postprocess"), ScratchDir(".", copy_from_current_on_enter=True):
             shutil.copy("INCAR", "INCAR.backup")
 
-            v = VaspJob(["hello"], final=False, suffix=".test", copy_magmom=True)
+            v = VaspJob(["hello"], final=False, suffix=".test", copy_magmom=True, write_summary=True)
             v.postprocess()
             incar = Incar.from_file("INCAR")
             incar_prev = Incar.from_file("INCAR.test")
@@ -82,11 +138,13 @@ class TestVaspJob:
                 "OUTCAR",
                 "POSCAR",
                 "vasprun.xml",
+                "vasp_summary.json",
             ):
                 assert os.path.isfile(f"{file}.test")
                 os.remove(f"{file}.test")
             shutil.move("INCAR.backup", "INCAR")
 
+            assert load_vasp_summary()["magnetization"] == incar["MAGMOM"]
             assert incar["MAGMOM"] == pytest.approx([3.007, 1.397, -0.189, -0.189])
             assert incar_prev["MAGMOM"] == pytest.approx([5, -5, 0.6, 0.6])
 
@@ -119,6 +177,91 @@ class TestVaspJob:
         # Just a basic test of init.
         VaspJob.double_relaxation_run(["vasp"])
 
+    def test_warm_restart(self) -> None:
+        with cd(TEST_FILES), ScratchDir(".", copy_from_current_on_enter=True):
+            v = VaspJob(["true"], auto_gamma=False, preflight=None, warm_restart=True)
+            v.setup()
+            v.run().wait()
+            # Nothing written by the killed run
+            assert v.warm_restart_actions() == []
+
+            write_wavecar("WAVECAR")
+            write_chgcar("CHGCAR")
+            os.utime("CONTCAR")
+            incar = Incar.from_file("INCAR")
+            incar["ALGO"] = "All"
+            incar.write_file("INCAR")
+            assert v.warm_restart_actions() == [
+                {"dict": "INCAR", "action": {"_set": {"ISTART": 1}}},
+                {"file": "CONTCAR", "action": {"_file_copy": {"dest": "POSCAR"}}},
+            ]
+            v.run().wait()
+            assert Incar.from_file("INCAR")["ISTART"] == 1
+            assert Poscar.from_file("POSCAR").structure == Poscar.from_file("CONTCAR").structure
+
+            for filename in ("WAVECAR", "CHGCAR"):
+                os.utime(filename)
+            incar = Incar.from_file("INCAR")
+            incar["NBANDS"] = 100
+            incar.write_file("INCAR")
+            assert v.warm_restart_actions() == [{"dict": "INCAR", "action": {"_set": {"ISTART": 0, "ICHARG": 1}}}]
+
+            # Outputs truncated by a killed run are not reused
+            incar.pop("NBANDS")
+            incar.write_file("INCAR")
+            write_wavecar("WAVECAR", truncate=8)
+            assert v.warm_restart_actions() == [{"dict": "INCAR", "action": {"_set": {"ISTART": 0, "ICHARG": 1}}}]
+            write_chgcar("CHGCAR", truncate=True)
+            assert v.warm_restart_actions() == [{"dict": "INCAR", "action": {"_unset": {"ISTART": 1}}}]
+
+            # The outputs are not valid anymore, ISTART is reverted
+            incar["ENCUT"] = 600
+            incar.write_file("INCAR")
+            assert v.warm_restart_actions() == [{"dict": "INCAR", "action": {"_unset": {"ISTART": 1}}}]
+
+            # A correction deleting the outputs on purpose
+            incar["ENCUT"] = 520
+            incar["ISYM"] = 0
+            incar.write_file("INCAR")
+            for filename in ("WAVECAR", "CHGCAR"):
+                os.remove(filename)
+            v.run().wait()
+            assert "ISTART" not in Incar.from_file("INCAR")
+            assert v.warm_restart_actions() == []
+
+            v = VaspJob(["true"], auto_gamma=False, preflight=None, warm_restart=False)
+            v.setup()
+            v.run().wait()
+            assert v.warm_restart_actions() == []
+
+    def test_reduce_ranks(self) -> None:
+        v = VaspJob(["mpirun", "-np", "16", "vasp_std"], gamma_vasp_cmd=["mpirun", "-np=16", "vasp_gam"])
+        assert v.reduce_ranks(8) == 8
+        assert v.vasp_cmd == ("mpirun", "-np", "8", "vasp_std")
+        assert v.gamma_vasp_cmd == ("mpirun", "-np=8", "vasp_gam")
+        assert v.reduce_ranks(8) == 0
+        assert VaspJob(["vasp_std"]).reduce_ranks(8) == 0
+
+    def test_reduce_ranks_parallelization(self) -> None:
+        with cd(TEST_FILES), ScratchDir(".", copy_from_current_on_enter=True):
+            incar = Incar.from_file("INCAR")
+            incar.update({"KPAR": 4, "NCORE": 4})
+            incar.pop("NPAR", None)
+            incar.write_file("INCAR")
+            v = VaspJob(["mpirun", "-np", "16", "vasp_std"])
+            assert v.reduce_ranks(8) == 8
+            # KPAR = 4 still divides 8 ranks, but NCORE = 4 no longer divides 2 ranks per k-point group
+            incar = Incar.from_file("INCAR")
+            assert incar["KPAR"] == 4
+            assert incar["NCORE"] == 2
+            # the INCAR is replaced atomically
+            with patch("custodian.utils.atomic_path", wraps=atomic_path) as atomic:
+                assert v.reduce_ranks(6) == 2
+            atomic.assert_called_once()
+            incar = Incar.from_file("INCAR")
+            assert incar["KPAR"] == 2
+            assert incar["NCORE"] == 1
+
 
 class TestVaspNEBJob:
     def test_as_from_dict(self) -> None:
@@ -1,5 +1,7 @@
 """Created 17 June, 2024"""
 
+import gzip
+import json
 import os
 
 import numpy as np
@@ -9,7 +11,16 @@ from pymatgen.core import Lattice, Structure
 from pymatgen.io.vasp import Kpoints
 from pymatgen.util.testing import MatSciTest
 
-from custodian.vasp.utils import _estimate_num_k_points_from_kspacing, increase_k_point_density, is_valid_poscar
+from custodian.vasp.utils import (
+    CorrectionHistory,
+    _estimate_num_k_points_from_kspacing,
+    fit_linear_trend,
+    functional_label,
+    increase_k_point_density,
+    is_valid_poscar,
+    predict_scf_convergence,
+    predict_step_time,
+)
 from tests.conftest import TEST_FILES
 
 
@@ -91,3 +102,87 @@ direct
 """
         )
         assert is_valid_poscar("CONTCAR", str(tmp_path)) is False
+
+
+def test_fit_linear_trend() -> None:
+    trend = fit_linear_trend([1, 2, 3, 4], [3, 5, 7, 9])
+    assert trend.slope == pytest.approx(2)
+    assert trend.intercept == pytest.approx(1)
+    assert trend.slope_stderr == pytest.approx(0)
+    assert trend(10) == pytest.approx(21)
+    with pytest.raises(ValueError, match="At least 3 points"):
+        fit_linear_trend([1, 2], [1, 2])
+
+
+def test_predict_scf_convergence() -> None:
+    rng = np.random.default_rng(0)
+    steps = np.arange(1, 31)
+
+    # too few selfconsistent steps after the NELMDL ones
+    assert predict_scf_convergence(10.0 ** -steps[:10], ediff=1e-12, nelm=60, skip=5) is None
+
+    # a steady decrease by one decade every 2 steps reaches 1e-6 at step ~12
+    prediction = predict_scf_convergence(10 ** (-0.5 * steps[:10]), ediff=1e-6, nelm=60, skip=0)
+    assert prediction.predicted_steps == pytest.approx(12)
+    assert prediction.converges
+    assert not prediction.hopeless
+
+    # a slow noisy crawl cannot reach 1e-6 within 60 steps, even optimistically
+    dE = 10 ** (-2 - 0.01 * steps + rng.normal(0, 0.05, len(steps)))
+    prediction = predict_scf_convergence(dE, ediff=1e-6, nelm=60)
+    assert prediction.n_steps == 30
+    assert prediction.hopeless
+
+    # wild oscillations give no confident prediction
+    dE = 10 ** rng.normal(-3, 2, len(steps))
+    assert not predict_scf_convergence(dE, ediff=1e-6, nelm=60).hopeless
+
+
+def test_predict_step_time() -> None:
+    assert predict_step_time([]) == 0
+    assert predict_step_time([5.0, 7.0]) == 7
+    # a steady series is predicted tightly, a growing one is extrapolated
+    assert predict_step_time([100, 101, 99, 100, 102, 100]) == pytest.approx(103.3, abs=0.1)
+    assert predict_step_time([10, 20, 30, 40]) == pytest.approx(50)
+    # only the last window is fitted
+    assert predict_step_time([1000, 10, 10, 10, 10], window=4) == pytest.approx(10)
+
+
+def test_functional_label() -> None:
+    assert functional_label({}) == "PE"
+    assert functional_label({"GGA": "Ps", "LDAU": True}) == "PS+U"
+    assert functional_label({"METAGGA": "R2scan"}) == "R2SCAN"
+    assert functional_label({"LHFCALC": True, "HFSCREEN": 0.2, "GGA": "PE"}) == "HSE"
+
+
+def test_correction_history(tmp_path) -> None:
+    oxide = {"nsites": 8, "elements": ["Fe", "O"], "functional": "PE+U", "ispin": 2}
+    silicon = {"nsites": 2, "elements": ["Si"], "functional": "PE", "ispin": 1}
+
+    def correction(rung, features):
+        return {"errors": ["brmix"], "actions": [], "rungs": {"brmix": rung}, "features": features}
+
+    # the first rung fails for the oxide and the second one succeeds
+    oxide_log = [{"corrections": [correction(0, oxide), correction(1, oxide)]} for _ in range(3)]
+    silicon_log = [{"corrections": [correction(0, silicon)]} for _ in range(2)]
+    # a job that ended on an error is not a success
+    silicon_log.append({"corrections": [correction(1, silicon)], "max_errors_per_job": True})
+    (tmp_path / "oxide").mkdir()
+    with open(tmp_path / "oxide" / "custodian.json", mode="w") as file:
+        json.dump(oxide_log, file)
+    (tmp_path / "silicon").mkdir()
+    with gzip.open(tmp_path / "silicon" / "custodian.json.gz", mode="wt") as file:
+        json.dump(silicon_log, file)
+
+    history = CorrectionHistory(str(tmp_path / "**" / "custodian.json*"), min_samples=3)
+    assert len(history.outcomes) == 9
+    assert ("brmix", 0, oxide, False, 1) in history.outcomes
+    assert history.best("brmix", oxide, [0, 1]) == 1
+    assert history.best("brmix", silicon, [0, 1]) == 0
+    assert history.best("brmix", oxide, [0]) == 0
+    # no history for other elements: falls back on oxides of the same size
+    assert history.best("brmix", {**oxide, "elements": ["Ni", "O"]}, [0, 1]) == 1
+    assert history.best("zbrent", oxide, [0, 1]) is None
+    assert (
+        CorrectionHistory(str(tmp_path / "**" / "custodian.json*"), min_samples=10).best("brmix", oxide, [0, 1]) is None
+    )
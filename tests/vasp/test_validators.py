@@ -1,10 +1,20 @@
 import os
 import shutil
 
+import numpy as np
 import pytest
+from pymatgen.core import Lattice, Structure
+from pymatgen.io.vasp.outputs import Chgcar
 
 from custodian.utils import tracked_lru_cache
-from custodian.vasp.validators import VaspAECCARValidator, VaspFilesValidator, VaspNpTMDValidator, VasprunXMLValidator
+from custodian.vasp.validators import (
+    VaspAECCARValidator,
+    VaspFilesValidator,
+    VaspNpTMDValidator,
+    VasprunXMLValidator,
+    check_broken_chgcar,
+    check_broken_chgcar_files,
+)
 from tests.conftest import TEST_FILES
 
 
@@ -78,3 +88,17 @@ class TestVaspAECCARValidator:
         os.chdir(f"{TEST_FILES}/bad_aeccar")
         handler = VaspAECCARValidator()
         assert handler.check()
+
+    def test_streamed_check_matches_chgcar(self, tmp_path) -> None:
+        structure = Structure(Lattice.cubic(3), ["Si"], [[0, 0, 0]])
+        rng = np.random.default_rng(0)
+        for scale, n_negative in ((1, 0), (1, 101), (3, 0)):
+            for name in ("AECCAR0", "AECCAR2"):
+                data = rng.normal(5, scale, (7, 5, 11))
+                data.flat[:n_negative] = -1
+                Chgcar(structure, {"total": data}).write_file(tmp_path / name)
+            aeccar = Chgcar.from_file(tmp_path / "AECCAR0") + Chgcar.from_file(tmp_path / "AECCAR2")
+            files = [str(tmp_path / "AECCAR0"), str(tmp_path / "AECCAR2")]
+            for diff_thresh in (None, 0.1, 0.5, 0.9):
+                assert check_broken_chgcar_files(files, diff_thresh) == check_broken_chgcar(aeccar, diff_thresh)
+            assert VaspAECCARValidator().check(str(tmp_path)) == check_broken_chgcar(aeccar)